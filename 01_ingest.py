@@ -7,53 +7,117 @@ df.head(3)
 
 # COMMAND ----------
 
-# Setup a non-OCR document converter
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.datamodel.pipeline_options import PdfPipelineOptions
-from docling.datamodel.base_models import InputFormat
-from docling.chunking import HybridChunker
-from src.retrievers import make_text_chunk
-
-# We don't need OCR for these PDFs
-pipeline_options = PdfPipelineOptions()
-pipeline_options.do_ocr = False
-
-converter = DocumentConverter(
-    format_options={InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)}
+# Setup the ingest pipeline. We don't need OCR for these PDFs, and the
+# hybrid chunker respects headings and hierarchy. Set num_workers > 1 to
+# convert documents in parallel, one converter per worker process.
+# The manifest records a content hash per document, so reruns only
+# reprocess new or modified PDFs.
+from src.config import IngestConfig
+from src.manifest import (
+    exclude_failed,
+    load_manifest,
+    plan_incremental,
+    save_manifest,
 )
 
-# Setup a hybrid chunker that respects headings and hierarchy
-chunker = HybridChunker(max_tokens=1000)
+CHUNK_TABLE = "shm.multimodal.processed_chunks"
 
+ingest_config = IngestConfig(
+    max_tokens=1000,
+    do_ocr=False,
+    num_workers=4,
+    manifest_path="../assets/ingest_manifest.json",
+    dedup_threshold=0.8,
+)
+
+# COMMAND ----------
+
+# Work out which documents changed since the last run. If the table is
+# missing we start from an empty manifest and process everything.
+manifest = {}
+if ingest_config.manifest_path and spark.catalog.tableExists(CHUNK_TABLE):
+    manifest = load_manifest(ingest_config.manifest_path)
+
+changed_df, stale_doc_uris, updated_manifest = plan_incremental(
+    df, manifest, ingest_config.settings, root="../"
+)
+print(f"{len(changed_df)} documents to process, {len(stale_doc_uris)} to replace")
 
 # COMMAND ----------
 
-# Process each PDF
+# Process each new or modified PDF, streaming the chunks into a staging
+# table in bounded batches so driver memory stays flat regardless of
+# corpus size. Chunk ids are derived from their content, so merging the
+# staging table into the chunk table only touches chunks that changed and
+# the vector index sync only re-embeds those. Full runs delete every chunk
+# missing from the source, incremental runs only those of stale documents.
+# Tables written with the old integer ids need to be dropped once.
+# With SPARK_INGEST the documents are converted on the executors with
+# mapInPandas instead of on the driver.
 from pathlib import Path
+from src.ingest import iter_chunks
+from src.tables import (
+    annotate_duplicates,
+    deduplicate_staging_table,
+    ingest_with_spark,
+    merge_chunks,
+    write_staging_table,
+)
 
-all_chunks = []
-for idx, row in df.iterrows():
-    try:
-        print(f"Processing {row.title}")
-        result = converter.convert(Path("../") / row.asset_path)
-        chunk_iter = chunker.chunk(result.document)
-        doc_chunks = [make_text_chunk(x, doc_uri=row.link_to_page) for x in chunk_iter]
-        all_chunks.extend(doc_chunks)
-    except Exception as e:
-        print(f"Error processing {row.asset_path}: {str(e)}")
+SPARK_INGEST = True
+failed_doc_uris = []
 
+if SPARK_INGEST:
+    staging_sp = ingest_with_spark(
+        spark,
+        changed_df,
+        ingest_config,
+        f"{CHUNK_TABLE}_staging",
+        root=Path("../").resolve(),
+        failed=failed_doc_uris,
+    )
+else:
+    chunk_iter = iter_chunks(
+        changed_df, ingest_config, root="../", failed=failed_doc_uris
+    )
+    staging_sp = write_staging_table(
+        spark, chunk_iter, f"{CHUNK_TABLE}_staging", ingest_config.batch_size
+    )
 
-# COMMAND ----------
+# Documents that failed to convert keep their existing chunks and manifest
+# entry, so they are retried on the next run instead of disappearing
+stale_doc_uris, updated_manifest = exclude_failed(
+    manifest, updated_manifest, stale_doc_uris, failed_doc_uris
+)
+print(f"{len(failed_doc_uris)} documents failed")
 
-# Write to spark table
-from pyspark.sql.functions import monotonically_increasing_id
 
-chunks_df = pd.DataFrame(all_chunks)
-chunk_sp = spark.createDataFrame(chunks_df)
-chunk_sp = chunk_sp.withColumn("id", monotonically_increasing_id())
-(
-    chunk_sp.write.option("mergeSchema", "true")
-    .mode("overwrite")
-    .saveAsTable("shm.multimodal.processed_chunks")
+# Collapse near-duplicate boilerplate (definitions, "Regulations" clauses,
+# amendment notes) into one indexed chunk. The dropped chunks are mapped to
+# the kept one in the duplicates table and, after the merge, copied onto it
+# as duplicate_doc_uris and duplicate_pages, so citations keep every source.
+if ingest_config.dedup_threshold is not None:
+    staging_sp = deduplicate_staging_table(
+        spark,
+        f"{CHUNK_TABLE}_staging",
+        f"{CHUNK_TABLE}_duplicates",
+        ingest_config.dedup_threshold,
+        stale_doc_uris if manifest else None,
+        target_table=CHUNK_TABLE,
+    )
+
+merge_chunks(
+    spark,
+    staging_sp,
+    CHUNK_TABLE,
+    stale_doc_uris if manifest else None,
+    failed_doc_uris=failed_doc_uris,
 )
-display(chunk_sp)
+if ingest_config.dedup_threshold is not None:
+    annotate_duplicates(spark, CHUNK_TABLE, f"{CHUNK_TABLE}_duplicates")
+spark.sql(f"DROP TABLE IF EXISTS {CHUNK_TABLE}_staging")
+
+if ingest_config.manifest_path:
+    save_manifest(updated_manifest, ingest_config.manifest_path)
+
+display(spark.table(CHUNK_TABLE))
@@ -44,13 +44,34 @@ client = VectorSearchClient()
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC If the index exists already, we will run a sync on the table. If not, we will use the SDK to create the index
+# MAGIC If the index exists already, we read the table's change data feed since the last sync and only sync when rows have changed. If not, we will use the SDK to create the index
 
 # COMMAND ----------
 
+from src.index_maintenance import sync_delta_index
+
+sync_state_path = "../assets/index_sync_state.json"
+
 if index_exists(client, vs_endpoint, vs_index_name):
     index = client.get_index(vs_endpoint, vs_index_name)
-    index.sync()
+    # Cached query results for this index are stale once the sync has
+    # finished; sync_delta_index waits for it and invalidates them. Semantic
+    # caches of running agents notice the sync through sync_state_path.
+    cache_config = config.get("retriever").get("cache")
+    query_cache = None
+    if cache_config and cache_config.get("path"):
+        from src.query_cache import SQLiteQueryCache
+
+        query_cache = SQLiteQueryCache(cache_config["path"])
+    sync_metrics = sync_delta_index(
+        spark,
+        index,
+        vs_source_table,
+        sync_state_path,
+        cache=query_cache,
+        index_name=vs_index_name,
+    )
+    print(sync_metrics)
 else:
     index = client.create_delta_sync_index(
         endpoint_name=vs_endpoint,
@@ -60,5 +81,92 @@ else:
         primary_key="id",
         embedding_source_column="text",
         embedding_model_endpoint_name="databricks-gte-large-en",
-        columns_to_sync=["filename", "pages", "type", "ref", "img_path"],
+        columns_to_sync=[
+            "filename",
+            "pages",
+            "type",
+            "ref",
+            "img_path",
+            "duplicate_doc_uris",
+            "duplicate_pages",
+        ],
+    )
+
+# COMMAND ----------
+
+# MAGIC %md
+# MAGIC ## Build a Local Index
+# MAGIC For development, tests and edge deployments we can also export the chunk table with precomputed embeddings into a local index at `retriever.local_index_path` of the agent config. Set `retriever.backend: local` to query it without a vector search endpoint.
+# MAGIC
+# MAGIC The IVF index makes `query_type: ann` an approximate search over the closest `parameters.nprobe` lists instead of a brute force scan, which matters once the corpus reaches hundreds of thousands of chunks.
+# MAGIC
+# MAGIC The int8 quantized codes are kept in memory for the first pass, while the float32 embeddings stay memory-mapped on disk and are only read to rescore `parameters.rescore_factor` candidates per result.
+# MAGIC
+# MAGIC The BM25 index over the same column backs `search_type: hybrid`: lexical and vector results are merged by reciprocal rank fusion, which helps queries that quote section numbers or exact legal terms.
+# MAGIC
+# MAGIC Once built, the local index is kept up to date from the change data feed instead of being rebuilt: only changed chunks are embedded, replaced and deleted rows are tombstoned, and the index is compacted once enough rows are dead.
+
+# COMMAND ----------
+
+import numpy as np
+from src.config import parse_config
+from src.embeddings import get_embeddings
+from src.ann import build_ivf_index
+from src.index_maintenance import (
+    LocalIndexMaintainer,
+    read_change_feed,
+    table_history,
+)
+from src.local_index import EMBEDDINGS_FILE, build_local_index
+from src.quantization import (
+    QuantizedIndex,
+    build_quantized_index,
+    evaluate_quantization,
+)
+from src.query_cache import SQLiteQueryCache
+from src.retrievers import get_index_name
+
+sls_config = parse_config(config)
+mapping = sls_config.retriever.mapping
+local_index_path = sls_config.retriever.local_index_path
+# Applied changes invalidate the shared query cache of the local index
+shared_cache = None
+if sls_config.retriever.cache and sls_config.retriever.cache.path:
+    shared_cache = SQLiteQueryCache(sls_config.retriever.cache.path)
+
+maintainer = LocalIndexMaintainer(
+    local_index_path,
+    get_embeddings(sls_config),
+    primary_key=mapping.primary_key,
+    text_column=mapping.chunk_text,
+    cache=shared_cache,
+    index_name=get_index_name(sls_config),
+)
+state = maintainer.load_state()
+latest = table_history(spark, vs_source_table).iloc[-1]
+
+if state is None:
+    build_local_index(
+        spark.read.option("versionAsOf", int(latest.version))
+        .table(vs_source_table)
+        .toPandas(),
+        maintainer.embedding,
+        local_index_path,
+        text_column=mapping.chunk_text,
+        lexical_column=mapping.chunk_text,
     )
+    embeddings = np.load(f"{local_index_path}/{EMBEDDINGS_FILE}", mmap_mode="r")
+    build_ivf_index(local_index_path, embeddings)
+    build_quantized_index(local_index_path, embeddings, kind="int8")
+    maintainer.mark_synced(int(latest.version), latest.timestamp)
+elif latest.version > state.version:
+    changes = read_change_feed(spark, vs_source_table, state.version + 1)
+    print(maintainer.apply_changes(changes.toPandas()))
+
+embeddings = np.load(f"{local_index_path}/{EMBEDDINGS_FILE}", mmap_mode="r")
+quantized = QuantizedIndex.load(local_index_path)
+
+# Check memory saved and recall@k against exact search, using a sample of
+# the chunk embeddings themselves as queries
+sample = np.random.default_rng(0).choice(len(embeddings), size=100)
+evaluate_quantization(embeddings, quantized, embeddings[np.sort(sample)], k=10)
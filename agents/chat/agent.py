@@ -6,34 +6,90 @@ mlflow_config = mlflow.models.ModelConfig(development_config="./config.yaml")
 sls_config = parse_config(mlflow_config)
 
 # API Interfaces
+from src.embeddings import get_embeddings
 from src.retrievers import get_vector_retriever
 from databricks_langchain import ChatDatabricks
 
-retriever = get_vector_retriever(sls_config)
+embeddings = get_embeddings(sls_config)
+retriever = get_vector_retriever(sls_config, embeddings)
 model = ChatDatabricks(endpoint=sls_config.model.endpoint_name)
 
 # Nodes
+from src.chunk_store import get_chunk_store
 from src.states import get_state
 from src.nodes import (
+    make_async_context_generation_node,
+    make_async_query_vector_database_node,
     make_query_vector_database_node,
     make_context_generation_node,
+    make_semantic_cache_lookup_node,
+    make_semantic_cache_update_node,
+    route_on_cache_hit,
 )
 
 state = get_state(sls_config)
-retriever_node = make_query_vector_database_node(retriever, sls_config)
-context_generation_node = make_context_generation_node(model, sls_config)
+reranker = None
+if sls_config.retriever.reranker is not None:
+    from src.rerank import get_reranker
+
+    reranker = get_reranker(
+        sls_config.retriever.reranker, sls_config.retriever.mapping.primary_key
+    )
+chunk_store = get_chunk_store(sls_config)
+
+# Each node has a blocking and an async implementation, so the graph runs
+# with invoke as well as ainvoke/astream, where concurrent conversations
+# share one event loop instead of a thread each
+from langchain_core.runnables import RunnableLambda
+
+retriever_node = RunnableLambda(
+    make_query_vector_database_node(retriever, sls_config, reranker, chunk_store),
+    afunc=make_async_query_vector_database_node(
+        retriever, sls_config, reranker, chunk_store
+    ),
+)
+context_generation_node = RunnableLambda(
+    make_context_generation_node(model, sls_config),
+    afunc=make_async_context_generation_node(model, sls_config),
+)
 
 # Graph
 from langgraph.graph import StateGraph, START, END
-from langchain_core.runnables import RunnableLambda
 from src.utils import graph_state_to_chat_type
 
 workflow = StateGraph(state)
 workflow.add_node("retrieve", retriever_node)
 workflow.add_node("generate_w_context", context_generation_node)
-workflow.add_edge(START, "retrieve")
 workflow.add_edge("retrieve", "generate_w_context")
-workflow.add_edge("generate_w_context", END)
+
+# Paraphrases of previously answered questions skip retrieval and generation
+cache_config = sls_config.agent.semantic_cache
+if cache_config is not None:
+    from src.semantic_cache import SemanticCache
+
+    semantic_cache = SemanticCache(
+        embeddings,
+        threshold=cache_config.threshold,
+        max_size=cache_config.max_size,
+        ttl_seconds=cache_config.ttl_seconds,
+        sync_state_path=cache_config.sync_state_path,
+    )
+    workflow.add_node(
+        "cache_lookup", make_semantic_cache_lookup_node(semantic_cache, sls_config)
+    )
+    workflow.add_node(
+        "cache_update", make_semantic_cache_update_node(semantic_cache, sls_config)
+    )
+    workflow.add_edge(START, "cache_lookup")
+    workflow.add_conditional_edges(
+        "cache_lookup", route_on_cache_hit, {"hit": END, "miss": "retrieve"}
+    )
+    workflow.add_edge("generate_w_context", "cache_update")
+    workflow.add_edge("cache_update", END)
+else:
+    workflow.add_edge(START, "retrieve")
+    workflow.add_edge("generate_w_context", END)
+
 app = workflow.compile()
 
 chain = app | RunnableLambda(graph_state_to_chat_type)
@@ -0,0 +1,160 @@
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Files of an IVF index, stored alongside the local index. Rows of the
+# embedding matrix are grouped by their nearest centroid: the rows of list
+# i are ids[offsets[i]:offsets[i + 1]].
+IVF_CENTROIDS_FILE = "ivf_centroids.npy"
+IVF_OFFSETS_FILE = "ivf_offsets.npy"
+IVF_IDS_FILE = "ivf_ids.npy"
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first.
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def assign(
+    vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 65536
+) -> np.ndarray:
+    """
+    Nearest centroid of each vector by inner product, computed in batches
+    so a memory-mapped matrix is never fully loaded.
+    """
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch_size):
+        batch = np.asarray(vectors[start : start + batch_size], dtype=np.float32)
+        labels[start : start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+    return labels
+
+
+def train_centroids(
+    vectors: np.ndarray,
+    nlist: int,
+    iterations: int = 20,
+    sample_size: Optional[int] = None,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Spherical k-means over a random sample of the normalized vectors.
+    Empty clusters are re-seeded from random sample points.
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(sample_size or 256 * nlist, len(vectors))
+    sample_ids = np.sort(rng.choice(len(vectors), size=sample_size, replace=False))
+    sample = np.asarray(vectors[sample_ids], dtype=np.float32)
+
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(len(sample), size=empty.sum())]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+
+    return centroids.astype(np.float32)
+
+
+def build_ivf_index(
+    path: str | Path,
+    vectors: np.ndarray,
+    nlist: Optional[int] = None,
+    iterations: int = 20,
+    sample_size: Optional[int] = None,
+    seed: int = 0,
+) -> "IVFIndex":
+    """
+    Build an inverted file index over the normalized vectors of a local
+    index and persist it to path. nlist defaults to 4 * sqrt(n), a common
+    starting point that keeps lists small without too many centroids.
+    """
+    path = Path(path)
+    nlist = nlist or max(1, int(4 * np.sqrt(len(vectors))))
+    nlist = min(nlist, len(vectors))
+
+    centroids = train_centroids(vectors, nlist, iterations, sample_size, seed)
+    labels = assign(vectors, centroids)
+    ids = np.argsort(labels, kind="stable")
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(labels, minlength=nlist))
+
+    np.save(path / IVF_CENTROIDS_FILE, centroids)
+    np.save(path / IVF_OFFSETS_FILE, offsets)
+    np.save(path / IVF_IDS_FILE, ids)
+    return IVFIndex(centroids, offsets, ids)
+
+
+class IVFIndex:
+    """
+    Inverted file index over a memory-mapped embedding matrix. A query
+    scores the centroids, then only the rows of its nprobe closest lists.
+    Raising nprobe trades latency for recall; nprobe equal to the number
+    of lists is an exact search.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, ids: np.ndarray):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def exists(cls, path: str | Path) -> bool:
+        return (Path(path) / IVF_CENTROIDS_FILE).exists()
+
+    @classmethod
+    def load(cls, path: str | Path) -> "IVFIndex":
+        """
+        Load an index built by build_ivf_index. The id lists are
+        memory-mapped; the centroids are small and loaded in full.
+        """
+        path = Path(path)
+        return cls(
+            np.load(path / IVF_CENTROIDS_FILE),
+            np.load(path / IVF_OFFSETS_FILE),
+            np.load(path / IVF_IDS_FILE, mmap_mode="r"),
+        )
+
+    def candidates(self, query_vector: np.ndarray, nprobe: int) -> np.ndarray:
+        """
+        Row ids in the nprobe lists closest to the query, sorted so the
+        memory-mapped rows are read in file order.
+        """
+        probes = top_k(self.centroids @ query_vector, nprobe)
+        lists = [self.ids[self.offsets[i] : self.offsets[i + 1]] for i in probes]
+        return np.sort(np.concatenate(lists)) if lists else np.array([], np.int64)
+
+    def search(
+        self, vectors: np.ndarray, query_vector: np.ndarray, k: int, nprobe: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top k row ids and scores for a normalized query.
+        """
+        ids = self.candidates(query_vector, nprobe)
+        scores = np.asarray(vectors[ids], dtype=np.float32) @ query_vector
+        top = top_k(scores, k)
+        return ids[top], scores[top]
+
+
+def recall_at_k(exact_ids: np.ndarray, approx_ids: np.ndarray) -> float:
+    """
+    Fraction of the exact top k ids that an approximate search returned.
+    """
+    if len(exact_ids) == 0:
+        return 1.0
+    return len(np.intersect1d(exact_ids, approx_ids)) / len(exact_ids)
@@ -0,0 +1,195 @@
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from docling.datamodel.base_models import InputFormat
+
+from src.config import IngestConfig
+from src.ingest import CHUNK_ARROW_SCHEMA, get_chunker, get_converter
+from src.retrievers import make_text_chunk
+
+STAGES = ["convert", "chunk", "make_text_chunk", "serialize"]
+
+
+def current_rss_bytes() -> int:
+    """
+    Resident set size of this process. Reads /proc on Linux and falls
+    back to the peak RSS reported by getrusage elsewhere.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes on Linux
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler:
+    """
+    Samples RSS on a background thread to find the peak of one stage,
+    since getrusage only reports the peak of the whole process.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self.peak = current_rss_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+
+
+@contextmanager
+def measure(record: Dict[str, Any], stage: str) -> Iterator[None]:
+    """
+    Record the wall time and peak RSS of a stage into record.
+    """
+    started = time.perf_counter()
+    with RssSampler() as sampler:
+        yield
+    record[f"{stage}_seconds"] = time.perf_counter() - started
+    record[f"{stage}_peak_rss_bytes"] = sampler.peak
+
+
+def benchmark_document(
+    converter, chunker, asset_path: str | Path, doc_uri: str
+) -> Dict[str, Any]:
+    """
+    Run each ingest stage on one document and time it separately.
+    """
+    record: Dict[str, Any] = {"asset_path": str(asset_path)}
+
+    with measure(record, "convert"):
+        document = converter.convert(asset_path).document
+    with measure(record, "chunk"):
+        chunks = list(chunker.chunk(document))
+    with measure(record, "make_text_chunk"):
+        records = [make_text_chunk(x, doc_uri=doc_uri) for x in chunks]
+    with measure(record, "serialize"):
+        with pq.ParquetWriter(io.BytesIO(), CHUNK_ARROW_SCHEMA) as writer:
+            writer.write_table(pa.Table.from_pylist(records, schema=CHUNK_ARROW_SCHEMA))
+
+    record["pages"] = len(document.pages)
+    record["chunks"] = len(records)
+    return record
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """
+    Aggregate per-document records into wall time, pages/sec, chunks/sec
+    and peak RSS for each stage.
+    """
+    pages = sum(x["pages"] for x in records)
+    chunks = sum(x["chunks"] for x in records)
+    summary = {}
+    for stage in STAGES:
+        seconds = sum(x[f"{stage}_seconds"] for x in records)
+        summary[stage] = {
+            "wall_seconds": seconds,
+            "pages_per_second": pages / seconds if seconds else 0.0,
+            "chunks_per_second": chunks / seconds if seconds else 0.0,
+            "peak_rss_bytes": max(
+                (x[f"{stage}_peak_rss_bytes"] for x in records), default=0
+            ),
+        }
+    return summary
+
+
+def benchmark_ingest(
+    df: pd.DataFrame, config: IngestConfig, root: str | Path = "."
+) -> Dict[str, Any]:
+    """
+    Benchmark the ingest stages over every document in df. Model loading
+    is timed on its own so it does not skew the first document. Documents
+    that fail are reported with their error and left out of the summary.
+    """
+    started = time.perf_counter()
+    converter = get_converter(config)
+    converter.initialize_pipeline(InputFormat.PDF)
+    chunker = get_chunker(config)
+    model_load_seconds = time.perf_counter() - started
+
+    records = []
+    errors = []
+    for row in df.itertuples():
+        try:
+            print(f"Benchmarking {row.title}")
+            records.append(
+                benchmark_document(
+                    converter, chunker, Path(root) / row.asset_path, row.link_to_page
+                )
+            )
+        except Exception as e:
+            errors.append({"asset_path": row.asset_path, "error": str(e)})
+
+    return {
+        "timestamp": time.time(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "docling": version("docling"),
+        },
+        "settings": config.settings,
+        "model_load_seconds": model_load_seconds,
+        "documents": len(records),
+        "pages": sum(x["pages"] for x in records),
+        "chunks": sum(x["chunks"] for x in records),
+        "stages": summarize(records),
+        "per_document": records,
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the ingest stages over the bundled e-Laws PDFs."
+    )
+    parser.add_argument("--links", default="assets/elaws_links.csv")
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--max-tokens", type=int, default=1000)
+    parser.add_argument("--output", default="ingest_benchmark.json")
+    args = parser.parse_args()
+
+    results = benchmark_ingest(
+        pd.read_csv(args.links),
+        IngestConfig(max_tokens=args.max_tokens),
+        root=args.root,
+    )
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for stage, stats in results["stages"].items():
+        print(
+            f"{stage:>16}: {stats['wall_seconds']:8.2f}s "
+            f"{stats['pages_per_second']:8.1f} pages/s "
+            f"{stats['chunks_per_second']:8.1f} chunks/s "
+            f"{stats['peak_rss_bytes'] / 2**20:8.0f} MiB peak"
+        )
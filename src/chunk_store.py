@@ -0,0 +1,131 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from langchain_core.documents.base import Document
+
+from src.config import SLSConfig
+from src.local_index import TOMBSTONES_FILE, _to_python
+
+
+class ChunkStore:
+    """
+    Chunk text and large metadata looked up by primary key from a local
+    Parquet copy of the chunk table, such as the chunks.parquet of a local
+    index or the output of src.ingest.write_parquet.
+
+    Only the key column is held in memory. The other columns stay on disk
+    and the rows of a fetch are read in bulk with one take() on the
+    Parquet dataset. Recently hydrated rows are kept in an LRU of
+    cache_size entries.
+
+    Rows marked in a tombstones.npy next to the file (see
+    src.index_maintenance) are skipped, and if a key still appears more
+    than once its last row wins, as that is the latest appended version.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        primary_key: str,
+        columns: List[str],
+        cache_size: int = 4096,
+    ):
+        self.primary_key = primary_key
+        self.columns = [c for c in columns if c != primary_key]
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._dataset = ds.dataset(path, format="parquet")
+        keys = pq.read_table(path, columns=[primary_key]).column(primary_key)
+        self._rows = self._live_rows(
+            keys.to_pandas(), Path(path).parent / TOMBSTONES_FILE
+        )
+        self._cache: OrderedDict[Any, Dict[str, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _live_rows(keys: pd.Series, tombstones_path: Path) -> pd.Series:
+        """
+        Table position of each live key, with the last row of a repeated key.
+        """
+        live = np.ones(len(keys), dtype=bool)
+        if tombstones_path.exists():
+            tombstones = np.load(tombstones_path)[: len(keys)]
+            live[: len(tombstones)] = ~tombstones
+        rows = pd.Series(np.flatnonzero(live), index=keys[live].to_numpy())
+        return rows[~rows.index.duplicated(keep="last")]
+
+    def fetch(self, keys: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        """
+        Rows for the given keys, from the cache or in one bulk read. Keys
+        missing from the store are left out.
+        """
+        rows = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    rows[key] = self._cache[key]
+            self.cache_hits += len(rows)
+
+        missing = list(dict.fromkeys(k for k in keys if k not in rows))
+        indices = self._rows.index.get_indexer(missing)
+        positions = self._rows.to_numpy()
+        found = [(k, positions[i]) for k, i in zip(missing, indices) if i >= 0]
+        if found:
+            table = self._dataset.take([p for _, p in found], columns=self.columns)
+            for (key, _), row in zip(found, table.to_pylist()):
+                rows[key] = {c: _to_python(v) for c, v in row.items()}
+
+        with self._lock:
+            self.cache_misses += len(missing)
+            for key, _ in found:
+                self._cache[key] = rows[key]
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return rows
+
+    def hydrate(self, documents: List[Document], text_column: str) -> List[Document]:
+        """
+        Fill in the page content and stored metadata of documents returned
+        by a key-only search. Documents whose key is not in the store are
+        returned unchanged.
+        """
+        keys = [d.metadata.get(self.primary_key) for d in documents]
+        rows = self.fetch([k for k in keys if k is not None])
+
+        hydrated = []
+        for key, document in zip(keys, documents):
+            row = rows.get(key)
+            if row is None:
+                hydrated.append(document)
+                continue
+            metadata = {**document.metadata}
+            metadata.update({c: v for c, v in row.items() if c != text_column})
+            hydrated.append(
+                Document(
+                    page_content=row.get(text_column, document.page_content),
+                    metadata=metadata,
+                )
+            )
+        return hydrated
+
+
+def get_chunk_store(config: SLSConfig) -> Optional[ChunkStore]:
+    """
+    The chunk store for two-phase retrieval, if retriever.chunk_store_path
+    is set.
+    """
+    if config.retriever.chunk_store_path is None:
+        return None
+    mapping = config.retriever.mapping
+    return ChunkStore(
+        config.retriever.chunk_store_path, mapping.primary_key, mapping.all_columns
+    )
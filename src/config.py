@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import mlflow
 from pathlib import Path
 
@@ -16,8 +16,14 @@ class ConfigModel(BaseModel):
 
 
 class ModelParameters(ConfigModel):
+    """
+    max_context_tokens caps the retrieved context put into the prompt,
+    see src.context_packer.
+    """
+
     temperature: float
     max_tokens: int
+    max_context_tokens: Optional[int] = None
 
 
 class ModelConfig(ConfigModel):
@@ -26,30 +32,153 @@ class ModelConfig(ConfigModel):
 
 
 class RetrieverMapping(ConfigModel):
+    """
+    Set parent_id and parent_text for hierarchical chunks. Retrieved
+    child chunks are then expanded to their parents when building context.
+    Set duplicate_doc_uris and duplicate_pages to cite the documents of
+    near-duplicate chunks dropped at ingest (see src.tables).
+    """
+
     chunk_text: str
     document_uri: str
     primary_key: str
+    parent_id: Optional[str] = None
+    parent_text: Optional[str] = None
+    duplicate_doc_uris: Optional[str] = None
+    duplicate_pages: Optional[str] = None
     other_columns: List[str] = []
 
     @property
     def all_columns(self) -> List[str]:
         """
-        Combines chunk_text, document_uri, primary_key and other_columns
-        into a single list of all columns.
+        Combines chunk_text, document_uri, primary_key, the parent and
+        duplicate columns if set, and other_columns into a single list of
+        all columns.
         """
-        return [
+        columns = [
             self.chunk_text,
             self.document_uri,
             self.primary_key,
-        ] + self.other_columns
+        ]
+        columns += [x for x in [self.parent_id, self.parent_text] if x]
+        columns += [x for x in [self.duplicate_doc_uris, self.duplicate_pages] if x]
+        return columns + self.other_columns
+
+    @property
+    def key_columns(self) -> List[str]:
+        """
+        The small columns requested by a two-phase search: document_uri,
+        primary_key and parent_id if set.
+        """
+        columns = [self.document_uri, self.primary_key]
+        return columns + [x for x in [self.parent_id] if x]
+
+
+class MetadataFilter(ConfigModel):
+    """
+    Restrict a search to chunks from any of doc_uris, under any of
+    headings, and overlapping the pages min_page to max_page. Unknown
+    keys are rejected so that a misspelt filter cannot widen a search.
+    """
+
+    model_config = ConfigDict(extra="forbid")
+
+    doc_uris: List[str] = []
+    headings: List[str] = []
+    min_page: Optional[int] = None
+    max_page: Optional[int] = None
 
 
 class RetrieverParameters(ConfigModel):
+    """
+    nprobe, rescore_factor, hybrid_candidates and rrf_k are only used by
+    the local backend. nprobe is the number of IVF lists searched by "ann"
+    queries; rescore_factor sets how many quantized candidates per result
+    are rescored exactly. Higher values raise recall and latency.
+    Hybrid queries fuse the top hybrid_candidates of the lexical and
+    vector searches with reciprocal rank fusion using constant rrf_k.
+    """
+
     k: int = 5
     query_type: str = "ann"
+    nprobe: int = 8
+    rescore_factor: int = 4
+    hybrid_candidates: int = 50
+    rrf_k: int = 60
+
+
+class QueryCacheConfig(ConfigModel):
+    """
+    Cache retrieval results for repeated questions. Setting path shares
+    the cache between worker processes through a SQLite file; otherwise
+    each process keeps its own in-memory cache.
+
+    Index syncs in 02_vector_search and src.index_maintenance invalidate
+    the shared SQLite cache once they have finished. An in-memory cache
+    lives in the serving process and cannot be reached from there, so its
+    results can be up to ttl_seconds older than the index.
+    """
+
+    max_size: int = 1024
+    ttl_seconds: Optional[float] = 3600
+    path: Optional[str] = None
+
+
+class RerankerConfig(ConfigModel):
+    """
+    Over-fetch the top candidates results, rerank them and keep the best
+    parameters.k. model is "lexical" for a term overlap score, or the
+    name of a cross-encoder model run on CPU.
+    """
+
+    model: str = "lexical"
+    candidates: int = 20
+    batch_size: int = 32
+    cache_size: int = 4096
+
+
+class EmbeddingConfig(ConfigModel):
+    """
+    Query embedding engine for the local backends, see src.embeddings.
+    Setting local_model embeds on CPU with that Hugging Face model, with
+    the embedding_model endpoint as fallback. Queries are batched up to
+    max_batch_size within max_wait_ms; bulk embedding uses batch_size.
+    """
+
+    local_model: Optional[str] = None
+    pooling: str = "cls"
+    max_batch_size: int = 32
+    max_wait_ms: float = 5.0
+    cache_size: int = 10000
+    batch_size: int = 64
 
 
 class RetrieverConfig(ConfigModel):
+    """
+    backend selects where queries are answered: "databricks" uses the
+    Mosaic AI Vector Search index_name on endpoint_name, "local" searches
+    the index directory at local_index_path built by src.local_index,
+    and "sharded" the shards at local_index_path built by
+    src.sharding.shard_local_index, waiting at most shard_timeout seconds
+    for each shard. Shards keep the IVF and quantized indexes of the
+    source index but not its BM25 index.
+    search_type "hybrid" combines lexical and vector search on either
+    backend, overriding parameters.query_type. Setting cache enables the
+    query result cache in src.query_cache, and setting reranker the
+    rerank stage in src.rerank. max_context_tokens packs the retrieved
+    context into that many tokens and overrides the model's setting.
+    Setting chunk_store_path enables two-phase retrieval: the search
+    returns only mapping.key_columns and the remaining columns are
+    hydrated from that Parquet file for the documents that are kept.
+    filters applies to every search unless a chat request sets
+    custom_inputs.filters. embedding configures the query embedding
+    engine of the local backends.
+    """
+
+    backend: str = "databricks"
+    local_index_path: Optional[str] = None
+    shard_timeout: float = 2.0
+    search_type: Optional[str] = None
     tool_name: Optional[str] = None
     tool_description: Optional[str] = None
     endpoint_name: str
@@ -59,12 +188,74 @@ class RetrieverConfig(ConfigModel):
     parameters: RetrieverParameters
     mapping: RetrieverMapping
     chunk_template: str = "Passage: {chunk_text}\n Document URI: {document_uri}\n"
+    cache: Optional[QueryCacheConfig] = None
+    reranker: Optional[RerankerConfig] = None
+    max_context_tokens: Optional[int] = None
+    chunk_store_path: Optional[str] = None
+    filters: Optional[MetadataFilter] = None
+    embedding: Optional[EmbeddingConfig] = None
+
+
+class IngestConfig(ConfigModel):
+    """
+    Settings for converting and chunking the source PDFs.
+    num_workers > 1 runs conversion in a process pool where each
+    worker owns its own converter and chunker. Setting manifest_path
+    enables incremental ingest, where unchanged documents are skipped.
+    Chunks are written in batches of batch_size records. Setting cache_dir
+    keeps converted documents on disk so re-chunking skips PDF parsing.
+    Setting dedup_threshold drops chunks whose estimated Jaccard similarity
+    to an earlier chunk of the same run is at least that value. Setting
+    child_max_tokens enables hierarchical chunking: small child chunks are
+    indexed and point to the max_tokens parent chunk that contains them.
+    """
+
+    max_tokens: int = 1000
+    do_ocr: bool = False
+    num_workers: int = 1
+    batch_size: int = 1000
+    manifest_path: Optional[str] = None
+    cache_dir: Optional[str] = None
+    dedup_threshold: Optional[float] = None
+    child_max_tokens: Optional[int] = None
+
+    @property
+    def settings(self) -> Dict[str, Any]:
+        """
+        Settings that change the chunk output. A document is re-chunked
+        whenever these differ from the ones recorded in the manifest.
+        """
+        return {
+            "max_tokens": self.max_tokens,
+            "do_ocr": self.do_ocr,
+            "dedup_threshold": self.dedup_threshold,
+            "child_max_tokens": self.child_max_tokens,
+        }
+
+
+class SemanticCacheConfig(ConfigModel):
+    """
+    Reuse the answer to a previous question when the new question's
+    embedding has at least threshold cosine similarity to it. Answers
+    created before the last change of sync_state_path, the sync state
+    file of the index, are not reused.
+    """
+
+    threshold: float = 0.95
+    max_size: int = 512
+    ttl_seconds: Optional[float] = None
+    sync_state_path: Optional[str] = None
 
 
 class AgentConfig(ConfigModel):
+    """
+    Setting semantic_cache adds a semantic answer cache to the chat graph.
+    """
+
     streaming: bool = False
     experiment_location: Optional[str] = None
     uc_model_name: Optional[str] = None
+    semantic_cache: Optional[SemanticCacheConfig] = None
 
 
 class SLSConfig(ConfigModel):
@@ -0,0 +1,214 @@
+import math
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents.base import Document
+
+from src.config import SLSConfig
+from src.lexical import tokenize
+from src.retrievers import format_documents
+
+# Sentence boundaries: end punctuation followed by whitespace, or a newline
+_SENTENCE_PATTERN = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count at about four characters per token, close enough
+    for budgeting without loading the serving model's tokenizer.
+    """
+    return math.ceil(len(text) / 4)
+
+
+def get_context_budget(config: SLSConfig) -> Optional[int]:
+    """
+    Token budget for retrieved context. retriever.max_context_tokens
+    wins over model.parameters.max_context_tokens; None means unlimited.
+    """
+    return (
+        config.retriever.max_context_tokens
+        or config.model.parameters.max_context_tokens
+    )
+
+
+def split_sentences(text: str) -> List[str]:
+    return [x.strip() for x in _SENTENCE_PATTERN.split(text) if x.strip()]
+
+
+def _overlap(left: str, right: str, min_overlap: int = 20) -> int:
+    """
+    Length of the longest suffix of left that is a prefix of right.
+    """
+    for size in range(min(len(left), len(right)), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _adjacent(left: Document, right: Document, pages_key: str) -> bool:
+    """
+    Whether two chunks share a page or sit on neighbouring pages, in
+    either order.
+    """
+    left_pages = left.metadata.get(pages_key) or []
+    right_pages = right.metadata.get(pages_key) or []
+    if not left_pages or not right_pages:
+        return False
+    return (
+        min(right_pages) - max(left_pages) <= 1
+        and min(left_pages) - max(right_pages) <= 1
+    )
+
+
+def _join(previous: Document, doc: Document, pages_key: str) -> Optional[str]:
+    """
+    Text of two chunks of a document merged in reading order, or None if
+    they neither overlap nor sit on adjacent pages.
+    """
+    first, second = previous.page_content, doc.page_content
+    overlap = _overlap(first, second)
+    if overlap:
+        return first + second[overlap:]
+    overlap = _overlap(second, first)
+    if overlap:
+        return second + first[overlap:]
+    if not _adjacent(previous, doc, pages_key):
+        return None
+    if min(doc.metadata[pages_key]) < min(previous.metadata[pages_key]):
+        first, second = second, first
+    return first + "\n" + second
+
+
+def merge_chunks(
+    docs: List[Document], doc_uri_key: str, pages_key: str = "pages"
+) -> List[Document]:
+    """
+    Merge chunks of the same document that overlap in text or sit on the
+    same or adjacent pages into one passage, removing the overlapping
+    text. Merged text follows page order, and passages keep the rank of
+    their best chunk.
+    """
+    merged: List[Document] = []
+    last_by_uri: Dict[Any, int] = {}
+
+    for doc in docs:
+        uri = doc.metadata.get(doc_uri_key)
+        i = last_by_uri.get(uri)
+        if i is not None:
+            previous = merged[i]
+            text = _join(previous, doc, pages_key)
+            if text is not None:
+                pages = sorted(
+                    set(previous.metadata.get(pages_key) or [])
+                    | set(doc.metadata.get(pages_key) or [])
+                )
+                metadata = {**previous.metadata}
+                if pages:
+                    metadata[pages_key] = pages
+                merged[i] = Document(page_content=text, metadata=metadata)
+                continue
+
+        last_by_uri[uri] = len(merged)
+        merged.append(doc)
+
+    return merged
+
+
+def drop_near_duplicates(
+    docs: List[Document], threshold: float = 0.8
+) -> List[Document]:
+    """
+    Drop passages whose term set has Jaccard similarity of at least
+    threshold with a higher ranked passage.
+    """
+    kept, kept_terms = [], []
+    for doc in docs:
+        terms = set(tokenize(doc.page_content))
+        if any(
+            len(terms & other) / max(len(terms | other), 1) >= threshold
+            for other in kept_terms
+        ):
+            continue
+        kept.append(doc)
+        kept_terms.append(terms)
+    return kept
+
+
+def trim_to_budget(
+    query: str,
+    docs: List[Document],
+    budget: int,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> List[Document]:
+    """
+    Keep the sentences that share the most terms with the query, breaking
+    ties by passage rank, until the budget is spent. Kept sentences stay
+    in their original order and repeated sentences are kept once.
+    """
+    query_terms = set(tokenize(query))
+    candidates = []
+    seen = set()
+    for rank, doc in enumerate(docs):
+        for position, sentence in enumerate(split_sentences(doc.page_content)):
+            key = " ".join(tokenize(sentence))
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            score = len(query_terms.intersection(tokenize(sentence)))
+            candidates.append((-score, rank, position, sentence))
+
+    keep = set()
+    used = 0
+    for _, rank, position, sentence in sorted(candidates):
+        tokens = count_tokens(sentence) + 1
+        if used + tokens > budget:
+            continue
+        keep.add((rank, position))
+        used += tokens
+
+    sentences: Dict[int, List[str]] = {}
+    for _, rank, position, sentence in sorted(candidates, key=lambda x: x[1:3]):
+        if (rank, position) in keep:
+            sentences.setdefault(rank, []).append(sentence)
+
+    return [
+        Document(page_content=" ".join(sentences[rank]), metadata=docs[rank].metadata)
+        for rank in sorted(sentences)
+    ]
+
+
+def pack_context(
+    config: SLSConfig,
+    query: str,
+    docs: List[Document],
+    budget: Optional[int] = None,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Build the context for docs within a token budget: merge adjacent or
+    overlapping chunks of a document, drop near-duplicate passages and,
+    if still over budget, keep only the most query-relevant sentences.
+    Returns the context and the token counts before and after packing.
+    """
+    budget = budget or get_context_budget(config)
+    tokens_before = count_tokens(format_documents(config, docs))
+
+    packed = merge_chunks(docs, config.retriever.mapping.document_uri)
+    packed = drop_near_duplicates(packed)
+    context = format_documents(config, packed)
+
+    if budget is not None and count_tokens(context) > budget:
+        template_tokens = count_tokens(context) - sum(
+            count_tokens(d.page_content) for d in packed
+        )
+        packed = trim_to_budget(
+            query, packed, max(budget - template_tokens, 0), count_tokens
+        )
+        context = format_documents(config, packed)
+
+    tokens_after = count_tokens(context)
+    return context, {
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+    }
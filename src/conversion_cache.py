@@ -0,0 +1,52 @@
+import gzip
+import hashlib
+import os
+from importlib.metadata import version
+from pathlib import Path
+
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling.document_converter import DocumentConverter
+from docling_core.types.doc import DoclingDocument
+
+from src.manifest import file_hash
+
+
+class ConversionCache:
+    """
+    On-disk cache of converted DoclingDocuments, keyed by the content hash
+    of the source file and the pipeline options used to convert it. Chunking
+    experiments can then reload the document and skip layout analysis.
+    """
+
+    def __init__(self, cache_dir: str | Path, pipeline_options: PdfPipelineOptions):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        options = f"{version('docling')}:{pipeline_options.model_dump_json()}"
+        self.options_hash = hashlib.sha256(options.encode("utf-8")).hexdigest()[:16]
+
+    def path_for(self, asset_path: str | Path) -> Path:
+        """
+        Cache file for a source document under the current pipeline options.
+        """
+        key = f"{file_hash(asset_path)}-{self.options_hash}"
+        return self.cache_dir / f"{key}.json.gz"
+
+    def convert(
+        self, converter: DocumentConverter, asset_path: str | Path
+    ) -> DoclingDocument:
+        """
+        Return the cached document for asset_path, converting and storing
+        it on a miss. Writes go to a temporary file first so concurrent
+        workers never read a partially written entry.
+        """
+        path = self.path_for(asset_path)
+        if path.exists():
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return DoclingDocument.model_validate_json(f.read())
+
+        document = converter.convert(asset_path).document
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            f.write(document.model_dump_json())
+        tmp_path.replace(path)
+        return document
@@ -0,0 +1,119 @@
+import re
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingle_hashes(text: str, shingle_size: int = 5) -> np.ndarray:
+    """
+    Hash the word shingles of a text to 32 bit integers. crc32 is used
+    rather than hash() so signatures are stable across processes.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [
+            " ".join(words[i : i + shingle_size])
+            for i in range(len(words) - shingle_size + 1)
+        ]
+    return np.array(
+        sorted({zlib.crc32(x.encode("utf-8")) for x in shingles}), dtype=np.uint64
+    )
+
+
+class NearDuplicateFilter:
+    """
+    Drop near-duplicate chunks with MinHash signatures and LSH banding.
+
+    Each chunk is only compared with the kept chunks that share at least
+    one LSH band with it, and only with those chunks, never with the
+    duplicates that were dropped. The cost is therefore roughly linear in
+    the number of chunks rather than quadratic. The first chunk of each
+    group is kept. Every dropped chunk is recorded in duplicates with the
+    id of the chunk that replaced it.
+
+    With 16 bands of 8 rows, pairs above ~0.7 Jaccard similarity are
+    likely to become candidates. Candidates are then confirmed against
+    threshold using the estimated similarity.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 5,
+        seed: int = 0,
+    ):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+
+        rng = np.random.default_rng(seed)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, 1 << 31, size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=(num_perm, 1), dtype=np.uint64)
+        self._buckets: Dict[bytes, List[int]] = {}
+        self._signatures: List[np.ndarray] = []
+        self._ids: List[str] = []
+        self.duplicates: List[Dict[str, Any]] = []
+
+    def signature(self, text: str) -> np.ndarray:
+        """
+        MinHash signature of a text, one minimum per permutation.
+        """
+        hashes = shingle_hashes(text, self.shingle_size)
+        permuted = (self._a * hashes + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            bytes([band])
+            + signature[band * self.rows : (band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def find(self, signature: np.ndarray) -> Optional[str]:
+        """
+        Return the id of a kept chunk similar to signature, if there is one.
+        """
+        seen = set()
+        for key in self._band_keys(signature):
+            for idx in self._buckets.get(key, []):
+                if idx in seen:
+                    continue
+                seen.add(idx)
+                similarity = np.mean(self._signatures[idx] == signature)
+                if similarity >= self.threshold:
+                    return self._ids[idx]
+        return None
+
+    def add(self, chunk_id: str, signature: np.ndarray) -> None:
+        """
+        Register a kept chunk so later chunks can be matched against it.
+        """
+        idx = len(self._ids)
+        self._ids.append(chunk_id)
+        self._signatures.append(signature)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(idx)
+
+    def filter(self, chunks: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the chunks that are not near-duplicates of an earlier chunk.
+        """
+        for chunk in chunks:
+            signature = self.signature(chunk["text"])
+            canonical_id = self.find(signature)
+            if canonical_id is None:
+                self.add(chunk["id"], signature)
+                yield chunk
+            else:
+                self.duplicates.append({**chunk, "canonical_id": canonical_id})
@@ -0,0 +1,234 @@
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from databricks_langchain import DatabricksEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from src.config import EmbeddingConfig, SLSConfig
+from src.query_cache import normalize_query
+
+log = logging.getLogger(__name__)
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    Embeds text in-process on CPU with a Hugging Face encoder, such as
+    BAAI/bge-large-en for the databricks-bge-large-en endpoint. Batches
+    are padded to their longest text, so callers should group texts of
+    similar length.
+    """
+
+    def __init__(self, model_name: str, pooling: str = "cls", max_length: int = 512):
+        try:
+            import torch
+            from transformers import AutoModel, AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "Local embeddings need torch and transformers, installed with "
+                "the local-models extra"
+            ) from e
+
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name)
+        self.model.eval()
+        self.pooling = pooling
+        self.max_length = max_length
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="pt",
+        )
+        with self.torch.inference_mode():
+            hidden = self.model(**inputs).last_hidden_state
+        if self.pooling == "cls":
+            vectors = hidden[:, 0]
+        else:
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            vectors = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        vectors = self.torch.nn.functional.normalize(vectors, dim=-1)
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class _Request:
+    __slots__ = ("text", "key", "future", "enqueued_at")
+
+    def __init__(self, text: str, key: str):
+        self.text = text
+        self.key = key
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Embedding engine shared by every query of a process. Concurrent
+    embed_query calls are queued and embedded together in batches of up to
+    max_batch_size, waiting at most max_wait_ms for a batch to fill.
+    Query embeddings are cached by normalized text in an LRU of
+    cache_size entries. If the primary model fails, the batch is retried
+    on fallback, such as the remote serving endpoint.
+
+    embed_documents is the bulk path for ingest: texts are sorted by
+    length and embedded in batches of batch_size, so each batch pads to
+    texts of similar length. Results keep the input order.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        fallback: Optional[Embeddings] = None,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        cache_size: int = 10000,
+        batch_size: int = 64,
+    ):
+        self.embedding = embedding
+        self.fallback = fallback
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.fallbacks = 0
+        self._cache: OrderedDict[str, List[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._batch_sizes: deque = deque(maxlen=10000)
+        self._queue_waits: deque = deque(maxlen=10000)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        try:
+            return self.embedding.embed_documents(texts)
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            log.warning(f"Embedding failed, using the fallback: {e}")
+            with self._lock:
+                self.fallbacks += 1
+            return self.fallback.embed_documents(texts)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = batch[0].enqueued_at + self.max_wait
+            # Take whatever is already queued, then wait for more until the
+            # oldest request has waited max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._embed_batch(batch)
+
+    def _embed_batch(self, batch: List[_Request]) -> None:
+        started = time.monotonic()
+        texts = {r.key: r.text for r in batch}
+        try:
+            vectors = dict(zip(texts, self._embed(list(texts.values()))))
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        with self._lock:
+            self._batch_sizes.append(len(texts))
+            self._queue_waits.extend(started - r.enqueued_at for r in batch)
+            for key, vector in vectors.items():
+                self._cache[key] = vector
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        for request in batch:
+            request.future.set_result(vectors[request.key])
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_query(text)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return self._cache[key]
+            self.cache_misses += 1
+
+        request = _Request(text, key)
+        self._queue.put(request)
+        return request.future.result()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        order = np.argsort([len(x) for x in texts], kind="stable")
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start : start + self.batch_size]
+            for i, vector in zip(batch, self._embed([texts[i] for i in batch])):
+                vectors[i] = vector
+        return vectors
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Batch sizes and queue waits of recent query batches, with cache and
+        fallback counters.
+        """
+        with self._lock:
+            sizes = np.array(self._batch_sizes or [0])
+            waits = np.array(self._queue_waits or [0.0]) * 1000
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "batches": len(self._batch_sizes),
+                "mean_batch_size": float(sizes.mean()),
+                "max_batch_size": int(sizes.max()),
+                "queue_wait_p50_ms": float(np.percentile(waits, 50)),
+                "queue_wait_p95_ms": float(np.percentile(waits, 95)),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "cache_hit_rate": self.cache_hits / lookups if lookups else 0.0,
+                "fallbacks": self.fallbacks,
+            }
+
+
+def get_embeddings(config: SLSConfig) -> Embeddings:
+    """
+    Query embeddings for the local backends. Without retriever.embedding
+    this is the embedding_model serving endpoint. With it, queries go
+    through a BatchingEmbeddings engine, embedded in-process by
+    local_model if set, falling back to the serving endpoint.
+    """
+    remote = DatabricksEmbeddings(endpoint=config.retriever.embedding_model)
+    engine: Optional[EmbeddingConfig] = config.retriever.embedding
+    if engine is None:
+        return remote
+
+    if engine.local_model is not None:
+        primary = LocalEmbeddings(engine.local_model, engine.pooling)
+        fallback = remote
+    else:
+        primary, fallback = remote, None
+
+    return BatchingEmbeddings(
+        primary,
+        fallback,
+        max_batch_size=engine.max_batch_size,
+        max_wait_ms=engine.max_wait_ms,
+        cache_size=engine.cache_size,
+        batch_size=engine.batch_size,
+    )
@@ -0,0 +1,571 @@
+import io
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain_core.embeddings import Embeddings
+from pydantic import BaseModel
+
+from src.ann import IVF_IDS_FILE, IVF_OFFSETS_FILE, IVFIndex, assign
+from src.lexical import BM25Index, append_bm25_index, build_bm25_index
+from src.local_index import (
+    CHUNKS_FILE,
+    EMBEDDINGS_FILE,
+    TOMBSTONES_FILE,
+    normalize,
+)
+from src.metadata_index import (
+    MetadataIndex,
+    append_metadata_index,
+    build_metadata_index,
+)
+from src.quantization import QuantizedIndex
+from src.query_cache import QueryCache
+from src.semantic_cache import SemanticCache
+
+log = logging.getLogger(__name__)
+
+# Sync state of a local index, stored alongside it
+MAINTENANCE_FILE = "maintenance.json"
+
+# Change types of a Delta change data feed. A local change log uses the
+# same layout: the chunk columns plus _change_type, _commit_version and
+# _commit_timestamp.
+UPSERT_CHANGES = ("insert", "update_postimage")
+DELETE_CHANGES = ("delete",)
+
+
+class SyncState(BaseModel):
+    """
+    The last source table version reflected in an index.
+    """
+
+    version: int
+    commit_timestamp: float
+    synced_at: float
+
+
+def load_sync_state(path: str | Path) -> Optional[SyncState]:
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "r") as f:
+        return SyncState.model_validate(json.load(f))
+
+
+def save_sync_state(state: SyncState, path: str | Path) -> None:
+    """
+    Write the state atomically so an interrupted run keeps the old one.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state.model_dump(), f, indent=2)
+    tmp_path.replace(path)
+
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    return pd.Timestamp(value).timestamp()
+
+
+def freshness_lag(pending_timestamps: List[Any], now: Optional[float] = None) -> float:
+    """
+    Seconds since the oldest source change not yet reflected in the
+    index, or 0 if the index is up to date.
+    """
+    if not pending_timestamps:
+        return 0.0
+    now = time.time() if now is None else now
+    return max(0.0, now - min(_timestamp(x) for x in pending_timestamps))
+
+
+def table_history(spark, table: str) -> pd.DataFrame:
+    """
+    Version, commit timestamp and operation of every commit of a Delta
+    table, oldest first.
+    """
+    history = spark.sql(f"DESCRIBE HISTORY {table}")
+    return (
+        history.select("version", "timestamp", "operation")
+        .toPandas()
+        .sort_values("version")
+        .reset_index(drop=True)
+    )
+
+
+def read_change_feed(spark, table: str, starting_version: int):
+    """
+    The change data feed of a Delta table from starting_version on, as a
+    Spark DataFrame. Update preimages are dropped; the postimage carries
+    the new row.
+    """
+    import pyspark.sql.functions as F
+
+    changes = (
+        spark.read.format("delta")
+        .option("readChangeFeed", "true")
+        .option("startingVersion", starting_version)
+        .table(table)
+    )
+    return changes.filter(F.col("_change_type") != "update_preimage")
+
+
+def sync_delta_index(
+    spark,
+    index,
+    table: str,
+    state_path: str | Path,
+    wait: bool = True,
+    cache: Optional[QueryCache] = None,
+    semantic_cache: Optional[SemanticCache] = None,
+    index_name: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Sync a Delta sync vector search index only if its source table has
+    changed rows since the last sync recorded at state_path. Commits that
+    change no rows, such as table property changes, are skipped without
+    a sync. A triggered sync runs asynchronously; with wait, this returns
+    once it has finished, and the given query and semantic caches are
+    invalidated for index_name (every index if it is None). The state is
+    only rewritten when the table has new commits, so its modification
+    time marks the last change for caches in other processes. Returns
+    whether it synced, the number of changed rows and the freshness lag
+    of the index before the sync.
+    """
+    history = table_history(spark, table)
+    latest = history.iloc[-1]
+    state = load_sync_state(state_path)
+    pending = history if state is None else history[history.version > state.version]
+
+    metrics = {
+        "source_version": int(latest.version),
+        "freshness_lag_seconds": freshness_lag(pending.timestamp.tolist()),
+        "changes": 0,
+        "synced": False,
+    }
+    if state is None:
+        # Nothing recorded yet, so we cannot tell what the index has seen
+        metrics["synced"] = True
+    elif len(pending):
+        metrics["changes"] = read_change_feed(spark, table, state.version + 1).count()
+        metrics["synced"] = metrics["changes"] > 0
+
+    if metrics["synced"]:
+        index.sync()
+        if wait:
+            index.wait_until_ready(wait_for_updates=True)
+            for c in (cache, semantic_cache):
+                if c is not None:
+                    c.invalidate(index_name)
+
+    if state is None or len(pending):
+        save_sync_state(
+            SyncState(
+                version=int(latest.version),
+                commit_timestamp=_timestamp(latest.timestamp),
+                synced_at=time.time(),
+            ),
+            state_path,
+        )
+    log.info(f"Index sync of {table}: {metrics}")
+    return metrics
+
+
+def read_change_log(path: str | Path, after_version: int = -1) -> pd.DataFrame:
+    """
+    Changes with a commit version above after_version from a local change
+    log, a Parquet file or directory in change data feed layout.
+    """
+    changes = pd.read_parquet(path)
+    return changes[changes["_commit_version"] > after_version]
+
+
+def _append_rows(path: Path, rows: np.ndarray) -> None:
+    """
+    Append rows to a 2-D .npy file in place. numpy leaves room in the
+    header for the first dimension to grow, so normally only the header
+    is rewritten and the new rows are written at the end; otherwise the
+    file is copied once.
+    """
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            read_header = np.lib.format.read_array_header_1_0
+            write_header = np.lib.format.write_array_header_1_0
+        else:
+            read_header = np.lib.format.read_array_header_2_0
+            write_header = np.lib.format.write_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        data_offset = f.tell()
+        if fortran_order or dtype != rows.dtype or shape[1:] != rows.shape[1:]:
+            raise ValueError(f"Cannot append {rows.shape} {rows.dtype} rows to {path}")
+
+        header = {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": (shape[0] + len(rows), *shape[1:]),
+        }
+        buffer = io.BytesIO()
+        write_header(buffer, header)
+        if buffer.tell() == data_offset:
+            f.seek(0)
+            f.write(buffer.getvalue())
+            f.seek(0, 2)
+            f.write(np.ascontiguousarray(rows).tobytes())
+            return
+
+    existing = np.load(path, mmap_mode="r")
+    tmp_path = path.with_suffix(".tmp.npy")
+    matrix = np.lib.format.open_memmap(
+        tmp_path, mode="w+", dtype=dtype, shape=header["shape"]
+    )
+    for start in range(0, shape[0], 65536):
+        matrix[start : start + 65536] = existing[start : start + 65536]
+    matrix[shape[0] :] = rows
+    matrix.flush()
+    del existing, matrix
+    tmp_path.replace(path)
+
+
+def _truncate_rows(path: Path, num_rows: int) -> None:
+    """
+    Keep only the first num_rows rows of a 2-D .npy file. The kept rows
+    are copied to a new file in chunks, which then replaces the old one.
+    """
+    existing = np.load(path, mmap_mode="r")
+    tmp_path = path.with_suffix(".tmp.npy")
+    shape = (num_rows, *existing.shape[1:])
+    matrix = np.lib.format.open_memmap(
+        tmp_path, mode="w+", dtype=existing.dtype, shape=shape
+    )
+    for start in range(0, num_rows, 65536):
+        stop = min(start + 65536, num_rows)
+        matrix[start:stop] = existing[start:stop]
+    matrix.flush()
+    del existing, matrix
+    tmp_path.replace(path)
+
+
+class LocalIndexMaintainer:
+    """
+    Applies source table changes to a local index in place, so a sync
+    only embeds the changed chunks.
+
+    Upserted chunks are embedded and appended as new rows; the rows they
+    replace, and deleted chunks, are marked in a tombstone mask that
+    LocalVectorStore skips. New rows join the existing IVF lists and
+    quantized codes without retraining, and their postings are merged
+    into the BM25 and metadata indexes, so only the new chunks are
+    tokenized. Tombstoned rows keep their postings and still count in
+    the BM25 statistics until the index is compacted. Once more than
+    compact_threshold of the rows are tombstoned, the index is compacted:
+    dead rows are dropped and the derived indexes rebuilt from the kept
+    embeddings, so nothing is re-embedded.
+
+    The version and commit time of the last applied change are kept in
+    maintenance.json next to the index. If a query cache or semantic
+    cache is given, its entries for index_name (by default the index
+    path, as used by src.retrievers.get_index_name) are invalidated
+    whenever changes are applied.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        embedding: Embeddings,
+        primary_key: str = "id",
+        text_column: str = "text",
+        lexical_column: Optional[str] = None,
+        compact_threshold: float = 0.2,
+        cache: Optional[QueryCache] = None,
+        index_name: Optional[str] = None,
+        semantic_cache: Optional[SemanticCache] = None,
+    ):
+        self.path = Path(path)
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self.index_name = index_name or str(path)
+        self.embedding = embedding
+        self.primary_key = primary_key
+        self.text_column = text_column
+        self.lexical_column = lexical_column or text_column
+        self.compact_threshold = compact_threshold
+
+    @property
+    def state_path(self) -> Path:
+        return self.path / MAINTENANCE_FILE
+
+    def load_state(self) -> Optional[SyncState]:
+        return load_sync_state(self.state_path)
+
+    def mark_synced(self, version: int, commit_timestamp: Any) -> None:
+        """
+        Record that the index reflects the source table at version, as
+        after a full build.
+        """
+        save_sync_state(
+            SyncState(
+                version=version,
+                commit_timestamp=_timestamp(commit_timestamp),
+                synced_at=time.time(),
+            ),
+            self.state_path,
+        )
+
+    def _load_tombstones(self, num_rows: int) -> np.ndarray:
+        path = self.path / TOMBSTONES_FILE
+        tombstones = np.zeros(num_rows, dtype=bool)
+        if path.exists():
+            existing = np.load(path)
+            tombstones[: len(existing)] = existing
+        return tombstones
+
+    def apply_changes(self, changes: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Apply change data feed rows newer than the recorded state and
+        return counts of the applied changes with the freshness lag of the
+        index before applying them.
+
+        The chunk table is written after the embeddings and IVF and
+        quantized indexes, and the sync state last. If a sync fails in
+        between, the next one discards the embedding rows and index
+        entries it left past the end of the chunk table before applying
+        the same changes again. An interrupted compaction is finished or
+        discarded first, see compact.
+        """
+        state = self.load_state()
+        if state is not None:
+            changes = changes[changes["_commit_version"] > state.version]
+        changes = changes[changes["_change_type"].isin(UPSERT_CHANGES + DELETE_CHANGES)]
+        metrics = {
+            "freshness_lag_seconds": freshness_lag(
+                changes["_commit_timestamp"].tolist()
+            ),
+            "upserts": 0,
+            "deletes": 0,
+            "compacted": False,
+        }
+        if changes.empty:
+            return metrics
+
+        # Only the last change of each key in this batch matters
+        latest = changes.sort_values("_commit_version", kind="stable").drop_duplicates(
+            self.primary_key, keep="last"
+        )
+        upserts = latest[latest["_change_type"].isin(UPSERT_CHANGES)]
+        self._finish_compaction()
+        chunks = pd.read_parquet(self.path / CHUNKS_FILE)
+        num_rows = len(chunks)
+        self._discard_partial_sync(num_rows)
+        tombstones = self._load_tombstones(len(chunks))
+
+        # Every live row of a changed key is replaced or deleted
+        changed = chunks[self.primary_key].isin(latest[self.primary_key])
+        tombstones |= changed.to_numpy()
+        metrics["deletes"] = int((latest["_change_type"].isin(DELETE_CHANGES)).sum())
+        metrics["upserts"] = len(upserts)
+
+        if len(upserts):
+            new_chunks = upserts[chunks.columns].reset_index(drop=True)
+            vectors = normalize(
+                self.embedding.embed_documents(new_chunks[self.text_column].tolist())
+            )
+            _append_rows(self.path / EMBEDDINGS_FILE, vectors)
+            chunks = pd.concat([chunks, new_chunks], ignore_index=True)
+            tombstones = np.concatenate([tombstones, np.zeros(len(upserts), bool)])
+            self._append_to_ivf(vectors, num_rows)
+            self._append_to_quantized(vectors)
+
+        chunks.to_parquet(self.path / CHUNKS_FILE)
+        np.save(self.path / TOMBSTONES_FILE, tombstones)
+        if tombstones.mean() > self.compact_threshold:
+            self.compact()
+            metrics["compacted"] = True
+        else:
+            self._append_to_lexical(chunks, num_rows)
+
+        last = latest.iloc[-1]
+        self.mark_synced(int(last["_commit_version"]), last["_commit_timestamp"])
+        for cache in (self.cache, self.semantic_cache):
+            if cache is not None:
+                cache.invalidate(self.index_name)
+        log.info(f"Applied changes to {self.path}: {metrics}")
+        return metrics
+
+    def _discard_partial_sync(self, num_rows: int) -> None:
+        """
+        Bring the embeddings and the IVF and quantized indexes back to the
+        num_rows rows of the chunk table, after a sync that failed before
+        writing it.
+        """
+        embeddings_path = self.path / EMBEDDINGS_FILE
+        num_vectors = len(np.load(embeddings_path, mmap_mode="r"))
+        if num_vectors < num_rows:
+            raise ValueError(
+                f"{self.path} has {num_rows} chunks but only {num_vectors} "
+                "embeddings; rebuild the index"
+            )
+        if num_vectors > num_rows:
+            log.warning(
+                f"Dropping {num_vectors - num_rows} embeddings of an "
+                f"unfinished sync from {self.path}"
+            )
+            _truncate_rows(embeddings_path, num_rows)
+
+        vectors = np.load(embeddings_path, mmap_mode="r")
+        if IVFIndex.exists(self.path):
+            ivf = IVFIndex.load(self.path)
+            if len(ivf.ids) != num_rows:
+                self._save_ivf_lists(assign(vectors, ivf.centroids))
+        if QuantizedIndex.exists(self.path):
+            quantized = QuantizedIndex.load(self.path)
+            if len(quantized.codes) != num_rows:
+                QuantizedIndex.encode(vectors, quantized.kind).save(self.path)
+
+    def _append_to_ivf(self, vectors: np.ndarray, start: int) -> None:
+        if not IVFIndex.exists(self.path):
+            return
+        ivf = IVFIndex.load(self.path)
+        labels = np.empty(start, dtype=np.int64)
+        for i in range(ivf.nlist):
+            labels[ivf.ids[ivf.offsets[i] : ivf.offsets[i + 1]]] = i
+        labels = np.concatenate([labels, assign(vectors, ivf.centroids)])
+        del ivf
+        self._save_ivf_lists(labels)
+
+    def _save_ivf_lists(self, labels: np.ndarray) -> None:
+        nlist = len(np.load(self.path / IVF_OFFSETS_FILE)) - 1
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=nlist))
+        np.save(self.path / IVF_OFFSETS_FILE, offsets)
+        np.save(self.path / IVF_IDS_FILE, np.argsort(labels, kind="stable"))
+
+    def _append_to_quantized(self, vectors: np.ndarray) -> None:
+        if not QuantizedIndex.exists(self.path):
+            return
+        quantized = QuantizedIndex.load(self.path)
+        if quantized.kind == "int8":
+            # Keep the existing scale; values beyond it are clipped
+            codes = np.rint(vectors / quantized.scale)
+            codes = np.clip(codes, -127, 127).astype(np.int8)
+        else:
+            codes = np.packbits(vectors > 0, axis=1)
+        quantized.codes = np.concatenate([quantized.codes, codes])
+        quantized.save(self.path)
+
+    def _append_to_lexical(self, chunks: pd.DataFrame, start: int) -> None:
+        """
+        Add the chunks from row start on to the metadata and BM25 indexes.
+        An index that does not hold exactly the rows before start, as after
+        a sync that failed before updating it, is rebuilt instead.
+        """
+        new_chunks = chunks.iloc[start:]
+        if (
+            MetadataIndex.exists(self.path)
+            and len(MetadataIndex.load(self.path).page_first) == start
+        ):
+            if len(new_chunks):
+                append_metadata_index(self.path, new_chunks)
+        else:
+            build_metadata_index(self.path, chunks)
+
+        if not BM25Index.exists(self.path):
+            return
+        texts = chunks[self.lexical_column]
+        if len(BM25Index.load(self.path).doc_lengths) == start:
+            if len(new_chunks):
+                append_bm25_index(self.path, texts.iloc[start:].tolist())
+        else:
+            build_bm25_index(self.path, texts.tolist())
+
+    def _rebuild_lexical(self, chunks: pd.DataFrame) -> None:
+        build_metadata_index(self.path, chunks)
+        if BM25Index.exists(self.path):
+            build_bm25_index(self.path, chunks[self.lexical_column].tolist())
+
+    @property
+    def _compact_paths(self) -> Tuple[Path, Path]:
+        return (
+            self.path / f"{EMBEDDINGS_FILE}.compact.npy",
+            self.path / f"{CHUNKS_FILE}.compact",
+        )
+
+    def compact(self) -> None:
+        """
+        Drop tombstoned rows from the chunk table and embeddings and
+        rebuild the derived indexes over the kept rows.
+
+        The kept embeddings and chunks are first written next to the
+        index. The compacted chunk table appears last, under its final
+        temporary name, and marks the compaction as ready to swap in; a
+        run interrupted before that leaves the index untouched, and one
+        interrupted after it is finished by _finish_compaction.
+        """
+        self._finish_compaction()
+        chunks = pd.read_parquet(self.path / CHUNKS_FILE)
+        tombstones = self._load_tombstones(len(chunks))
+        live = np.flatnonzero(~tombstones)
+
+        embeddings_path, chunks_path = self._compact_paths
+        vectors = np.load(self.path / EMBEDDINGS_FILE, mmap_mode="r")
+        matrix = np.lib.format.open_memmap(
+            embeddings_path,
+            mode="w+",
+            dtype=np.float32,
+            shape=(len(live), vectors.shape[1]),
+        )
+        for start in range(0, len(live), 65536):
+            matrix[start : start + 65536] = vectors[live[start : start + 65536]]
+        matrix.flush()
+        del vectors, matrix
+
+        partial_path = chunks_path.with_suffix(".partial")
+        chunks.iloc[live].reset_index(drop=True).to_parquet(partial_path)
+        partial_path.replace(chunks_path)
+
+        self._finish_compaction()
+        log.info(f"Compacted {self.path}: dropped {len(tombstones) - len(live)} rows")
+
+    def _finish_compaction(self) -> None:
+        """
+        Swap in the files of a compaction that was written completely, or
+        discard those of one that was not, then rebuild the derived indexes
+        over the compacted rows. The embeddings are replaced before the
+        tombstones are dropped and the chunk table last, so the chunk table
+        left behind tells whether the swap still has to be finished.
+        """
+        embeddings_path, chunks_path = self._compact_paths
+        if not chunks_path.exists():
+            embeddings_path.unlink(missing_ok=True)
+            chunks_path.with_suffix(".partial").unlink(missing_ok=True)
+            return
+
+        if embeddings_path.exists():
+            embeddings_path.replace(self.path / EMBEDDINGS_FILE)
+        (self.path / TOMBSTONES_FILE).unlink(missing_ok=True)
+        chunks_path.replace(self.path / CHUNKS_FILE)
+
+        vectors = np.load(self.path / EMBEDDINGS_FILE, mmap_mode="r")
+        if IVFIndex.exists(self.path):
+            self._save_ivf_lists(assign(vectors, IVFIndex.load(self.path).centroids))
+        if QuantizedIndex.exists(self.path):
+            quantized = QuantizedIndex.load(self.path)
+            QuantizedIndex.encode(vectors, quantized.kind).save(self.path)
+        del vectors
+        self._rebuild_lexical(pd.read_parquet(self.path / CHUNKS_FILE))
+
+    def freshness_lag_seconds(self, changes: pd.DataFrame) -> float:
+        """
+        Freshness lag of the index against a change log or feed.
+        """
+        state = self.load_state()
+        if state is not None:
+            changes = changes[changes["_commit_version"] > state.version]
+        return freshness_lag(changes["_commit_timestamp"].tolist())
@@ -0,0 +1,298 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from docling.chunking import HybridChunker
+from docling.datamodel.base_models import InputFormat
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling.document_converter import DocumentConverter, PdfFormatOption
+from docling_core.types.doc import DoclingDocument
+
+from src.config import IngestConfig
+from src.conversion_cache import ConversionCache
+from src.retrievers import make_text_chunk
+
+# Column types of the records returned by make_text_chunk. Passing these
+# explicitly keeps every batch consistent, even when a batch happens to
+# contain only empty headings or captions. parent_id and parent_text are
+# only set by hierarchical chunking.
+CHUNK_TABLE_SCHEMA = (
+    "id string, doc_uri string, pages array<int>, doc_refs array<string>, "
+    "headings array<string>, captions array<string>, text string, "
+    "enriched_text string, parent_id string, parent_text string"
+)
+CHUNK_ARROW_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("doc_uri", pa.string()),
+        ("pages", pa.list_(pa.int32())),
+        ("doc_refs", pa.list_(pa.string())),
+        ("headings", pa.list_(pa.string())),
+        ("captions", pa.list_(pa.string())),
+        ("text", pa.string()),
+        ("enriched_text", pa.string()),
+        ("parent_id", pa.string()),
+        ("parent_text", pa.string()),
+    ]
+)
+
+# Per-process converter, chunker and cache, populated by _init_worker
+_worker_config: Optional[IngestConfig] = None
+_converter: Optional[DocumentConverter] = None
+_chunker: Optional[HybridChunker] = None
+_child_chunker: Optional[HybridChunker] = None
+_cache: Optional[ConversionCache] = None
+
+
+def get_pipeline_options(config: IngestConfig) -> PdfPipelineOptions:
+    """
+    Build the PDF pipeline options from the ingest config.
+    """
+    pipeline_options = PdfPipelineOptions()
+    pipeline_options.do_ocr = config.do_ocr
+    return pipeline_options
+
+
+def get_converter(config: IngestConfig) -> DocumentConverter:
+    """
+    Build a PDF document converter from the ingest config.
+    """
+    return DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(
+                pipeline_options=get_pipeline_options(config)
+            )
+        }
+    )
+
+
+def get_conversion_cache(config: IngestConfig) -> Optional[ConversionCache]:
+    """
+    Build the conversion cache, if one is configured.
+    """
+    if config.cache_dir is None:
+        return None
+    return ConversionCache(config.cache_dir, get_pipeline_options(config))
+
+
+def get_chunker(config: IngestConfig) -> HybridChunker:
+    """
+    Build a hybrid chunker that respects headings and hierarchy.
+    """
+    return HybridChunker(max_tokens=config.max_tokens)
+
+
+def get_child_chunker(config: IngestConfig) -> Optional[HybridChunker]:
+    """
+    Build the chunker for small child chunks, if hierarchical chunking
+    is enabled.
+    """
+    if config.child_max_tokens is None:
+        return None
+    return HybridChunker(max_tokens=config.child_max_tokens)
+
+
+def make_hierarchical_chunks(
+    document: DoclingDocument,
+    chunker: HybridChunker,
+    child_chunker: HybridChunker,
+    doc_uri: str,
+) -> List[Dict[str, Any]]:
+    """
+    Chunk a document twice, into large parent chunks and small child
+    chunks. Only the children are returned. Each child points to the
+    parent that contains its first doc item, and carries the parent's
+    text so retrieval can expand small hits into their full section.
+    """
+    parents = {}
+    ref_to_parent = {}
+    for parent in (
+        make_text_chunk(x, doc_uri=doc_uri) for x in chunker.chunk(document)
+    ):
+        parents[parent["id"]] = parent
+        for ref in parent["doc_refs"]:
+            ref_to_parent.setdefault(ref, parent["id"])
+
+    children = []
+    for child in (
+        make_text_chunk(x, doc_uri=doc_uri) for x in child_chunker.chunk(document)
+    ):
+        parent_id = (
+            ref_to_parent.get(child["doc_refs"][0]) if child["doc_refs"] else None
+        )
+        if parent_id is not None:
+            child["parent_id"] = parent_id
+            child["parent_text"] = parents[parent_id]["text"]
+        children.append(child)
+
+    return children
+
+
+def process_document(
+    converter: DocumentConverter,
+    chunker: HybridChunker,
+    asset_path: str | Path,
+    doc_uri: str,
+    cache: Optional[ConversionCache] = None,
+    child_chunker: Optional[HybridChunker] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Convert a single PDF and return its text chunks. With a cache, the
+    converted document is reused across runs and only chunking is redone.
+    With a child chunker, small child chunks linked to their parents are
+    returned instead, see make_hierarchical_chunks.
+    """
+    if cache is not None:
+        document = cache.convert(converter, asset_path)
+    else:
+        document = converter.convert(asset_path).document
+
+    if child_chunker is not None:
+        return make_hierarchical_chunks(document, chunker, child_chunker, doc_uri)
+
+    chunk_iter = chunker.chunk(document)
+    return [make_text_chunk(x, doc_uri=doc_uri) for x in chunk_iter]
+
+
+def _init_worker(config: IngestConfig) -> None:
+    """
+    Load the converter, chunker and cache once per worker process. They
+    are only rebuilt if the process is later given a different config.
+    """
+    global _worker_config, _converter, _chunker, _child_chunker, _cache
+    if config == _worker_config:
+        return
+
+    _worker_config = config
+    _converter = get_converter(config)
+    _chunker = get_chunker(config)
+    _child_chunker = get_child_chunker(config)
+    _cache = get_conversion_cache(config)
+
+
+def _process_row(row: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Process one document inside a worker. Errors are isolated to the
+    document so a bad PDF does not take down the whole pool; a failed
+    document returns None rather than an empty list of chunks.
+    """
+    try:
+        print(f"Processing {row['title']}")
+        return process_document(
+            _converter,
+            _chunker,
+            row["path"],
+            doc_uri=row["link_to_page"],
+            cache=_cache,
+            child_chunker=_child_chunker,
+        )
+    except Exception as e:
+        print(f"Error processing {row['asset_path']}: {str(e)}")
+        return None
+
+
+def process_rows(
+    rows: Iterable[Dict[str, Any]], config: IngestConfig
+) -> Iterator[Optional[List[Dict[str, Any]]]]:
+    """
+    Process rows in the current process, yielding the chunks of each
+    document, or None for a document that failed. Rows need title,
+    link_to_page, asset_path and a resolved path. The converter is loaded
+    on first use and reused afterwards, which is what lets Spark python
+    workers pay for it only once.
+    """
+    _init_worker(config)
+    return map(_process_row, rows)
+
+
+def iter_document_chunks(
+    df: pd.DataFrame, config: IngestConfig, root: str | Path = "."
+) -> Iterator[Optional[List[Dict[str, Any]]]]:
+    """
+    Yield the chunks of each document in df, a frame with title,
+    link_to_page and asset_path columns, or None for a document that
+    failed. Asset paths are resolved relative to root. Documents are
+    yielded in the row order of df, regardless of the number of workers,
+    and at most two documents per worker are in flight so memory does not
+    grow with the corpus.
+    """
+    rows = (
+        {**row, "path": Path(root) / row["asset_path"]}
+        for row in df.to_dict(orient="records")
+    )
+
+    if config.num_workers <= 1:
+        yield from process_rows(rows, config)
+        return
+
+    executor = ProcessPoolExecutor(
+        max_workers=config.num_workers,
+        initializer=_init_worker,
+        initargs=(config,),
+    )
+    with executor:
+        pending = deque()
+        for row in rows:
+            pending.append(executor.submit(_process_row, row))
+            if len(pending) >= 2 * config.num_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_chunks(
+    df: pd.DataFrame,
+    config: IngestConfig,
+    root: str | Path = ".",
+    failed: Optional[List[str]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the text chunks of every document in df, in row order. The
+    doc_uri of every document that failed is appended to failed.
+    """
+    doc_uris = df["link_to_page"].tolist()
+    for doc_uri, doc_chunks in zip(doc_uris, iter_document_chunks(df, config, root)):
+        if doc_chunks is None:
+            if failed is not None:
+                failed.append(doc_uri)
+            continue
+        yield from doc_chunks
+
+
+def ingest_documents(
+    df: pd.DataFrame, config: IngestConfig, root: str | Path = "."
+) -> List[Dict[str, Any]]:
+    """
+    Convert and chunk every document in df into a single list. Prefer
+    iter_chunks with batched writes for large corpora.
+    """
+    return list(iter_chunks(df, config, root))
+
+
+def batched(iterable: Iterable, batch_size: int) -> Iterator[List]:
+    """
+    Group an iterable into lists of at most batch_size items.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def write_parquet(
+    chunks: Iterable[Dict[str, Any]], path: str | Path, batch_size: int = 1000
+) -> int:
+    """
+    Write chunks to a Parquet file, one row group per batch, so only one
+    batch is held in memory at a time. Returns the number of rows written.
+    """
+    num_rows = 0
+    with pq.ParquetWriter(path, CHUNK_ARROW_SCHEMA) as writer:
+        for batch in batched(chunks, batch_size):
+            writer.write_table(pa.Table.from_pylist(batch, schema=CHUNK_ARROW_SCHEMA))
+            num_rows += len(batch)
+    return num_rows
@@ -0,0 +1,259 @@
+import json
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.ann import top_k
+
+# Files of a BM25 inverted index, stored alongside the local index. The
+# postings of term i are doc_ids[offsets[i]:offsets[i + 1]] with matching
+# term frequencies in tfs.
+BM25_TERMS_FILE = "bm25_terms.json"
+BM25_OFFSETS_FILE = "bm25_offsets.npy"
+BM25_DOC_IDS_FILE = "bm25_doc_ids.npy"
+BM25_TFS_FILE = "bm25_tfs.npy"
+BM25_DOC_LENGTHS_FILE = "bm25_doc_lengths.npy"
+
+# Words, plus dotted references such as section numbers (12.1) and
+# citations (s.o), which matter for legal queries
+_TOKEN_PATTERN = re.compile(r"\w+(?:\.\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def merge_postings(
+    terms: Sequence[str],
+    offsets: np.ndarray,
+    postings: Sequence[np.ndarray],
+    new_terms: Sequence[str],
+    new_offsets: np.ndarray,
+    new_postings: Sequence[np.ndarray],
+) -> Tuple[List[str], np.ndarray, List[np.ndarray]]:
+    """
+    Merge the posting lists of rows appended to an index into its own.
+    Both sides are flat postings, where term i owns [offsets[i],
+    offsets[i + 1]) of each array in postings. The new postings of a term
+    go after its existing ones, so lists stay sorted by row when the new
+    rows come last. Unseen terms are added to the end of the vocabulary.
+    """
+    vocabulary = {term: i for i, term in enumerate(terms)}
+    term_map = np.array(
+        [vocabulary.setdefault(x, len(vocabulary)) for x in new_terms],
+        dtype=np.int64,
+    )
+    merged_terms = list(vocabulary)
+
+    counts = np.zeros(len(merged_terms), dtype=np.int64)
+    counts[: len(terms)] = np.diff(offsets)
+    new_counts = np.zeros(len(merged_terms), dtype=np.int64)
+    np.add.at(new_counts, term_map, np.diff(new_offsets))
+    merged_offsets = np.zeros(len(merged_terms) + 1, dtype=np.int64)
+    merged_offsets[1:] = np.cumsum(counts + new_counts)
+
+    # Every posting keeps its place within its term's list, and the new
+    # postings of a term follow its existing ones
+    old_terms = np.repeat(np.arange(len(terms)), np.diff(offsets))
+    old_shift = merged_offsets[: len(terms)] - offsets[:-1]
+    old_positions = np.arange(offsets[-1]) + old_shift[old_terms]
+    new_terms_of = np.repeat(np.arange(len(term_map)), np.diff(new_offsets))
+    new_shift = merged_offsets[term_map] + counts[term_map] - new_offsets[:-1]
+    new_positions = np.arange(new_offsets[-1]) + new_shift[new_terms_of]
+
+    merged = []
+    for old, new in zip(postings, new_postings):
+        array = np.empty(merged_offsets[-1], dtype=old.dtype)
+        array[old_positions] = old
+        array[new_positions] = new
+        merged.append(array)
+    return merged_terms, merged_offsets, merged
+
+
+def _bm25_postings(texts: Iterable[str], first_doc_id: int = 0) -> "BM25Index":
+    """
+    Postings of texts as an unsaved index, numbering them from
+    first_doc_id.
+    """
+    vocabulary: Dict[str, int] = {}
+    term_ids, doc_ids, tfs, doc_lengths = [], [], [], []
+
+    for doc_id, text in enumerate(texts, first_doc_id):
+        tokens = tokenize(text or "")
+        doc_lengths.append(len(tokens))
+        for term, tf in Counter(tokens).items():
+            term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+            doc_ids.append(doc_id)
+            tfs.append(tf)
+
+    term_ids = np.array(term_ids, dtype=np.int64)
+    order = np.argsort(term_ids, kind="stable")
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)))
+
+    return BM25Index(
+        terms=list(vocabulary),
+        offsets=offsets,
+        doc_ids=np.array(doc_ids, dtype=np.int32)[order],
+        tfs=np.minimum(np.array(tfs, dtype=np.int64), 65535).astype(np.uint16)[order],
+        doc_lengths=np.array(doc_lengths, dtype=np.int32),
+    )
+
+
+def build_bm25_index(path: str | Path, texts: Iterable[str]) -> "BM25Index":
+    """
+    Build a BM25 inverted index over texts, in row order of the local
+    index, and save it to path.
+    """
+    index = _bm25_postings(texts)
+    index.save(path)
+    return index
+
+
+def append_bm25_index(path: str | Path, texts: Iterable[str]) -> "BM25Index":
+    """
+    Add texts as the next rows of the BM25 index at path. Only the new
+    texts are tokenized; their postings are merged into the existing
+    ones, which are copied once.
+    """
+    index = BM25Index.load(path)
+    new = _bm25_postings(texts, len(index.doc_lengths))
+    terms, offsets, (doc_ids, tfs) = merge_postings(
+        list(index.vocabulary),
+        index.offsets,
+        [index.doc_ids, index.tfs],
+        list(new.vocabulary),
+        new.offsets,
+        [new.doc_ids, new.tfs],
+    )
+    index = BM25Index(
+        terms,
+        offsets,
+        doc_ids,
+        tfs,
+        np.concatenate([index.doc_lengths, new.doc_lengths]),
+    )
+    index.save(path)
+    return index
+
+
+class BM25Index:
+    """
+    Compact BM25 inverted index held as flat postings arrays. Scoring
+    touches only the postings of the query terms and accumulates into
+    one dense score vector.
+    """
+
+    def __init__(
+        self,
+        terms: Sequence[str],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_lengths: np.ndarray,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = (
+            max(float(doc_lengths.mean()), 1.0) if len(doc_lengths) else 1.0
+        )
+
+    @classmethod
+    def exists(cls, path: str | Path) -> bool:
+        return (Path(path) / BM25_TERMS_FILE).exists()
+
+    @classmethod
+    def load(cls, path: str | Path) -> "BM25Index":
+        """
+        Load an index built by build_bm25_index, memory-mapping the postings.
+        """
+        path = Path(path)
+        with open(path / BM25_TERMS_FILE, "r") as f:
+            terms = json.load(f)
+        return cls(
+            terms,
+            np.load(path / BM25_OFFSETS_FILE),
+            np.load(path / BM25_DOC_IDS_FILE, mmap_mode="r"),
+            np.load(path / BM25_TFS_FILE, mmap_mode="r"),
+            np.load(path / BM25_DOC_LENGTHS_FILE),
+        )
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        with open(path / BM25_TERMS_FILE, "w") as f:
+            json.dump(list(self.vocabulary), f)
+        np.save(path / BM25_OFFSETS_FILE, self.offsets)
+        np.save(path / BM25_DOC_IDS_FILE, self.doc_ids)
+        np.save(path / BM25_TFS_FILE, self.tfs)
+        np.save(path / BM25_DOC_LENGTHS_FILE, self.doc_lengths)
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        BM25 score of every document for the query.
+        """
+        num_docs = len(self.doc_lengths)
+        scores = np.zeros(num_docs, dtype=np.float32)
+        norms = self.k1 * (1 - self.b + self.b * self.doc_lengths / self.avg_length)
+
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            doc_ids = np.asarray(self.doc_ids[start:end])
+            tfs = np.asarray(self.tfs[start:end], dtype=np.float32)
+            idf = np.log(1 + (num_docs - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            scores[doc_ids] += idf * tfs * (self.k1 + 1) / (tfs + norms[doc_ids])
+
+        return scores
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        ids: Optional[np.ndarray] = None,
+        exclude: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top k document ids and BM25 scores, best first, among ids if given.
+        Documents that match no query term or are set in the boolean mask
+        exclude are left out.
+        """
+        scores = self.scores(query)
+        if exclude is not None:
+            scores[exclude] = 0
+        if ids is not None:
+            top = ids[top_k(scores[ids], k)]
+        else:
+            top = top_k(scores, k)
+        top = top[scores[top] > 0]
+        return top, scores[top]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[np.ndarray], k: int, rrf_k: int = 60
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge ranked id lists by reciprocal rank fusion, summing
+    1 / (rrf_k + rank) over the lists each id appears in. Returns the
+    top k ids and their fused scores, best first.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking):
+            fused[int(idx)] = fused.get(int(idx), 0.0) + 1.0 / (rrf_k + rank + 1)
+
+    ids = np.array(list(fused), dtype=np.int64)
+    scores = np.array(list(fused.values()), dtype=np.float32)
+    top = top_k(scores, k)
+    return ids[top], scores[top]
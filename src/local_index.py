@@ -0,0 +1,376 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain_core.documents.base import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.ann import IVFIndex, top_k
+from src.lexical import BM25Index, build_bm25_index, reciprocal_rank_fusion
+from src.metadata_index import MetadataIndex, build_metadata_index
+from src.quantization import QuantizedIndex
+
+log = logging.getLogger(__name__)
+
+# A local index is a directory holding the chunk table as Parquet and one
+# L2-normalized float32 embedding per chunk, in the same row order
+CHUNKS_FILE = "chunks.parquet"
+EMBEDDINGS_FILE = "embeddings.npy"
+# Rows deleted in place by src.index_maintenance, until the next compaction
+TOMBSTONES_FILE = "tombstones.npy"
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize vectors along the last axis so dot products are cosines.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def write_local_index(
+    chunks: pd.DataFrame, embeddings: np.ndarray, path: str | Path
+) -> None:
+    """
+    Write a chunk table and its precomputed embeddings as a local index.
+    """
+    if len(chunks) != len(embeddings):
+        raise ValueError(f"Got {len(chunks)} chunks but {len(embeddings)} embeddings")
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    chunks.reset_index(drop=True).to_parquet(path / CHUNKS_FILE)
+    np.save(path / EMBEDDINGS_FILE, normalize(embeddings))
+
+
+def build_local_index(
+    chunks: pd.DataFrame,
+    embedding: Embeddings,
+    path: str | Path,
+    text_column: str = "text",
+    batch_size: int = 64,
+    lexical_column: Optional[str] = None,
+) -> None:
+    """
+    Embed the text_column of a chunk table in batches and write it as a
+    local index. Embeddings are streamed into a memory-mapped .npy file,
+    so only one batch of vectors is held in memory. Texts are batched in
+    order of length so each batch pads to texts of similar length. If
+    lexical_column is given, a BM25 index over that column is built as
+    well for hybrid search. A metadata index for filtered search is always
+    built.
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    chunks = chunks.reset_index(drop=True)
+    texts = chunks[text_column].tolist()
+
+    order = np.argsort([len(x) for x in texts], kind="stable")
+    matrix = None
+    for start in range(0, len(texts), batch_size):
+        rows = np.sort(order[start : start + batch_size])
+        vectors = normalize(embedding.embed_documents([texts[i] for i in rows]))
+        if matrix is None:
+            matrix = np.lib.format.open_memmap(
+                path / EMBEDDINGS_FILE,
+                mode="w+",
+                dtype=np.float32,
+                shape=(len(texts), vectors.shape[1]),
+            )
+        matrix[rows] = vectors
+
+    if matrix is None:
+        raise ValueError("Cannot build a local index without any chunks")
+
+    matrix.flush()
+    chunks.to_parquet(path / CHUNKS_FILE)
+    build_metadata_index(path, chunks)
+    if lexical_column is not None:
+        build_bm25_index(path, chunks[lexical_column].tolist())
+
+
+def _to_python(value: Any) -> Any:
+    """
+    Convert numpy values read from Parquet into plain python values so
+    document metadata serializes the same way as remote results.
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Read-only vector store over a local index. The embedding matrix is
+    memory-mapped and searched with a single matrix-vector product, so
+    queries need no network round trip to a vector search endpoint.
+
+    Documents have the same shape as DatabricksVectorSearch results: the
+    text_column becomes page_content and the other requested columns
+    become metadata. Scores are cosine similarities. With text_column
+    None, documents have empty page content, for key-only searches whose
+    text is hydrated later from a src.chunk_store.ChunkStore.
+
+    If an IVF index was built for the directory (see src.ann), queries
+    with query_type "ann" only score the rows of the nprobe closest
+    lists. Any other query_type, or a missing IVF index, scores every row.
+    If quantized codes were built (see src.quantization), candidates are
+    scored on the in-memory codes and only the best k * rescore_factor
+    are rescored against the memory-mapped float32 embeddings.
+
+    If a BM25 index was built (see src.lexical), query_type "hybrid" runs
+    the lexical search concurrently with query embedding and vector search
+    and merges them by reciprocal rank fusion. Hybrid scores are fused
+    scores; score_threshold only filters the vector results. The latency
+    of each stage is logged and kept in last_timings.
+
+    A filter (see src.config.MetadataFilter) is resolved against the
+    metadata index (see src.metadata_index) to the matching rows first,
+    and only those rows are scored.
+
+    Rows tombstoned by src.index_maintenance are never returned. The
+    store reads the index once, so reopen it after applying changes.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        embedding: Embeddings,
+        columns: List[str],
+        text_column: Optional[str],
+    ):
+        path = Path(path)
+        self.path = path
+        self.embedding = embedding
+        self.text_column = text_column
+        self.columns = columns
+        self.vectors = np.load(path / EMBEDDINGS_FILE, mmap_mode="r")
+        self.chunks = pd.read_parquet(path / CHUNKS_FILE, columns=columns)
+        self.ivf = IVFIndex.load(path) if IVFIndex.exists(path) else None
+        self.quantized = (
+            QuantizedIndex.load(path) if QuantizedIndex.exists(path) else None
+        )
+        self.bm25 = BM25Index.load(path) if BM25Index.exists(path) else None
+        self.metadata_index = (
+            MetadataIndex.load(path) if MetadataIndex.exists(path) else None
+        )
+        tombstones_path = path / TOMBSTONES_FILE
+        self.tombstones = None
+        if tombstones_path.exists():
+            self.tombstones = np.zeros(len(self.vectors), dtype=bool)
+            tombstones = np.load(tombstones_path)[: len(self.vectors)]
+            self.tombstones[: len(tombstones)] = tombstones
+        self._executor = ThreadPoolExecutor(max_workers=4)
+        self._local = threading.local()
+
+        if len(self.chunks) != len(self.vectors):
+            raise ValueError(
+                f"{path} has {len(self.chunks)} chunks "
+                f"but {len(self.vectors)} embeddings"
+            )
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def last_timings(self) -> Dict[str, float]:
+        """
+        Per-stage latency in seconds of the last hybrid query on this thread.
+        """
+        return getattr(self._local, "timings", {})
+
+    def filter_rows(self, filter: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Sorted row ids matching filter, or None if there is no filter.
+        """
+        if not filter:
+            return None
+        if self.metadata_index is None:
+            raise ValueError(f"{self.path} has no metadata index to filter on")
+        return self.metadata_index.rows(filter)
+
+    def drop_deleted(self, ids: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        """
+        ids without tombstoned rows. None, for every row, is returned as
+        is; full scans mask self.tombstones instead of listing live rows.
+        """
+        if self.tombstones is None or ids is None:
+            return ids
+        return ids[~self.tombstones[ids]]
+
+    def search_vector(
+        self,
+        query_vector: np.ndarray,
+        k: int,
+        score_threshold: Optional[float] = None,
+        query_type: str = "ann",
+        nprobe: int = 8,
+        rescore_factor: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return the row indices and scores of the k most similar chunks,
+        best first, dropping any below score_threshold. Other search
+        kwargs, such as the hybrid settings, are ignored.
+        """
+        query_vector = normalize(query_vector)
+        ids = self.filter_rows(filter)
+        if ids is None and query_type in ("ann", "hybrid") and self.ivf is not None:
+            ids = self.ivf.candidates(query_vector, nprobe)
+        ids = self.drop_deleted(ids)
+
+        if self.quantized is not None:
+            indices, scores = self.quantized.search(
+                self.vectors, query_vector, k, rescore_factor, ids, self.tombstones
+            )
+        elif ids is not None:
+            scores = np.asarray(self.vectors[ids], dtype=np.float32) @ query_vector
+            top = top_k(scores, k)
+            indices, scores = ids[top], scores[top]
+        else:
+            scores = self.vectors @ query_vector
+            if self.tombstones is not None:
+                scores[self.tombstones] = -np.inf
+            indices = top_k(scores, k)
+            indices = indices[np.isfinite(scores[indices])]
+            scores = scores[indices]
+
+        if score_threshold is not None:
+            keep = scores >= score_threshold
+            indices, scores = indices[keep], scores[keep]
+        return indices, scores
+
+    def to_document(self, idx: int) -> Document:
+        """
+        Build the Document for a row of the chunk table.
+        """
+        row = self.chunks.iloc[idx]
+        metadata = {
+            c: _to_python(row[c]) for c in self.columns if c != self.text_column
+        }
+        page_content = row[self.text_column] if self.text_column else ""
+        return Document(page_content=page_content, metadata=metadata)
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        score_threshold: Optional[float] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        indices, scores = self.search_vector(
+            np.asarray(embedding), k, score_threshold, **kwargs
+        )
+        return [(self.to_document(i), float(s)) for i, s in zip(indices, scores)]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        score_threshold: Optional[float] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Embed the query and return the k most similar documents with
+        their scores. Extra kwargs such as query_type are accepted for
+        compatibility with the Databricks retriever settings.
+        """
+        if kwargs.get("query_type") == "hybrid" and self.bm25 is not None:
+            return self.hybrid_search_with_score(query, k, score_threshold, **kwargs)
+
+        query_vector = self.embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(
+            query_vector, k, score_threshold, **kwargs
+        )
+
+    def hybrid_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        score_threshold: Optional[float] = None,
+        hybrid_candidates: int = 50,
+        rrf_k: int = 60,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        """
+        Fuse the top hybrid_candidates of BM25 and vector search with
+        reciprocal rank fusion and return the top k.
+        """
+        started = time.perf_counter()
+        timings = {}
+        candidates = max(k, hybrid_candidates)
+
+        def lexical_search() -> np.ndarray:
+            lexical_started = time.perf_counter()
+            rows = self.drop_deleted(self.filter_rows(kwargs.get("filter")))
+            ids, _ = self.bm25.search(query, candidates, rows, self.tombstones)
+            timings["lexical_seconds"] = time.perf_counter() - lexical_started
+            return ids
+
+        lexical_future = self._executor.submit(lexical_search)
+
+        stage_started = time.perf_counter()
+        query_vector = self.embedding.embed_query(query)
+        timings["embed_seconds"] = time.perf_counter() - stage_started
+
+        stage_started = time.perf_counter()
+        vector_ids, _ = self.search_vector(
+            np.asarray(query_vector), candidates, score_threshold, **kwargs
+        )
+        timings["vector_seconds"] = time.perf_counter() - stage_started
+
+        lexical_ids = lexical_future.result()
+
+        stage_started = time.perf_counter()
+        indices, scores = reciprocal_rank_fusion([vector_ids, lexical_ids], k, rrf_k)
+        timings["fusion_seconds"] = time.perf_counter() - stage_started
+        timings["total_seconds"] = time.perf_counter() - started
+
+        self._local.timings = timings
+        log.debug(f"Hybrid search timings: {timings}")
+        return [(self.to_document(i), float(s)) for i, s in zip(indices, scores)]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_vector(
+                embedding, k, **kwargs
+            )
+        ]
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        path: str | Path,
+        text_column: str = "text",
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        """
+        Build a local index at path from raw texts and open it.
+        """
+        chunks = pd.DataFrame(metadatas or [{} for _ in texts])
+        chunks[text_column] = texts
+        build_local_index(chunks, embedding, path, text_column=text_column)
+        return cls(path, embedding, list(chunks.columns), text_column)
@@ -0,0 +1,132 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+import pandas as pd
+from pydantic import BaseModel
+
+
+class ManifestEntry(BaseModel):
+    """
+    What we know about a document the last time it was ingested.
+    """
+
+    doc_uri: str
+    content_hash: str
+    settings: Dict[str, Any]
+
+
+Manifest = Dict[str, ManifestEntry]
+
+
+def file_hash(path: str | Path, block_size: int = 1 << 20) -> str:
+    """
+    Return the sha256 hex digest of a file, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(path: str | Path) -> Manifest:
+    """
+    Load a manifest keyed by asset_path. A missing file is an empty manifest.
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+
+    with open(path, "r") as f:
+        raw = json.load(f)
+    return {k: ManifestEntry.model_validate(v) for k, v in raw.items()}
+
+
+def save_manifest(manifest: Manifest, path: str | Path) -> None:
+    """
+    Write the manifest atomically so an interrupted run keeps the old one.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({k: v.model_dump() for k, v in manifest.items()}, f, indent=2)
+    tmp_path.replace(path)
+
+
+def plan_incremental(
+    df: pd.DataFrame,
+    manifest: Manifest,
+    settings: Dict[str, Any],
+    root: str | Path = ".",
+) -> Tuple[pd.DataFrame, List[str], Manifest]:
+    """
+    Compare the documents in df against the manifest. A row whose file no
+    longer exists under root is treated like a removed document.
+
+    Returns:
+        The rows of df that are new or modified and need to be processed,
+        the doc_uris whose existing chunks must be deleted (modified or
+        removed documents), and the manifest to save once the new chunks
+        have been written.
+    """
+    updated: Manifest = {}
+    changed = []
+    stale_doc_uris = []
+
+    for idx, row in df.iterrows():
+        path = Path(root) / row.asset_path
+        if not path.exists():
+            continue
+        entry = ManifestEntry(
+            doc_uri=row.link_to_page,
+            content_hash=file_hash(path),
+            settings=settings,
+        )
+        updated[row.asset_path] = entry
+
+        previous = manifest.get(row.asset_path)
+        if previous == entry:
+            continue
+
+        changed.append(idx)
+        if previous is not None:
+            stale_doc_uris.append(previous.doc_uri)
+
+    for asset_path, previous in manifest.items():
+        if asset_path not in updated:
+            stale_doc_uris.append(previous.doc_uri)
+
+    return df.loc[changed], sorted(set(stale_doc_uris)), updated
+
+
+def exclude_failed(
+    manifest: Manifest,
+    updated: Manifest,
+    stale_doc_uris: List[str],
+    failed_doc_uris: Iterable[str],
+) -> Tuple[List[str], Manifest]:
+    """
+    Take the documents that failed to process out of an incremental plan.
+    They keep their previous manifest entry, or get none if they are new,
+    so the next run retries them, and their existing chunks are no longer
+    deleted as stale.
+
+    Returns the stale doc_uris and the manifest to save.
+    """
+    failed = set(failed_doc_uris)
+    updated = dict(updated)
+    kept_doc_uris = set()
+    for asset_path, entry in list(updated.items()):
+        if entry.doc_uri not in failed:
+            continue
+        previous = manifest.get(asset_path)
+        if previous is None:
+            del updated[asset_path]
+        else:
+            updated[asset_path] = previous
+            kept_doc_uris.add(previous.doc_uri)
+
+    return [x for x in stale_doc_uris if x not in kept_doc_uris], updated
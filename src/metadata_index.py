@@ -0,0 +1,253 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.lexical import merge_postings
+
+# Files of a metadata index, stored alongside the local index. Document
+# URIs and headings are posting lists in the same layout as the BM25
+# index; page ranges are one (first, last) pair per row.
+METADATA_VALUES_FILE = "metadata_values.json"
+METADATA_ARRAYS_FILE = "metadata_index.npz"
+
+
+def _postings(
+    values_per_row: Sequence[Sequence[str]], first_row: int = 0
+) -> Tuple[List[str], Any, Any]:
+    """
+    Posting lists of row ids, numbered from first_row, for every distinct
+    value. The rows of value i are ids[offsets[i]:offsets[i + 1]].
+    """
+    vocabulary: Dict[str, int] = {}
+    value_ids, row_ids = [], []
+    for row, values in enumerate(values_per_row, first_row):
+        for value in set(values):
+            value_ids.append(vocabulary.setdefault(value, len(vocabulary)))
+            row_ids.append(row)
+
+    value_ids = np.array(value_ids, dtype=np.int64)
+    order = np.argsort(value_ids, kind="stable")
+    offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(value_ids, minlength=len(vocabulary)))
+    return list(vocabulary), offsets, np.array(row_ids, dtype=np.int64)[order]
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    if isinstance(value, (str, int, np.integer)):
+        return [value]
+    return list(value)
+
+
+def _index_chunks(
+    chunks: pd.DataFrame,
+    doc_uri_column: str,
+    pages_column: str,
+    headings_column: str,
+    first_row: int = 0,
+) -> "MetadataIndex":
+    """
+    Filter lookups over chunks as an unsaved index, numbering the rows
+    from first_row.
+    """
+    num_rows = len(chunks)
+
+    def column(name: str) -> List[List[Any]]:
+        if name not in chunks.columns:
+            return [[] for _ in range(num_rows)]
+        return [_as_list(x) for x in chunks[name]]
+
+    pages = column(pages_column)
+    return MetadataIndex(
+        *_postings(
+            [[str(x) for x in row] for row in column(doc_uri_column)], first_row
+        ),
+        *_postings(
+            [[str(x) for x in row] for row in column(headings_column)], first_row
+        ),
+        page_first=np.array([min(x) if x else -1 for x in pages], dtype=np.int32),
+        page_last=np.array([max(x) if x else -1 for x in pages], dtype=np.int32),
+    )
+
+
+def build_metadata_index(
+    path: str | Path,
+    chunks: pd.DataFrame,
+    doc_uri_column: str = "doc_uri",
+    pages_column: str = "pages",
+    headings_column: str = "headings",
+) -> "MetadataIndex":
+    """
+    Precompute filter lookups over the chunk table of a local index, in
+    row order, and save them to path. Missing columns are skipped.
+    """
+    index = _index_chunks(chunks, doc_uri_column, pages_column, headings_column)
+    index.save(path)
+    return index
+
+
+def append_metadata_index(
+    path: str | Path,
+    chunks: pd.DataFrame,
+    doc_uri_column: str = "doc_uri",
+    pages_column: str = "pages",
+    headings_column: str = "headings",
+) -> "MetadataIndex":
+    """
+    Add chunks as the next rows of the metadata index at path, merging
+    their postings into the existing ones.
+    """
+    index = MetadataIndex.load(path)
+    new = _index_chunks(
+        chunks, doc_uri_column, pages_column, headings_column, len(index.page_first)
+    )
+    doc_uris, doc_uri_offsets, (doc_uri_rows,) = merge_postings(
+        list(index.doc_uris),
+        index.doc_uri_offsets,
+        [index.doc_uri_rows],
+        list(new.doc_uris),
+        new.doc_uri_offsets,
+        [new.doc_uri_rows],
+    )
+    headings, heading_offsets, (heading_rows,) = merge_postings(
+        list(index.headings),
+        index.heading_offsets,
+        [index.heading_rows],
+        list(new.headings),
+        new.heading_offsets,
+        [new.heading_rows],
+    )
+    index = MetadataIndex(
+        doc_uris,
+        doc_uri_offsets,
+        doc_uri_rows,
+        headings,
+        heading_offsets,
+        heading_rows,
+        np.concatenate([index.page_first, new.page_first]),
+        np.concatenate([index.page_last, new.page_last]),
+    )
+    index.save(path)
+    return index
+
+
+class MetadataIndex:
+    """
+    Posting lists from document URI and heading to row ids, and the page
+    range of every row. A filter is resolved to a sorted array of row ids
+    without touching the embeddings, so filtered queries only score the
+    rows that can match.
+    """
+
+    def __init__(
+        self,
+        doc_uris: List[str],
+        doc_uri_offsets: np.ndarray,
+        doc_uri_rows: np.ndarray,
+        headings: List[str],
+        heading_offsets: np.ndarray,
+        heading_rows: np.ndarray,
+        page_first: np.ndarray,
+        page_last: np.ndarray,
+    ):
+        self.doc_uris = {x: i for i, x in enumerate(doc_uris)}
+        self.doc_uri_offsets = doc_uri_offsets
+        self.doc_uri_rows = doc_uri_rows
+        self.headings = {x: i for i, x in enumerate(headings)}
+        self.heading_offsets = heading_offsets
+        self.heading_rows = heading_rows
+        self.page_first = page_first
+        self.page_last = page_last
+
+    @classmethod
+    def exists(cls, path: str | Path) -> bool:
+        return (Path(path) / METADATA_ARRAYS_FILE).exists()
+
+    @classmethod
+    def load(cls, path: str | Path) -> "MetadataIndex":
+        path = Path(path)
+        with open(path / METADATA_VALUES_FILE, "r") as f:
+            values = json.load(f)
+        arrays = np.load(path / METADATA_ARRAYS_FILE)
+        return cls(
+            values["doc_uris"],
+            arrays["doc_uri_offsets"],
+            arrays["doc_uri_rows"],
+            values["headings"],
+            arrays["heading_offsets"],
+            arrays["heading_rows"],
+            arrays["page_first"],
+            arrays["page_last"],
+        )
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        with open(path / METADATA_VALUES_FILE, "w") as f:
+            json.dump(
+                {"doc_uris": list(self.doc_uris), "headings": list(self.headings)}, f
+            )
+        np.savez(
+            path / METADATA_ARRAYS_FILE,
+            doc_uri_offsets=self.doc_uri_offsets,
+            doc_uri_rows=self.doc_uri_rows,
+            heading_offsets=self.heading_offsets,
+            heading_rows=self.heading_rows,
+            page_first=self.page_first,
+            page_last=self.page_last,
+        )
+
+    def _lookup(self, vocabulary, offsets, rows, values: List[str]) -> np.ndarray:
+        """
+        Union of the posting lists of values, sorted.
+        """
+        lists = [
+            rows[offsets[vocabulary[x]] : offsets[vocabulary[x] + 1]]
+            for x in values
+            if x in vocabulary
+        ]
+        return np.unique(np.concatenate(lists)) if lists else np.array([], np.int64)
+
+    def rows(self, filters: Dict[str, Any]) -> Optional[np.ndarray]:
+        """
+        Sorted row ids matching every given filter, or None if filters is
+        empty. doc_uris and headings match any listed value; min_page and
+        max_page keep rows whose page range overlaps them.
+        """
+        matches = None
+
+        def narrow(rows: np.ndarray) -> None:
+            nonlocal matches
+            matches = rows if matches is None else np.intersect1d(matches, rows)
+
+        if filters.get("doc_uris"):
+            narrow(
+                self._lookup(
+                    self.doc_uris,
+                    self.doc_uri_offsets,
+                    self.doc_uri_rows,
+                    filters["doc_uris"],
+                )
+            )
+        if filters.get("headings"):
+            narrow(
+                self._lookup(
+                    self.headings,
+                    self.heading_offsets,
+                    self.heading_rows,
+                    filters["headings"],
+                )
+            )
+        min_page, max_page = filters.get("min_page"), filters.get("max_page")
+        if min_page is not None or max_page is not None:
+            keep = self.page_first >= 0
+            if min_page is not None:
+                keep &= self.page_last >= min_page
+            if max_page is not None:
+                keep &= self.page_first <= max_page
+            narrow(np.flatnonzero(keep))
+
+        return matches
@@ -1,9 +1,20 @@
-from typing import Dict, Any, Union
-from .config import SLSConfig
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Union
+from .config import MetadataFilter, SLSConfig
 from langchain_core.runnables import RunnableLambda
 from .states import GraphState, StreamState
 from .prompts import chat_template, context_template
-from .retrievers import format_documents
+from .chunk_store import ChunkStore
+from .context_packer import get_context_budget, pack_context
+from .retrievers import (
+    expand_to_parents,
+    format_documents,
+    get_index_name,
+    make_search_filter,
+)
+from .rerank import Reranker
+from .semantic_cache import SemanticCache
 from .utils import (
     format_generation_user,
     format_generation_assistant,
@@ -11,9 +22,20 @@ from .utils import (
 )
 from langchain_openai import ChatOpenAI
 from databricks_langchain import ChatDatabricks
-from langchain_core.vectorstores import VectorStoreRetriever
+from langchain_core.documents.base import Document
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.runnables import RunnableLambda
 
+log = logging.getLogger(__name__)
+
+
+def _generation_update(
+    state: Union[GraphState, StreamState], config: SLSConfig, response
+) -> Dict[str, Any]:
+    if config.agent.streaming:
+        response = state["messages"] + response
+    return {"messages": response}
+
 
 def make_simple_generation_node(
     model: Union[ChatOpenAI, ChatDatabricks], config: SLSConfig
@@ -25,26 +47,114 @@ def make_simple_generation_node(
         last_msg = get_last_user_message(state)
         chain = chat_template | model | RunnableLambda(format_generation_assistant)
         response = chain.invoke(last_msg)
+        return _generation_update(state, config, response)
 
-        if config.agent.streaming:
-            response = state["messages"] + response
+    return simple_generation_node
 
-        return {"messages": response}
+
+def make_async_simple_generation_node(
+    model: Union[ChatOpenAI, ChatDatabricks], config: SLSConfig
+):
+    async def simple_generation_node(
+        state: Union[GraphState, StreamState]
+    ) -> Dict[str, Any]:
+        """
+        Async version of the simple generation node, for graphs run with
+        ainvoke or astream.
+        """
+        last_msg = get_last_user_message(state)
+        chain = chat_template | model | RunnableLambda(format_generation_assistant)
+        response = await chain.ainvoke(last_msg)
+        return _generation_update(state, config, response)
 
     return simple_generation_node
 
 
-def make_query_vector_database_node(retriever: VectorStoreRetriever, config: SLSConfig):
+def _search_kwargs(
+    state: Union[GraphState, StreamState], config: SLSConfig
+) -> Dict[str, Any]:
+    """
+    Retriever kwargs for a request. Filters in the request's custom_inputs
+    replace the configured retriever filters.
+    """
+    search_kwargs = {}
+    request_filters = (state.get("custom_inputs") or {}).get("filters")
+    if request_filters is not None:
+        search_kwargs["filter"] = make_search_filter(
+            config, MetadataFilter(**request_filters)
+        )
+    return search_kwargs
+
+
+def _build_context(
+    config: SLSConfig,
+    query: str,
+    documents: List[Document],
+    reranker: Optional[Reranker],
+    chunk_store: Optional[ChunkStore],
+) -> Dict[str, Any]:
+    """
+    Turn retrieved documents into the context and documents of the state.
+    """
+    if chunk_store is not None:
+        documents = chunk_store.hydrate(documents, config.retriever.mapping.chunk_text)
+    if reranker is not None:
+        documents = reranker.rerank(query, documents, config.retriever.parameters.k)
+    context_documents = expand_to_parents(config, documents)
+    if get_context_budget(config) is not None:
+        formatted_documents, stats = pack_context(config, query, context_documents)
+        log.debug(f"Packed context: {stats}")
+    else:
+        formatted_documents = format_documents(config, context_documents)
+    return {"context": formatted_documents, "documents": documents}
+
+
+def make_query_vector_database_node(
+    retriever: BaseRetriever,
+    config: SLSConfig,
+    reranker: Optional[Reranker] = None,
+    chunk_store: Optional[ChunkStore] = None,
+):
     def query_vector_database_node(
         state: Union[GraphState, StreamState]
     ) -> Dict[str, Any]:
         """
-        Retrieve and format the documents from the vector index.
+        Retrieve and format the documents from the vector index. With a
+        chunk store, the key-only search results are hydrated first. With a
+        reranker, the over-fetched candidates are reranked down to k. With
+        hierarchical chunks, the context is built from the parents of the
+        retrieved child chunks. With a context token budget, the context
+        is packed to fit it. Filters in the request's custom_inputs replace
+        the configured retriever filters.
+        """
+        last_msg = get_last_user_message(state)
+        query = last_msg[0]["content"]
+        documents = retriever.invoke(query, **_search_kwargs(state, config))
+        return _build_context(config, query, documents, reranker, chunk_store)
+
+    return query_vector_database_node
+
+
+def make_async_query_vector_database_node(
+    retriever: BaseRetriever,
+    config: SLSConfig,
+    reranker: Optional[Reranker] = None,
+    chunk_store: Optional[ChunkStore] = None,
+):
+    async def query_vector_database_node(
+        state: Union[GraphState, StreamState]
+    ) -> Dict[str, Any]:
+        """
+        Async version of the vector database node. The search is awaited
+        with ainvoke; hydration, reranking and packing are CPU bound and
+        run in the default executor so they do not block the event loop.
         """
         last_msg = get_last_user_message(state)
-        documents = retriever.invoke(last_msg[0]["content"])
-        formatted_documents = format_documents(config, documents)
-        return {"context": formatted_documents, "documents": documents}
+        query = last_msg[0]["content"]
+        documents = await retriever.ainvoke(query, **_search_kwargs(state, config))
+        return await asyncio.to_thread(
+            _build_context, config, query, documents, reranker, chunk_store
+        )
 
     return query_vector_database_node
 
@@ -70,10 +180,87 @@ def make_context_generation_node(
             context = ""
 
         response = chain.invoke({"context": context, "question": last_msg})
+        return _generation_update(state, config, response)
+
+    return context_generation_node
 
+
+def make_async_context_generation_node(
+    model: Union[ChatOpenAI, ChatDatabricks], config: SLSConfig
+):
+    async def context_generation_node(
+        state: Union[GraphState, StreamState]
+    ) -> Dict[str, Any]:
+        """
+        Async version of the context generation node, for graphs run with
+        ainvoke or astream.
+        """
+        chain = context_template | model | RunnableLambda(format_generation_assistant)
+        last_msg = get_last_user_message(state)
+        context = state.get("context", "")
+        response = await chain.ainvoke({"context": context, "question": last_msg})
+        return _generation_update(state, config, response)
+
+    return context_generation_node
+
+
+def make_semantic_cache_lookup_node(cache: SemanticCache, config: SLSConfig):
+    def semantic_cache_lookup_node(
+        state: Union[GraphState, StreamState]
+    ) -> Dict[str, Any]:
+        """
+        Answer from the semantic cache if a similar enough question was
+        answered before from the same index. Sets cache_hit so the graph
+        can skip retrieval and generation. Requests with their own filters
+        bypass the cache.
+        """
+        if (state.get("custom_inputs") or {}).get("filters") is not None:
+            return {"cache_hit": False}
+
+        last_msg = get_last_user_message(state)
+        cached = cache.lookup(last_msg[0]["content"], get_index_name(config))
+        if cached is None:
+            return {"cache_hit": False}
+
+        response = [{"role": "assistant", "content": cached.answer}]
         if config.agent.streaming:
             response = state["messages"] + response
 
-        return {"messages": response}
+        return {
+            "messages": response,
+            "context": cached.context,
+            "documents": cached.documents,
+            "cache_hit": True,
+        }
 
-    return context_generation_node
+    return semantic_cache_lookup_node
+
+
+def make_semantic_cache_update_node(cache: SemanticCache, config: SLSConfig):
+    def semantic_cache_update_node(
+        state: Union[GraphState, StreamState]
+    ) -> Dict[str, Any]:
+        """
+        Store the generated answer with its context and documents.
+        """
+        if (state.get("custom_inputs") or {}).get("filters") is not None:
+            return {"cache_hit": False}
+
+        last_msg = get_last_user_message(state)
+        cache.add(
+            last_msg[0]["content"],
+            get_index_name(config),
+            answer=state["messages"][-1]["content"],
+            context=state.get("context", ""),
+            documents=state.get("documents", []),
+        )
+        return {"cache_hit": False}
+
+    return semantic_cache_update_node
+
+
+def route_on_cache_hit(state: Union[GraphState, StreamState]) -> str:
+    """
+    Conditional edge after the semantic cache lookup.
+    """
+    return "hit" if state.get("cache_hit") else "miss"
@@ -0,0 +1,171 @@
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from src.ann import recall_at_k, top_k
+
+# Files of a quantized copy of the embeddings, stored alongside the local
+# index. The float32 embeddings stay on disk and are only read to rescore.
+QUANTIZED_CODES_FILE = "quantized_codes.npy"
+QUANTIZED_SCALE_FILE = "quantized_scale.npy"
+
+# Number of set bits in every byte value, for Hamming distances on
+# packed binary codes without numpy 2's bitwise_count
+_POPCOUNT = np.array([bin(x).count("1") for x in range(256)], dtype=np.uint8)
+
+
+class QuantizedIndex:
+    """
+    Compressed copy of the normalized embeddings held in memory for a fast
+    first pass, with exact rescoring of a small candidate set from the
+    memory-mapped float32 matrix.
+
+    "int8" stores one byte per dimension with a symmetric per-dimension
+    scale, 4x smaller than float32. "binary" stores the sign of each
+    dimension as one bit, 32x smaller, and scores by Hamming distance.
+    """
+
+    def __init__(self, codes: np.ndarray, scale: Optional[np.ndarray] = None):
+        self.codes = codes
+        self.scale = scale
+        self.kind = "binary" if scale is None else "int8"
+
+    @classmethod
+    def encode(cls, vectors: np.ndarray, kind: str = "int8") -> "QuantizedIndex":
+        """
+        Quantize a matrix of normalized vectors.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if kind == "int8":
+            scale = np.abs(vectors).max(axis=0) / 127
+            scale = np.maximum(scale, 1e-12).astype(np.float32)
+            codes = np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+            return cls(codes, scale)
+        if kind == "binary":
+            return cls(np.packbits(vectors > 0, axis=1))
+        raise ValueError(f"Unknown quantization kind: {kind}")
+
+    @classmethod
+    def exists(cls, path: str | Path) -> bool:
+        return (Path(path) / QUANTIZED_CODES_FILE).exists()
+
+    @classmethod
+    def load(cls, path: str | Path) -> "QuantizedIndex":
+        """
+        Load the codes fully into memory; that is what they are for.
+        """
+        path = Path(path)
+        scale_path = path / QUANTIZED_SCALE_FILE
+        scale = np.load(scale_path) if scale_path.exists() else None
+        return cls(np.load(path / QUANTIZED_CODES_FILE), scale)
+
+    def save(self, path: str | Path) -> None:
+        path = Path(path)
+        np.save(path / QUANTIZED_CODES_FILE, self.codes)
+        scale_path = path / QUANTIZED_SCALE_FILE
+        if self.scale is not None:
+            np.save(scale_path, self.scale)
+        elif scale_path.exists():
+            scale_path.unlink()
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (0 if self.scale is None else self.scale.nbytes)
+
+    def scores(
+        self,
+        query_vector: np.ndarray,
+        ids: Optional[np.ndarray] = None,
+        batch_size: int = 65536,
+    ) -> np.ndarray:
+        """
+        Approximate similarity of the query to the rows in ids, or to every
+        row. Computed in batches to bound the temporary float copies.
+        """
+        codes = self.codes if ids is None else self.codes[ids]
+        scores = np.empty(len(codes), dtype=np.float32)
+
+        if self.kind == "int8":
+            weights = (query_vector * self.scale).astype(np.float32)
+            for start in range(0, len(codes), batch_size):
+                batch = codes[start : start + batch_size].astype(np.float32)
+                scores[start : start + len(batch)] = batch @ weights
+            return scores
+
+        query_bits = np.packbits(query_vector > 0)
+        num_bits = len(query_vector)
+        for start in range(0, len(codes), batch_size):
+            batch = np.bitwise_xor(codes[start : start + batch_size], query_bits)
+            hamming = _POPCOUNT[batch].sum(axis=1, dtype=np.int32)
+            scores[start : start + len(batch)] = 1 - 2 * hamming / num_bits
+        return scores
+
+    def search(
+        self,
+        vectors: np.ndarray,
+        query_vector: np.ndarray,
+        k: int,
+        rescore_factor: int = 4,
+        ids: Optional[np.ndarray] = None,
+        exclude: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Shortlist k * rescore_factor rows by approximate score, then rescore
+        the shortlist exactly against the float32 vectors. ids limits the
+        search to a candidate set, such as the rows of the probed IVF lists.
+        Without ids, rows set in the boolean mask exclude are skipped.
+        """
+        approx = self.scores(query_vector, ids)
+        if ids is None and exclude is not None:
+            approx[exclude] = -np.inf
+        shortlist = top_k(approx, k * max(rescore_factor, 1))
+        shortlist = shortlist[np.isfinite(approx[shortlist])]
+        shortlist = shortlist if ids is None else ids[shortlist]
+        shortlist = np.sort(shortlist)
+
+        exact = np.asarray(vectors[shortlist], dtype=np.float32) @ query_vector
+        top = top_k(exact, k)
+        return shortlist[top], exact[top]
+
+
+def build_quantized_index(
+    path: str | Path, vectors: np.ndarray, kind: str = "int8"
+) -> QuantizedIndex:
+    """
+    Quantize the embeddings of a local index and save the codes next to it.
+    """
+    quantized = QuantizedIndex.encode(vectors, kind)
+    quantized.save(path)
+    return quantized
+
+
+def evaluate_quantization(
+    vectors: np.ndarray,
+    quantized: QuantizedIndex,
+    queries: np.ndarray,
+    k: int = 10,
+    rescore_factor: int = 4,
+) -> Dict[str, Any]:
+    """
+    Report the memory saved by the quantized codes and the recall@k of
+    quantized search with rescoring against exact float32 search, averaged
+    over the normalized query vectors.
+    """
+    recalls = []
+    for query_vector in queries:
+        exact = top_k(np.asarray(vectors @ query_vector), k)
+        approx, _ = quantized.search(vectors, query_vector, k, rescore_factor)
+        recalls.append(recall_at_k(exact, approx))
+
+    float32_bytes = vectors.shape[0] * vectors.shape[1] * 4
+    return {
+        "kind": quantized.kind,
+        "float32_bytes": float32_bytes,
+        "quantized_bytes": quantized.nbytes,
+        "memory_saved_bytes": float32_bytes - quantized.nbytes,
+        "compression_ratio": float32_bytes / quantized.nbytes,
+        "k": k,
+        "rescore_factor": rescore_factor,
+        f"recall_at_{k}": float(np.mean(recalls)),
+    }
@@ -0,0 +1,269 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents.base import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStoreRetriever
+
+from src.config import QueryCacheConfig
+
+
+def normalize_query(query: str) -> str:
+    """
+    Lowercase and collapse whitespace so trivially different phrasings of
+    the same question share a cache entry.
+    """
+    return " ".join(query.lower().split())
+
+
+def make_cache_key(index_name: str, query: str, search_kwargs: Dict[str, Any]) -> str:
+    """
+    Key a query on the index it ran against, its normalized text and the
+    search settings (k, score_threshold, query_type, ...).
+    """
+    key = json.dumps(
+        [index_name, normalize_query(query), search_kwargs],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def dump_documents(documents: List[Document]) -> str:
+    return json.dumps(
+        [{"page_content": d.page_content, "metadata": d.metadata} for d in documents],
+        default=str,
+    )
+
+
+def load_documents(value: str) -> List[Document]:
+    return [Document(**d) for d in json.loads(value)]
+
+
+class QueryCache:
+    """
+    Bounded in-process LRU cache of retrieval results with a TTL. Entries
+    are tagged with their index name so a re-synced index can be
+    invalidated without clearing results for other indexes.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[float] = 3600):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, Tuple[str, float, List[Document]]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def _expired(self, created_at: float) -> bool:
+        return (
+            self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+        )
+
+    def get(self, key: str) -> Optional[List[Document]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[1]):
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[2])
+
+    def set(self, key: str, index_name: str, documents: List[Document]) -> None:
+        with self._lock:
+            self._entries[key] = (index_name, time.time(), list(documents))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, index_name: Optional[str] = None) -> None:
+        """
+        Drop the entries of index_name, or every entry if it is None.
+        """
+        with self._lock:
+            if index_name is None:
+                self._entries.clear()
+                return
+            for key in [k for k, v in self._entries.items() if v[0] == index_name]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": size,
+        }
+
+
+class SQLiteQueryCache(QueryCache):
+    """
+    Query cache in a SQLite file, shared by every worker process that
+    points at the same path. Least recently used entries beyond max_size
+    are evicted on write. Hit and miss counters are per process.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_size: int = 1024,
+        ttl_seconds: Optional[float] = 3600,
+    ):
+        super().__init__(max_size, ttl_seconds)
+        self.path = str(path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS query_cache (
+                    key TEXT PRIMARY KEY,
+                    index_name TEXT NOT NULL,
+                    documents TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS query_cache_accessed "
+                "ON query_cache (accessed_at)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[List[Document]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT documents, created_at FROM query_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self._expired(row[1]):
+                conn.execute("DELETE FROM query_cache WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute(
+                    "UPDATE query_cache SET accessed_at = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return load_documents(row[0])
+
+    def set(self, key: str, index_name: str, documents: List[Document]) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO query_cache VALUES (?, ?, ?, ?, ?)",
+                (key, index_name, dump_documents(documents), now, now),
+            )
+            conn.execute(
+                "DELETE FROM query_cache WHERE key IN ("
+                "SELECT key FROM query_cache ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
+
+    def invalidate(self, index_name: Optional[str] = None) -> None:
+        with self._connect() as conn:
+            if index_name is None:
+                conn.execute("DELETE FROM query_cache")
+            else:
+                conn.execute(
+                    "DELETE FROM query_cache WHERE index_name = ?", (index_name,)
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._connect() as conn:
+            (stats["size"],) = conn.execute(
+                "SELECT COUNT(*) FROM query_cache"
+            ).fetchone()
+        return stats
+
+
+class CachingRetriever(BaseRetriever):
+    """
+    Wraps a vector store retriever so repeated questions skip the query
+    embedding and vector search round trip.
+    """
+
+    retriever: VectorStoreRetriever
+    cache: QueryCache
+    index_name: str
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+        **kwargs: Any,
+    ) -> List[Document]:
+        search_kwargs = self.retriever.search_kwargs | kwargs
+        key = make_cache_key(self.index_name, query, search_kwargs)
+        documents = self.cache.get(key)
+        if documents is None:
+            documents = self.retriever.invoke(
+                query, config={"callbacks": run_manager.get_child()}, **kwargs
+            )
+            self.cache.set(key, self.index_name, documents)
+        return documents
+
+    async def _aget_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: AsyncCallbackManagerForRetrieverRun,
+        **kwargs: Any,
+    ) -> List[Document]:
+        search_kwargs = self.retriever.search_kwargs | kwargs
+        key = make_cache_key(self.index_name, query, search_kwargs)
+        documents = self.cache.get(key)
+        if documents is None:
+            documents = await self.retriever.ainvoke(
+                query, config={"callbacks": run_manager.get_child()}, **kwargs
+            )
+            self.cache.set(key, self.index_name, documents)
+        return documents
+
+    def invalidate(self) -> None:
+        """
+        Drop cached results for this retriever's index, e.g. after a sync.
+        """
+        self.cache.invalidate(self.index_name)
+
+
+def get_query_cache(config: QueryCacheConfig) -> QueryCache:
+    """
+    Build the shared SQLite cache if config.path is set, else an
+    in-process cache.
+    """
+    if config.path is not None:
+        return SQLiteQueryCache(config.path, config.max_size, config.ttl_seconds)
+    return QueryCache(config.max_size, config.ttl_seconds)
@@ -0,0 +1,164 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents.base import Document
+
+from src.config import RerankerConfig
+from src.lexical import tokenize
+from src.query_cache import normalize_query
+
+log = logging.getLogger(__name__)
+
+
+class LexicalScorer:
+    """
+    Scores a passage by the fraction of distinct query terms it contains,
+    with a small bonus for query bigrams that appear verbatim. Cheap and
+    dependency free; it mainly rescues exact section numbers and terms
+    that the embedding ranked too low.
+    """
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        query_tokens = tokenize(query)
+        terms = set(query_tokens)
+        bigrams = set(zip(query_tokens, query_tokens[1:]))
+        scores = []
+        for text in texts:
+            tokens = tokenize(text)
+            matched = len(terms.intersection(tokens)) / max(len(terms), 1)
+            phrase = len(bigrams.intersection(zip(tokens, tokens[1:])))
+            scores.append(matched + 0.1 * phrase / max(len(bigrams), 1))
+        return scores
+
+
+class CrossEncoderScorer:
+    """
+    Scores (query, passage) pairs with a small cross-encoder from the
+    Hugging Face hub, such as cross-encoder/ms-marco-MiniLM-L-6-v2, on CPU.
+    """
+
+    def __init__(self, model_name: str, max_length: int = 512):
+        try:
+            import torch
+            from transformers import AutoModelForSequenceClassification, AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "The cross-encoder reranker needs torch and transformers, "
+                "installed with the local-models extra"
+            ) from e
+
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        self.model.eval()
+        self.max_length = max_length
+
+    def score(self, query: str, texts: List[str]) -> List[float]:
+        inputs = self.tokenizer(
+            [query] * len(texts),
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="pt",
+        )
+        with self.torch.inference_mode():
+            logits = self.model(**inputs).logits
+        return logits[:, 0].tolist()
+
+
+class Reranker:
+    """
+    Reorders over-fetched candidates by a finer relevance score and keeps
+    the top k. Uncached candidates are scored in batches of batch_size,
+    and scores are cached per (normalized query, chunk id) in an LRU of
+    cache_size entries. Reranking time is logged and kept in last_seconds,
+    apart from the retrieval latency.
+    """
+
+    def __init__(
+        self,
+        scorer,
+        batch_size: int = 32,
+        cache_size: int = 4096,
+        id_key: Optional[str] = None,
+    ):
+        self.scorer = scorer
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.id_key = id_key
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache: OrderedDict[Tuple[str, str], float] = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def last_seconds(self) -> float:
+        """
+        Reranking latency of the last call on this thread.
+        """
+        return getattr(self._local, "seconds", 0.0)
+
+    def chunk_id(self, document: Document) -> str:
+        if self.id_key and document.metadata.get(self.id_key) is not None:
+            return str(document.metadata[self.id_key])
+        return hashlib.sha256(document.page_content.encode("utf-8")).hexdigest()
+
+    def scores(self, query: str, documents: List[Document]) -> List[float]:
+        """
+        Relevance score of each document, from the cache where possible.
+        """
+        query_key = normalize_query(query)
+        keys = [(query_key, self.chunk_id(d)) for d in documents]
+        scores: Dict[Tuple[str, str], float] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+            self.cache_hits += len(scores)
+
+        missing = [(k, d) for k, d in zip(keys, documents) if k not in scores]
+        missing = list({k: d for k, d in missing}.items())
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start : start + self.batch_size]
+            batch_scores = self.scorer.score(query, [d.page_content for _, d in batch])
+            scores.update({k: s for (k, _), s in zip(batch, batch_scores)})
+
+        with self._lock:
+            self.cache_misses += len(missing)
+            for key, _ in missing:
+                self._cache[key] = scores[key]
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return [scores[k] for k in keys]
+
+    def rerank(self, query: str, documents: List[Document], k: int) -> List[Document]:
+        """
+        Return the k highest scoring documents, best first. Ties keep the
+        retrieval order.
+        """
+        started = time.perf_counter()
+        scores = self.scores(query, documents)
+        order = sorted(range(len(documents)), key=lambda i: -scores[i])
+        self._local.seconds = time.perf_counter() - started
+        log.debug(f"Reranked {len(documents)} candidates in {self._local.seconds:.3f}s")
+        return [documents[i] for i in order[:k]]
+
+
+def get_reranker(config: RerankerConfig, id_key: Optional[str] = None) -> Reranker:
+    """
+    Build the reranker selected by config.model: "lexical" for term
+    overlap, or the name of a cross-encoder model.
+    """
+    if config.model == "lexical":
+        scorer = LexicalScorer()
+    else:
+        scorer = CrossEncoderScorer(config.model)
+    return Reranker(scorer, config.batch_size, config.cache_size, id_key)
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from src.local_index import EMBEDDINGS_FILE, normalize, write_local_index
+from src.sharding import ShardedVectorStore, shard_local_index
+
+
+def make_synthetic_index(
+    path: str | Path, num_chunks: int, dim: int, num_docs: int = 500, seed: int = 0
+) -> None:
+    """
+    Write a local index of random embeddings, for benchmarking without
+    an embedding endpoint.
+    """
+    rng = np.random.default_rng(seed)
+    chunks = pd.DataFrame(
+        {
+            "id": [str(i) for i in range(num_chunks)],
+            "doc_uri": [f"doc-{i % num_docs}" for i in range(num_chunks)],
+            "text": [f"chunk {i}" for i in range(num_chunks)],
+        }
+    )
+    vectors = normalize(rng.standard_normal((num_chunks, dim), dtype=np.float32))
+    write_local_index(chunks, vectors, path)
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    latencies = np.array(seconds) * 1000
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "mean_ms": float(latencies.mean()),
+        "queries_per_second": len(seconds) / sum(seconds),
+    }
+
+
+def benchmark_shards(
+    source: str | Path,
+    shard_counts: List[int],
+    num_queries: int = 200,
+    k: int = 10,
+    shard_timeout: float = 10.0,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Partition the local index at source into each number of shards and
+    time vector queries against the sharded store. Queries are embeddings
+    of the index itself, so no embedding model is needed.
+    """
+    vectors = np.load(Path(source) / EMBEDDINGS_FILE, mmap_mode="r")
+    rng = np.random.default_rng(seed)
+    queries = np.asarray(vectors[np.sort(rng.choice(len(vectors), num_queries))])
+
+    results = []
+    for num_shards in shard_counts:
+        with tempfile.TemporaryDirectory() as path:
+            sizes = shard_local_index(source, path, num_shards)
+            started = time.perf_counter()
+            store = ShardedVectorStore(path, None, ["id", "doc_uri", "text"], "text")
+            start_seconds = time.perf_counter() - started
+            try:
+                # Warm up every shard before timing
+                store.similarity_search_with_score_by_vector(queries[0], k)
+                seconds, partial = [], 0
+                for query in queries:
+                    started = time.perf_counter()
+                    store.similarity_search_with_score_by_vector(query, k)
+                    seconds.append(time.perf_counter() - started)
+                    partial += any(x["status"] != "ok" for x in store.last_shard_status)
+            finally:
+                store.close()
+
+        results.append(
+            {
+                "num_shards": num_shards,
+                "shard_sizes": sizes,
+                "start_seconds": start_seconds,
+                "partial_results": partial,
+                **latency_summary(seconds),
+            }
+        )
+
+    return {
+        "timestamp": time.time(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "num_chunks": len(vectors),
+        "dim": vectors.shape[1],
+        "num_queries": num_queries,
+        "k": k,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark sharded retrieval latency against shard count."
+    )
+    parser.add_argument("--index", help="Local index to shard")
+    parser.add_argument("--synthetic-chunks", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--output", default="retrieval_benchmark.json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as synthetic:
+        source = args.index
+        if source is None:
+            make_synthetic_index(synthetic, args.synthetic_chunks, args.dim)
+            source = synthetic
+        results = benchmark_shards(source, args.shards, args.queries, args.k)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for x in results["results"]:
+        print(
+            f"{x['num_shards']:>3} shards: "
+            f"p50 {x['p50_ms']:7.2f} ms  p95 {x['p95_ms']:7.2f} ms  "
+            f"{x['queries_per_second']:8.1f} queries/s"
+        )
@@ -1,26 +1,190 @@
-from src.config import SLSConfig
+import hashlib
+from typing import Any, Dict, List, Optional, Union
+from src.chunk_store import ChunkStore
+from src.config import MetadataFilter, SLSConfig
+from src.embeddings import get_embeddings
+from src.local_index import LocalVectorStore
+from src.query_cache import CachingRetriever, get_query_cache
+from src.sharding import ShardedVectorStore
 from databricks_langchain.vectorstores import DatabricksVectorSearch
-from langchain_core.vectorstores import VectorStoreRetriever
+from langchain_core.documents.base import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore, VectorStoreRetriever
 
+# Backends that search index directories built by src.local_index
+LOCAL_BACKENDS = ("local", "sharded")
 
-def get_vector_retriever(config: SLSConfig) -> VectorStoreRetriever:
-    vector_search = DatabricksVectorSearch(
-        endpoint=config.retriever.endpoint_name,
-        index_name=config.retriever.index_name,
-        columns=config.retriever.mapping.all_columns,
-    )
 
-    retriever = vector_search.as_retriever(
-        search_kwargs={
-            "k": config.retriever.parameters.k,
-            "score_threshold": config.retriever.score_threshold,
-            "query_type": config.retriever.parameters.query_type,
-        }
-    )
+def get_vector_store(
+    config: SLSConfig, embedding: Optional[Embeddings] = None
+) -> VectorStore:
+    """
+    Build the vector store selected by config.retriever.backend. The local
+    backends embed queries with embedding, or with the engine built by
+    src.embeddings.get_embeddings if none is given. With a chunk store
+    configured, only the key columns are requested and the text is
+    hydrated later.
+    """
+    mapping = config.retriever.mapping
+    two_phase = config.retriever.chunk_store_path is not None
+    columns = mapping.key_columns if two_phase else mapping.all_columns
+
+    if config.retriever.backend == "databricks":
+        return DatabricksVectorSearch(
+            endpoint=config.retriever.endpoint_name,
+            index_name=config.retriever.index_name,
+            columns=columns,
+        )
+
+    if config.retriever.backend == "local":
+        if config.retriever.local_index_path is None:
+            raise ValueError("The local backend requires retriever.local_index_path")
+        return LocalVectorStore(
+            config.retriever.local_index_path,
+            embedding or get_embeddings(config),
+            columns=columns,
+            text_column=None if two_phase else mapping.chunk_text,
+        )
+
+    if config.retriever.backend == "sharded":
+        if config.retriever.local_index_path is None:
+            raise ValueError("The sharded backend requires retriever.local_index_path")
+        return ShardedVectorStore(
+            config.retriever.local_index_path,
+            embedding or get_embeddings(config),
+            columns=columns,
+            text_column=None if two_phase else mapping.chunk_text,
+            shard_timeout=config.retriever.shard_timeout,
+        )
+
+    raise ValueError(f"Unknown retriever backend: {config.retriever.backend}")
+
+
+def get_index_name(config: SLSConfig) -> str:
+    """
+    Name identifying the index queries run against, for cache keys.
+    """
+    if config.retriever.backend in LOCAL_BACKENDS:
+        return str(config.retriever.local_index_path)
+    return config.retriever.index_name
+
+
+def make_search_filter(
+    config: SLSConfig, filters: MetadataFilter
+) -> Optional[Dict[str, Any]]:
+    """
+    Translate metadata filters into the filter search kwarg of the
+    configured backend. The local backend takes them as they are. Mosaic
+    AI Vector Search filters on scalar columns of the index, so doc_uris
+    becomes a filter on the document_uri column; headings and pages are
+    array columns it cannot match, and filtering on them raises a
+    ValueError rather than silently widening the search.
+    """
+    if config.retriever.backend in LOCAL_BACKENDS:
+        filter = {k: v for k, v in filters.model_dump().items() if v or v == 0}
+        return filter or None
+    unsupported = ["headings"] if filters.headings else []
+    unsupported += [
+        k for k in ["min_page", "max_page"] if getattr(filters, k) is not None
+    ]
+    if unsupported:
+        raise ValueError(
+            f"The databricks backend cannot filter on {', '.join(unsupported)}; "
+            "only doc_uris is supported there"
+        )
+    if filters.doc_uris:
+        return {config.retriever.mapping.document_uri: filters.doc_uris}
+    return None
+
+
+def get_vector_retriever(
+    config: SLSConfig, embedding: Optional[Embeddings] = None
+) -> BaseRetriever:
+    """
+    Build the retriever for config.retriever, wrapped in a query result
+    cache if retriever.cache is set.
+    """
+    vector_search = get_vector_store(config, embedding)
+
+    parameters = config.retriever.parameters
+    query_type = parameters.query_type
+    if config.retriever.search_type == "hybrid":
+        query_type = "hybrid"
+
+    # Over-fetch candidates for the rerank stage
+    k = parameters.k
+    if config.retriever.reranker is not None:
+        k = max(k, config.retriever.reranker.candidates)
+
+    search_kwargs = {
+        "k": k,
+        "score_threshold": config.retriever.score_threshold,
+        "query_type": query_type,
+    }
+    if config.retriever.backend in LOCAL_BACKENDS:
+        search_kwargs["nprobe"] = parameters.nprobe
+        search_kwargs["rescore_factor"] = parameters.rescore_factor
+        search_kwargs["hybrid_candidates"] = parameters.hybrid_candidates
+        search_kwargs["rrf_k"] = parameters.rrf_k
+    if config.retriever.filters is not None:
+        search_kwargs["filter"] = make_search_filter(config, config.retriever.filters)
+
+    retriever = vector_search.as_retriever(search_kwargs=search_kwargs)
+
+    if config.retriever.cache is not None:
+        return CachingRetriever(
+            retriever=retriever,
+            cache=get_query_cache(config.retriever.cache),
+            index_name=get_index_name(config),
+        )
 
     return retriever
 
 
+def batch_retrieve(
+    retriever: BaseRetriever,
+    queries: List[str],
+    max_concurrency: int = 8,
+    chunk_store: Optional[ChunkStore] = None,
+    text_column: str = "text",
+) -> List[Union[List[Document], Exception]]:
+    """
+    Retrieve documents for many queries at once. Duplicate queries are
+    searched once and up to max_concurrency searches run in parallel
+    threads. Results are in the order of queries; a query that failed
+    gets its exception instead of a document list.
+
+    In two-phase mode (retriever.chunk_store_path set) the retriever only
+    returns key columns; pass the chunk store from get_chunk_store and
+    the chunk text column to hydrate the results.
+    """
+    unique_queries = list(dict.fromkeys(queries))
+    results = retriever.batch(
+        unique_queries,
+        config={"max_concurrency": max_concurrency},
+        return_exceptions=True,
+    )
+    if chunk_store is not None:
+        results = [
+            r if isinstance(r, Exception) else chunk_store.hydrate(r, text_column)
+            for r in results
+        ]
+    by_query = dict(zip(unique_queries, results))
+    return [by_query[q] for q in queries]
+
+
+def make_chunk_id(doc_uri: str, doc_refs: List[str], text: str) -> str:
+    """
+    Derive a stable primary key from a chunk's document, its docling
+    references and a hash of its text. Re-ingesting an unchanged chunk
+    yields the same key, so index syncs only re-embed chunks that changed.
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    key = "\x1f".join([doc_uri, *doc_refs, text_hash])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
 def make_text_chunk(chunk, doc_uri):
     pages = [[x.page_no for x in x.prov] for x in chunk.meta.doc_items]
     unique_pages = list(set([page for sublist in pages for page in sublist]))
@@ -30,6 +194,7 @@ def make_text_chunk(chunk, doc_uri):
     captions = chunk.meta.captions
 
     return {
+        "id": make_chunk_id(doc_uri, doc_refs, chunk.text),
         "doc_uri": doc_uri,
         "pages": unique_pages,
         "doc_refs": doc_refs,
@@ -44,18 +209,72 @@ def make_text_chunk(chunk, doc_uri):
     }
 
 
+def citations(config: SLSConfig, doc: Document) -> List[Dict[str, Any]]:
+    """
+    Every document and pages a retrieved chunk stands for: its own, then
+    those of the near-duplicates dropped in its favour at ingest, if the
+    mapping sets duplicate_doc_uris and duplicate_pages.
+    """
+    mapping = config.retriever.mapping
+    sources = [
+        {
+            "doc_uri": doc.metadata[mapping.document_uri],
+            "pages": doc.metadata.get("pages"),
+        }
+    ]
+    if mapping.duplicate_doc_uris:
+        doc_uris = doc.metadata.get(mapping.duplicate_doc_uris) or []
+        pages = doc.metadata.get(mapping.duplicate_pages or "") or [None] * len(
+            doc_uris
+        )
+        sources += [{"doc_uri": u, "pages": p} for u, p in zip(doc_uris, pages)]
+    return sources
+
+
 def format_documents(config: SLSConfig, docs):
     chunk_template = config.retriever.chunk_template
     chunk_contents = [
         chunk_template.format(
             chunk_text=d.page_content,
-            document_uri=d.metadata[config.retriever.mapping.document_uri],
+            document_uri=", ".join(
+                dict.fromkeys(x["doc_uri"] for x in citations(config, d))
+            ),
         )
         for d in docs
     ]
     return "".join(chunk_contents)
 
 
+def expand_to_parents(config: SLSConfig, docs: List[Document]) -> List[Document]:
+    """
+    Replace retrieved child chunks with their parent chunks for building
+    context. Parents are kept in the rank order of their best child and
+    only included once. Documents without a parent are kept as they are.
+    Does nothing unless the mapping sets parent_id and parent_text.
+    """
+    mapping = config.retriever.mapping
+    if not mapping.parent_id or not mapping.parent_text:
+        return docs
+
+    expanded = []
+    seen = set()
+    for d in docs:
+        parent_id = d.metadata.get(mapping.parent_id)
+        if parent_id is None:
+            expanded.append(d)
+            continue
+        if parent_id in seen:
+            continue
+
+        seen.add(parent_id)
+        metadata = {k: v for k, v in d.metadata.items() if k != mapping.parent_text}
+        expanded.append(
+            Document(page_content=d.metadata[mapping.parent_text], metadata=metadata)
+        )
+
+    return expanded
+
+
 def index_exists(client, vs_endpoint, index_name):
     try:
         client.get_index(vs_endpoint, index_name)
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents.base import Document
+from langchain_core.embeddings import Embeddings
+
+from src.local_index import normalize
+
+
+@dataclass
+class CachedAnswer:
+    index_name: str
+    question: str
+    answer: str
+    context: str
+    documents: List[Document]
+    created_at: float
+    used_at: float
+
+
+class SemanticCache:
+    """
+    In-process cache of answers keyed by question embeddings. A question
+    whose cosine similarity to a cached question is at least threshold
+    reuses that answer, so paraphrases skip retrieval and generation.
+
+    Embeddings are kept in one preallocated matrix of max_size rows, so a
+    lookup is a single matrix-vector product. When full, the least
+    recently used answer is evicted, after empty and expired slots.
+    Answers are tagged with the index they were generated from and can
+    be invalidated per index. The embedding of a missed question is kept
+    until its answer is added, so each question is embedded once.
+
+    Answers expire after ttl_seconds. Index syncs in this process call
+    invalidate; to notice syncs run elsewhere, point sync_state_path at
+    the sync state file they write (see src.index_maintenance), and
+    answers created before it was last modified are treated as expired.
+    """
+
+    def __init__(
+        self,
+        embedding: Embeddings,
+        threshold: float = 0.95,
+        max_size: int = 512,
+        ttl_seconds: Optional[float] = None,
+        sync_state_path: Optional[str | Path] = None,
+    ):
+        self.embedding = embedding
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.sync_state_path = sync_state_path
+        self.hits = 0
+        self.misses = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Optional[CachedAnswer]] = [None] * max_size
+        # Index name and creation time of each slot, NaN when it is empty
+        self._index = np.full(max_size, None, dtype=object)
+        self._created = np.full(max_size, np.nan)
+        self._pending: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expires_before(self) -> float:
+        """
+        Creation time before which answers are expired.
+        """
+        cutoff = -np.inf
+        if self.ttl_seconds is not None:
+            cutoff = time.time() - self.ttl_seconds
+        if self.sync_state_path is not None:
+            try:
+                cutoff = max(cutoff, os.stat(self.sync_state_path).st_mtime)
+            except FileNotFoundError:
+                pass
+        return cutoff
+
+    def _live_slots(self) -> np.ndarray:
+        # NaN compares False, so empty slots are not live
+        return self._created >= self._expires_before()
+
+    def embed(self, question: str) -> np.ndarray:
+        return normalize(self.embedding.embed_query(question))
+
+    def lookup(self, question: str, index_name: str) -> Optional[CachedAnswer]:
+        """
+        Return the cached answer to the most similar question from the same
+        index, if it is at least threshold similar.
+        """
+        vector = self.embed(question)
+        with self._lock:
+            if self._vectors is not None:
+                live = self._live_slots() & (self._index == index_name)
+                scores = np.where(live, self._vectors @ vector, -np.inf)
+                slot = int(np.argmax(scores))
+                if scores[slot] >= self.threshold:
+                    entry = self._entries[slot]
+                    entry.used_at = time.time()
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            self._pending[question] = vector
+            while len(self._pending) > self.max_size:
+                self._pending.popitem(last=False)
+            return None
+
+    def add(
+        self,
+        question: str,
+        index_name: str,
+        answer: str,
+        context: str,
+        documents: List[Document],
+    ) -> None:
+        with self._lock:
+            vector = self._pending.pop(question, None)
+        if vector is None:
+            vector = self.embed(question)
+
+        now = time.time()
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, len(vector)), np.float32)
+            slot = self._free_slot()
+            self._vectors[slot] = vector
+            self._entries[slot] = CachedAnswer(
+                index_name, question, answer, context, list(documents), now, now
+            )
+            self._index[slot] = index_name
+            self._created[slot] = now
+
+    def _free_slot(self) -> int:
+        """
+        An empty or expired slot, else the slot of the least recently used
+        answer.
+        """
+        free = np.flatnonzero(~self._live_slots())
+        if len(free):
+            return int(free[0])
+        return min(range(self.max_size), key=lambda i: self._entries[i].used_at)
+
+    def _clear_slot(self, slot: int) -> None:
+        self._entries[slot] = None
+        self._vectors[slot] = 0
+        self._index[slot] = None
+        self._created[slot] = np.nan
+
+    def invalidate(self, index_name: Optional[str] = None) -> None:
+        """
+        Drop the answers generated from index_name, or every answer if it
+        is None.
+        """
+        with self._lock:
+            for slot, entry in enumerate(self._entries):
+                if entry is not None and index_name in (None, entry.index_name):
+                    self._clear_slot(slot)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": int(self._live_slots().sum()),
+        }
@@ -0,0 +1,333 @@
+import json
+import multiprocessing
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from langchain_core.documents.base import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from src.ann import (
+    IVF_CENTROIDS_FILE,
+    IVF_IDS_FILE,
+    IVF_OFFSETS_FILE,
+    IVFIndex,
+    assign,
+)
+from src.local_index import (
+    CHUNKS_FILE,
+    EMBEDDINGS_FILE,
+    TOMBSTONES_FILE,
+    LocalVectorStore,
+    write_local_index,
+)
+from src.metadata_index import build_metadata_index
+from src.quantization import QuantizedIndex, build_quantized_index
+
+# A sharded index is a directory of local indexes, shard-000, shard-001...,
+# plus a manifest recording how chunks were assigned to shards
+SHARDS_FILE = "shards.json"
+
+
+def shard_of(doc_uri: str, num_shards: int) -> int:
+    """
+    Stable shard of a document, so all chunks of a document share a shard.
+    """
+    return zlib.crc32(str(doc_uri).encode("utf-8")) % num_shards
+
+
+def shard_path(path: str | Path, shard: int) -> Path:
+    return Path(path) / f"shard-{shard:03d}"
+
+
+def shard_local_index(
+    source: str | Path,
+    path: str | Path,
+    num_shards: int,
+    doc_uri_column: str = "doc_uri",
+) -> List[int]:
+    """
+    Partition an existing local index into num_shards local indexes by
+    doc_uri hash, reusing its embeddings. Rows tombstoned by
+    src.index_maintenance are left out. Returns the chunk count of each
+    shard.
+
+    If the source has an IVF index, each shard gets IVF lists over the
+    source centroids, and if it has quantized codes, each shard is
+    quantized with the same kind, so nothing is retrained. BM25 indexes
+    are not carried over, since hybrid queries on shards are answered as
+    vector queries (see ShardedVectorStore).
+    """
+    source, path = Path(source), Path(path)
+    chunks = pd.read_parquet(source / CHUNKS_FILE)
+    vectors = np.load(source / EMBEDDINGS_FILE, mmap_mode="r")
+    shards = np.array([shard_of(x, num_shards) for x in chunks[doc_uri_column]])
+    if (source / TOMBSTONES_FILE).exists():
+        tombstones = np.load(source / TOMBSTONES_FILE)[: len(chunks)]
+        shards[: len(tombstones)][tombstones] = -1
+    ivf = IVFIndex.load(source) if IVFIndex.exists(source) else None
+    quantized = QuantizedIndex.load(source) if QuantizedIndex.exists(source) else None
+
+    sizes = []
+    for shard in range(num_shards):
+        rows = np.flatnonzero(shards == shard)
+        shard_chunks = chunks.iloc[rows].reset_index(drop=True)
+        shard_vectors = vectors[rows]
+        write_local_index(shard_chunks, shard_vectors, shard_path(path, shard))
+        build_metadata_index(
+            shard_path(path, shard), shard_chunks, doc_uri_column=doc_uri_column
+        )
+        if ivf is not None:
+            _write_ivf_lists(shard_path(path, shard), ivf.centroids, shard_vectors)
+        if quantized is not None:
+            build_quantized_index(
+                shard_path(path, shard), shard_vectors, quantized.kind
+            )
+        sizes.append(len(rows))
+
+    with open(path / SHARDS_FILE, "w") as f:
+        json.dump({"num_shards": num_shards, "doc_uri_column": doc_uri_column}, f)
+    return sizes
+
+
+def _write_ivf_lists(path: Path, centroids: np.ndarray, vectors: np.ndarray) -> None:
+    """
+    Save IVF lists assigning vectors to existing centroids, in the layout
+    of src.ann.build_ivf_index.
+    """
+    labels = assign(vectors, centroids)
+    offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(labels, minlength=len(centroids)))
+    np.save(path / IVF_CENTROIDS_FILE, centroids)
+    np.save(path / IVF_OFFSETS_FILE, offsets)
+    np.save(path / IVF_IDS_FILE, np.argsort(labels, kind="stable"))
+
+
+def _serve_shard(
+    path: str, columns: List[str], text_column: Optional[str], conn
+) -> None:
+    """
+    Worker process loop: open one shard and answer vector searches sent
+    over conn until it receives None.
+    """
+    store = LocalVectorStore(path, None, columns, text_column)
+    conn.send("ready")
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        request_id, query_vector, k, score_threshold, kwargs = message
+        try:
+            results = store.similarity_search_with_score_by_vector(
+                query_vector, k, score_threshold, **kwargs
+            )
+            conn.send((request_id, results, None))
+        except Exception as e:
+            conn.send((request_id, None, repr(e)))
+
+
+class ShardClient:
+    """
+    One shard worker process and the pipe to it. Requests to a shard are
+    serialized; replies to requests that already timed out are discarded.
+    """
+
+    def __init__(
+        self, path: Path, columns: List[str], text_column: Optional[str], context
+    ):
+        self.path = path
+        self._conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_serve_shard,
+            args=(str(path), columns, text_column, child_conn),
+            daemon=True,
+        )
+        self.process.start()
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def wait_ready(self, timeout: float) -> bool:
+        with self._lock:
+            if not self._ready and self._conn.poll(timeout):
+                self._ready = self._conn.recv() == "ready"
+            return self._ready
+
+    def search(
+        self,
+        request_id: int,
+        query_vector: np.ndarray,
+        k: int,
+        score_threshold: Optional[float],
+        kwargs: Dict[str, Any],
+        timeout: float,
+    ) -> List[Tuple[Document, float]]:
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            self._conn.send((request_id, query_vector, k, score_threshold, kwargs))
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._conn.poll(remaining):
+                    raise TimeoutError(f"{self.path} did not answer in {timeout}s")
+                reply_id, results, error = self._conn.recv()
+                if reply_id != request_id:
+                    continue
+                if error is not None:
+                    raise RuntimeError(f"{self.path}: {error}")
+                return results
+
+    def close(self) -> None:
+        try:
+            self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class ShardedVectorStore(VectorStore):
+    """
+    Vector store over a sharded index with one worker process per shard,
+    so no process holds the whole corpus. The query is embedded once,
+    sent to every shard in parallel, and the per-shard top k lists are
+    merged by score into a global top k. Scores are cosine similarities,
+    so they compare across shards.
+
+    A shard that fails or does not answer within shard_timeout is left
+    out and the merged results are partial; only if every shard fails is
+    an error raised. The status of each shard for the last query on this
+    thread is kept in last_shard_status.
+
+    Hybrid queries are answered as vector queries, since BM25 statistics
+    and fused ranks of different shards are not comparable.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        embedding: Embeddings,
+        columns: List[str],
+        text_column: Optional[str],
+        shard_timeout: float = 2.0,
+        start_timeout: float = 120.0,
+    ):
+        path = Path(path)
+        with open(path / SHARDS_FILE, "r") as f:
+            self.num_shards = json.load(f)["num_shards"]
+
+        self.path = path
+        self.embedding = embedding
+        self.shard_timeout = shard_timeout
+        context = multiprocessing.get_context("spawn")
+        self.shards = [
+            ShardClient(shard_path(path, i), columns, text_column, context)
+            for i in range(self.num_shards)
+        ]
+        for shard in self.shards:
+            if not shard.wait_ready(start_timeout):
+                self.close()
+                raise RuntimeError(f"{shard.path} failed to start")
+
+        self._executor = ThreadPoolExecutor(max_workers=self.num_shards)
+        self._request_ids = count()
+        self._local = threading.local()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def last_shard_status(self) -> List[Dict[str, Any]]:
+        return getattr(self._local, "status", [])
+
+    def close(self) -> None:
+        for shard in self.shards:
+            shard.close()
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        score_threshold: Optional[float] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        request_id = next(self._request_ids)
+        query_vector = np.asarray(embedding, dtype=np.float32)
+
+        def search(shard: ShardClient) -> Dict[str, Any]:
+            started = time.perf_counter()
+            status = {"shard": str(shard.path)}
+            try:
+                status["results"] = shard.search(
+                    request_id,
+                    query_vector,
+                    k,
+                    score_threshold,
+                    kwargs,
+                    self.shard_timeout,
+                )
+                status["status"] = "ok"
+            except TimeoutError:
+                status["status"] = "timeout"
+            except Exception as e:
+                status["status"] = "error"
+                status["error"] = str(e)
+            status["seconds"] = time.perf_counter() - started
+            return status
+
+        statuses = list(self._executor.map(search, self.shards))
+        self._local.status = [
+            {k: v for k, v in x.items() if k != "results"} for x in statuses
+        ]
+        if all(x["status"] != "ok" for x in statuses):
+            raise RuntimeError(f"Every shard failed: {self._local.status}")
+
+        merged = [r for x in statuses for r in x.get("results", [])]
+        merged.sort(key=lambda x: -x[1])
+        return merged[:k]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4,
+        score_threshold: Optional[float] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        query_vector = self.embedding.embed_query(query)
+        return self.similarity_search_with_score_by_vector(
+            query_vector, k, score_threshold, **kwargs
+        )
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            doc
+            for doc, _ in self.similarity_search_with_score_by_vector(
+                embedding, k, **kwargs
+            )
+        ]
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> "ShardedVectorStore":
+        raise NotImplementedError(
+            "Build a local index and partition it with shard_local_index"
+        )
@@ -1,4 +1,4 @@
-from typing import TypedDict, Annotated, List, Union
+from typing import Any, Dict, TypedDict, Annotated, List, Union
 from operator import add
 from langchain_core.documents.base import Document
 from src.config import SLSConfig
@@ -17,12 +17,16 @@ class StreamState(TypedDict):
     messages: List[dict[str, str]]
     context: List[str]
     documents: List[Document]
+    cache_hit: bool
+    custom_inputs: Dict[str, Any]
 
 
 class GraphState(TypedDict):
     messages: Annotated[List[dict[str, str]], add]
     context: List[str]
     documents: List[Document]
+    cache_hit: bool
+    custom_inputs: Dict[str, Any]
 
 
 def get_state(config: SLSConfig) -> Union[StreamState, GraphState]:
@@ -0,0 +1,345 @@
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql.functions import col, collect_list, sort_array, struct
+
+from src.config import IngestConfig
+from src.dedup import NearDuplicateFilter
+from src.ingest import CHUNK_ARROW_SCHEMA, CHUNK_TABLE_SCHEMA, batched, process_rows
+
+# Every dropped chunk with the id of the chunk kept in its place, so
+# citations can still point at every document and page a passage came
+# from, and the chunk can be restored if the kept one is deleted
+DUPLICATE_TABLE_SCHEMA = CHUNK_TABLE_SCHEMA + ", canonical_id string"
+
+
+def write_staging_table(
+    spark: SparkSession,
+    chunks: Iterable[Dict[str, Any]],
+    staging_table: str,
+    batch_size: int = 1000,
+) -> DataFrame:
+    """
+    Stream chunk records into a staging table in bounded batches. The
+    table is always (re)created, even if there are no chunks, so it can
+    be used as the source of a merge.
+    """
+    (
+        spark.createDataFrame([], schema=CHUNK_TABLE_SCHEMA)
+        .write.mode("overwrite")
+        .option("overwriteSchema", "true")
+        .saveAsTable(staging_table)
+    )
+    for batch in batched(chunks, batch_size):
+        (
+            spark.createDataFrame(batch, schema=CHUNK_TABLE_SCHEMA)
+            .write.mode("append")
+            .saveAsTable(staging_table)
+        )
+    return spark.table(staging_table)
+
+
+def make_ingest_partition(
+    config: IngestConfig,
+) -> Callable[[Iterator[pd.DataFrame]], Iterator[pd.DataFrame]]:
+    """
+    Build the mapInPandas function that converts and chunks the documents
+    of one partition. The converter is loaded once per python worker and
+    reused by every task that worker runs.
+    """
+
+    def ingest_partition(batches: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        for batch in batches:
+            rows = batch.to_dict(orient="records")
+            for row, doc_chunks in zip(rows, process_rows(rows, config)):
+                if doc_chunks is None:
+                    # A failed document becomes a single row without an id
+                    marker = dict.fromkeys(CHUNK_ARROW_SCHEMA.names)
+                    marker["doc_uri"] = row["link_to_page"]
+                    yield pd.DataFrame([marker], columns=CHUNK_ARROW_SCHEMA.names)
+                elif doc_chunks:
+                    yield pd.DataFrame(doc_chunks, columns=CHUNK_ARROW_SCHEMA.names)
+
+    return ingest_partition
+
+
+def ingest_with_spark(
+    spark: SparkSession,
+    df: pd.DataFrame,
+    config: IngestConfig,
+    staging_table: str,
+    root: str | Path = ".",
+    num_partitions: Optional[int] = None,
+    failed: Optional[List[str]] = None,
+) -> DataFrame:
+    """
+    Convert and chunk the documents in df on the executors and write the
+    chunks straight from the executors into staging_table. By default each
+    document gets its own partition. root must be a path the executors can
+    read, such as a Unity Catalog volume or the repo's workspace files.
+    Works the same against a local-mode SparkSession. The doc_uri of every
+    document that failed is appended to failed.
+    """
+    from delta.tables import DeltaTable
+
+    rows = df[["title", "link_to_page", "asset_path"]].copy()
+    rows["path"] = [str(Path(root) / x) for x in rows["asset_path"]]
+    num_partitions = num_partitions or max(len(rows), 1)
+
+    (
+        spark.createDataFrame(
+            rows,
+            schema="title string, link_to_page string, asset_path string, path string",
+        )
+        .repartition(num_partitions)
+        .mapInPandas(make_ingest_partition(config), schema=CHUNK_TABLE_SCHEMA)
+        .write.mode("overwrite")
+        .option("overwriteSchema", "true")
+        .saveAsTable(staging_table)
+    )
+
+    failed_rows = spark.table(staging_table).filter(col("id").isNull())
+    failed_doc_uris = [x.doc_uri for x in failed_rows.select("doc_uri").collect()]
+    if failed_doc_uris:
+        DeltaTable.forName(spark, staging_table).delete(col("id").isNull())
+    if failed is not None:
+        failed.extend(failed_doc_uris)
+    return spark.table(staging_table)
+
+
+def deduplicate_staging_table(
+    spark: SparkSession,
+    staging_table: str,
+    duplicates_table: str,
+    threshold: float,
+    stale_doc_uris: Optional[List[str]] = None,
+    target_table: Optional[str] = None,
+) -> DataFrame:
+    """
+    Remove near-duplicate chunks from the staging table and record them
+    in duplicates_table. Chunks are streamed to the driver one partition
+    at a time; only MinHash signatures and the dropped chunks are kept in
+    memory.
+
+    Like merge_chunks, a full ingest (stale_doc_uris is None) replaces the
+    duplicates table, and an incremental one only replaces the rows of
+    stale documents. Duplicates are only detected within one run, so run a
+    full ingest now and then to catch boilerplate across documents. On an
+    incremental ingest into target_table, duplicates whose kept chunk is
+    about to be deleted with a stale document are restored, see
+    _restore_orphaned_duplicates.
+    """
+    from delta.tables import DeltaTable
+
+    near_duplicates = NearDuplicateFilter(threshold=threshold)
+    rows = (
+        spark.table(staging_table).select(*CHUNK_ARROW_SCHEMA.names).toLocalIterator()
+    )
+    for _ in near_duplicates.filter(x.asDict() for x in rows):
+        pass
+
+    duplicates_sp = spark.createDataFrame(
+        near_duplicates.duplicates, schema=DUPLICATE_TABLE_SCHEMA
+    )
+    (
+        DeltaTable.forName(spark, staging_table)
+        .alias("target")
+        .merge(duplicates_sp.alias("source"), "target.id = source.id")
+        .whenMatchedDelete()
+        .execute()
+    )
+
+    if stale_doc_uris is None or not spark.catalog.tableExists(duplicates_table):
+        duplicates_sp.write.mode("overwrite").saveAsTable(duplicates_table)
+    else:
+        if stale_doc_uris:
+            DeltaTable.forName(spark, duplicates_table).delete(
+                col("doc_uri").isin(stale_doc_uris)
+            )
+        (
+            duplicates_sp.write.mode("append")
+            .option("mergeSchema", "true")
+            .saveAsTable(duplicates_table)
+        )
+        if stale_doc_uris and target_table is not None:
+            _restore_orphaned_duplicates(
+                spark, staging_table, duplicates_table, target_table, stale_doc_uris
+            )
+
+    return spark.table(staging_table)
+
+
+def _restore_orphaned_duplicates(
+    spark: SparkSession,
+    staging_table: str,
+    duplicates_table: str,
+    target_table: str,
+    stale_doc_uris: List[str],
+) -> None:
+    """
+    Find kept chunks of stale documents that the merge is about to delete
+    because they are no longer in the staging table. Their duplicates in
+    unchanged documents would otherwise be left without any indexed text,
+    so the first duplicate of each is moved back into the staging table
+    and the others are pointed at it instead.
+    """
+    from delta.tables import DeltaTable
+
+    if not spark.catalog.tableExists(target_table):
+        return
+
+    deleted = (
+        spark.table(target_table)
+        .filter(col("doc_uri").isin(stale_doc_uris))
+        .select(col("id").alias("canonical_id"))
+        .join(
+            spark.table(staging_table).select(col("id").alias("canonical_id")),
+            "canonical_id",
+            "left_anti",
+        )
+    )
+    # Rows written before the duplicates table held the chunk text cannot
+    # be restored
+    orphans = (
+        spark.table(duplicates_table)
+        .filter(col("text").isNotNull())
+        .join(deleted, "canonical_id")
+        .orderBy("canonical_id", "id")
+        .collect()
+    )
+
+    restored: Dict[str, Dict[str, Any]] = {}
+    for row in orphans:
+        restored.setdefault(row.canonical_id, row.asDict())
+    if not restored:
+        return
+
+    (
+        spark.createDataFrame(
+            [{c: x[c] for c in CHUNK_ARROW_SCHEMA.names} for x in restored.values()],
+            schema=CHUNK_TABLE_SCHEMA,
+        )
+        .write.mode("append")
+        .saveAsTable(staging_table)
+    )
+    new_canonical_ids = spark.createDataFrame(
+        [(k, v["id"]) for k, v in restored.items()],
+        schema="canonical_id string, new_canonical_id string",
+    )
+    duplicates = DeltaTable.forName(spark, duplicates_table)
+    duplicates.delete(col("id").isin([x["id"] for x in restored.values()]))
+    (
+        duplicates.alias("target")
+        .merge(
+            new_canonical_ids.alias("source"),
+            "target.canonical_id = source.canonical_id",
+        )
+        .whenMatchedUpdate(set={"canonical_id": "source.new_canonical_id"})
+        .execute()
+    )
+
+
+def annotate_duplicates(
+    spark: SparkSession, target_table: str, duplicates_table: str
+) -> None:
+    """
+    Copy the documents and pages of each kept chunk's duplicates onto the
+    chunk as duplicate_doc_uris and duplicate_pages, so the retriever can
+    cite every source of a passage. Only chunks whose duplicates changed
+    are updated, so an index sync re-embeds as little as possible.
+    """
+    from delta.tables import DeltaTable
+
+    for name, data_type in [
+        ("duplicate_doc_uris", "array<string>"),
+        ("duplicate_pages", "array<array<int>>"),
+    ]:
+        if name not in spark.table(target_table).columns:
+            spark.sql(f"ALTER TABLE {target_table} ADD COLUMNS ({name} {data_type})")
+
+    sources = (
+        spark.table(duplicates_table)
+        .groupBy("canonical_id")
+        .agg(sort_array(collect_list(struct("doc_uri", "pages"))).alias("sources"))
+        .select(
+            "canonical_id",
+            col("sources.doc_uri").alias("duplicate_doc_uris"),
+            col("sources.pages").alias("duplicate_pages"),
+        )
+    )
+    columns = ["duplicate_doc_uris", "duplicate_pages"]
+    (
+        DeltaTable.forName(spark, target_table)
+        .alias("target")
+        .merge(sources.alias("source"), "target.id = source.canonical_id")
+        .whenMatchedUpdate(
+            condition=f"NOT ({_same_row_condition(columns)})",
+            set={c: f"source.{c}" for c in columns},
+        )
+        .whenNotMatchedBySourceUpdate(
+            condition="target.duplicate_doc_uris IS NOT NULL",
+            set={c: "NULL" for c in columns},
+        )
+        .execute()
+    )
+
+
+def merge_chunks(
+    spark: SparkSession,
+    source: DataFrame,
+    target_table: str,
+    stale_doc_uris: Optional[List[str]] = None,
+    failed_doc_uris: Optional[List[str]] = None,
+) -> None:
+    """
+    Upsert chunks into the target table keyed on their content-derived id.
+
+    Unchanged chunks are left untouched, so a Delta Sync index only
+    re-embeds rows that were inserted or updated. Target rows missing
+    from the source are deleted: all of them when stale_doc_uris is None
+    (a full ingest), otherwise only those belonging to stale_doc_uris.
+    Rows of failed_doc_uris, documents that failed to convert in this
+    run, are never deleted, so they keep their existing chunks.
+    Columns added to the chunk schema since the table was created, such
+    as the hierarchical parent columns, are added to the target table.
+    """
+    from delta.tables import DeltaTable
+
+    source = source.dropDuplicates(["id"])
+
+    if not spark.catalog.tableExists(target_table):
+        source.write.saveAsTable(target_table)
+        return
+
+    spark.conf.set("spark.databricks.delta.schema.autoMerge.enabled", "true")
+    target_columns = set(spark.table(target_table).columns)
+    columns = [x for x in source.columns if x in target_columns]
+
+    merge = (
+        DeltaTable.forName(spark, target_table)
+        .alias("target")
+        .merge(source.alias("source"), "target.id = source.id")
+        .whenMatchedUpdateAll(condition=f"NOT ({_same_row_condition(columns)})")
+        .whenNotMatchedInsertAll()
+    )
+
+    failed = set(failed_doc_uris or [])
+    if stale_doc_uris is None:
+        keep = ~col("target.doc_uri").isin(sorted(failed)) if failed else None
+        merge = merge.whenNotMatchedBySourceDelete(condition=keep)
+    elif stale := [x for x in stale_doc_uris if x not in failed]:
+        merge = merge.whenNotMatchedBySourceDelete(
+            condition=col("target.doc_uri").isin(stale)
+        )
+
+    merge.execute()
+
+
+def _same_row_condition(columns: List[str]) -> str:
+    """
+    SQL condition that holds when the given columns of the matched
+    target and source rows are equal, treating nulls as equal.
+    """
+    return " AND ".join(f"target.{c} <=> source.{c}" for c in columns)
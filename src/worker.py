@@ -0,0 +1,266 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from docling.datamodel.base_models import InputFormat
+
+from src.config import IngestConfig
+from src.ingest import (
+    get_child_chunker,
+    get_chunker,
+    get_conversion_cache,
+    get_converter,
+    process_document,
+    write_parquet,
+)
+
+
+class JobQueue:
+    """
+    A small SQLite job table of documents waiting to be ingested. SQLite
+    handles the locking, so several processes can enqueue while a worker
+    claims jobs.
+
+    A claimed job holds a lease of lease_seconds. If its worker dies, the
+    job stays running until the lease expires and is then claimed again,
+    so lease_seconds must be longer than the slowest document takes. A
+    job that outlives its lease may be processed twice; its output file is
+    named after the job id, so the second run overwrites the first.
+    Failed jobs are retried with requeue_failed.
+    """
+
+    def __init__(self, path: str | Path, lease_seconds: float = 3600.0):
+        self.path = str(path)
+        self.lease_seconds = lease_seconds
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT NOT NULL,
+                    link_to_page TEXT NOT NULL,
+                    asset_path TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    error TEXT,
+                    num_chunks INTEGER,
+                    enqueued_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            columns = [x["name"] for x in conn.execute("PRAGMA table_info(jobs)")]
+            if "attempts" not in columns:
+                conn.execute(
+                    "ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0"
+                )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, title: str, link_to_page: str, asset_path: str) -> int:
+        """
+        Add a document to the queue and return its job id.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (title, link_to_page, asset_path, enqueued_at) "
+                "VALUES (?, ?, ?, ?)",
+                (title, link_to_page, asset_path, time.time()),
+            )
+            return cursor.lastrowid
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """
+        Mark the oldest queued job, or running job whose lease expired, as
+        running and return it, or None if there is none.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' "
+                    "OR (status = 'running' AND started_at < ?) "
+                    "ORDER BY id LIMIT 1",
+                    (now - self.lease_seconds,),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ?, "
+                        "attempts = attempts + 1 WHERE id = ?",
+                        (now, row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        return {
+            **dict(row),
+            "status": "running",
+            "started_at": now,
+            "attempts": row["attempts"] + 1,
+        }
+
+    def complete(self, job_id: int, num_chunks: int) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', num_chunks = ?, finished_at = ? "
+                "WHERE id = ?",
+                (num_chunks, time.time(), job_id),
+            )
+
+    def fail(self, job_id: int, error: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+                "WHERE id = ?",
+                (error, time.time(), job_id),
+            )
+
+    def requeue_failed(self, max_attempts: Optional[int] = None) -> int:
+        """
+        Queue failed jobs again, only those tried fewer than max_attempts
+        times if given. Returns the number of jobs requeued.
+        """
+        query = (
+            "UPDATE jobs SET status = 'queued', error = NULL WHERE status = 'failed'"
+        )
+        params: tuple = ()
+        if max_attempts is not None:
+            query += " AND attempts < ?"
+            params = (max_attempts,)
+        with self._connect() as conn:
+            return conn.execute(query, params).rowcount
+
+    def depth(self) -> Dict[str, int]:
+        """
+        Number of jobs in each status.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+            ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class IngestWorker:
+    """
+    Long-lived ingest worker. The converter's layout models and the chunker
+    are loaded once when the worker starts, so each queued document only
+    costs its own conversion time. The chunks of each job are written to
+    their own Parquet file in output_dir as soon as the job finishes.
+    """
+
+    def __init__(
+        self,
+        config: IngestConfig,
+        queue: JobQueue,
+        output_dir: str | Path,
+        root: str | Path = ".",
+    ):
+        self.config = config
+        self.queue = queue
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.root = Path(root)
+
+        started = time.perf_counter()
+        self.converter = get_converter(config)
+        self.converter.initialize_pipeline(InputFormat.PDF)
+        self.chunker = get_chunker(config)
+        self.child_chunker = get_child_chunker(config)
+        self.cache = get_conversion_cache(config)
+        self.load_seconds = time.perf_counter() - started
+
+        self.started_at = time.perf_counter()
+        self.busy_seconds = 0.0
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.chunks_written = 0
+
+    def process(self, job: Dict[str, Any]) -> None:
+        """
+        Convert, chunk and write a single claimed job.
+        """
+        started = time.perf_counter()
+        try:
+            print(f"Processing {job['title']}")
+            chunks = process_document(
+                self.converter,
+                self.chunker,
+                self.root / job["asset_path"],
+                doc_uri=job["link_to_page"],
+                cache=self.cache,
+                child_chunker=self.child_chunker,
+            )
+            write_parquet(
+                chunks,
+                self.output_dir / f"{job['id']:08d}.parquet",
+                batch_size=self.config.batch_size,
+            )
+            self.queue.complete(job["id"], len(chunks))
+            self.jobs_done += 1
+            self.chunks_written += len(chunks)
+        except Exception as e:
+            print(f"Error processing {job['asset_path']}: {str(e)}")
+            self.queue.fail(job["id"], str(e))
+            self.jobs_failed += 1
+        finally:
+            self.busy_seconds += time.perf_counter() - started
+
+    def run(
+        self,
+        poll_interval: float = 5.0,
+        max_jobs: Optional[int] = None,
+        stop_when_empty: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Claim and process jobs until max_jobs have been handled, or until
+        the queue is empty if stop_when_empty is set. Otherwise poll the
+        queue forever. Returns the final stats.
+        """
+        handled = 0
+        while max_jobs is None or handled < max_jobs:
+            job = self.queue.claim()
+            if job is None:
+                if stop_when_empty:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            self.process(job)
+            handled += 1
+
+        return self.stats()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Throughput and queue depth since the worker started. Rates are
+        per second of busy time, so idle polling does not dilute them.
+        """
+        busy = max(self.busy_seconds, 1e-9)
+        return {
+            "model_load_seconds": self.load_seconds,
+            "uptime_seconds": time.perf_counter() - self.started_at,
+            "busy_seconds": self.busy_seconds,
+            "jobs_done": self.jobs_done,
+            "jobs_failed": self.jobs_failed,
+            "chunks_written": self.chunks_written,
+            "docs_per_second": self.jobs_done / busy,
+            "chunks_per_second": self.chunks_written / busy,
+            "queue_depth": self.queue.depth(),
+        }
@@ -0,0 +1,61 @@
+import re
+import zlib
+from typing import List
+
+import numpy as np
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from src.config import SLSConfig
+
+
+class HashEmbeddings(Embeddings):
+    """
+    Deterministic bag-of-words embeddings for tests, counting the texts
+    embedded.
+    """
+
+    def __init__(self, dim: int = 64):
+        self.dim = dim
+        self.embedded = 0
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode("utf-8")) % self.dim] += 1
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded += len(texts)
+        return [self._embed(x) for x in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+@pytest.fixture
+def embedding() -> HashEmbeddings:
+    return HashEmbeddings()
+
+
+@pytest.fixture
+def config() -> SLSConfig:
+    return SLSConfig(
+        agent={},
+        model={
+            "endpoint_name": "test-endpoint",
+            "parameters": {"temperature": 0, "max_tokens": 100},
+        },
+        retriever={
+            "endpoint_name": "test-endpoint",
+            "index_name": "test-index",
+            "embedding_model": "test-embedding",
+            "parameters": {"k": 3},
+            "mapping": {
+                "chunk_text": "text",
+                "document_uri": "doc_uri",
+                "primary_key": "id",
+            },
+            "chunk_template": "Passage: {chunk_text}\n Document URI: {document_uri}\n",
+        },
+    )
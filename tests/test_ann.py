@@ -0,0 +1,47 @@
+import numpy as np
+
+from src.ann import IVFIndex, build_ivf_index, recall_at_k, top_k
+from src.local_index import normalize
+
+
+def clustered_vectors(num_clusters=8, per_cluster=50, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((num_clusters, dim))
+    points = centers.repeat(per_cluster, axis=0)
+    return normalize(points + 0.3 * rng.standard_normal(points.shape))
+
+
+def test_top_k_is_sorted_and_bounded():
+    scores = np.array([0.1, 0.9, 0.5, 0.7])
+    assert top_k(scores, 2).tolist() == [1, 3]
+    assert top_k(scores, 10).tolist() == [1, 3, 2, 0]
+    assert top_k(scores, 0).tolist() == []
+
+
+def test_lists_partition_the_rows(tmp_path):
+    vectors = clustered_vectors()
+    index = build_ivf_index(tmp_path, vectors, nlist=8)
+    assert sorted(index.ids.tolist()) == list(range(len(vectors)))
+    assert index.offsets[-1] == len(vectors)
+
+    loaded = IVFIndex.load(tmp_path)
+    query = vectors[0]
+    assert np.array_equal(loaded.candidates(query, 8), np.arange(len(vectors)))
+
+
+def test_recall_rises_with_nprobe(tmp_path):
+    vectors = clustered_vectors()
+    index = build_ivf_index(tmp_path, vectors, nlist=16)
+    queries = vectors[::20]
+
+    def recall(nprobe):
+        values = []
+        for query in queries:
+            exact = top_k(vectors @ query, 10)
+            approx, _ = index.search(vectors, query, 10, nprobe)
+            values.append(recall_at_k(exact, approx))
+        return np.mean(values)
+
+    assert recall(2) >= 0.8
+    assert recall(16) == 1.0
+    assert recall(1) <= recall(4) <= recall(16)
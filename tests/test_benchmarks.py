@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+from src.benchmarks import STAGES, benchmark_document, summarize
+
+
+class FakeConverter:
+    def convert(self, asset_path):
+        return SimpleNamespace(document=SimpleNamespace(pages={1: None, 2: None}))
+
+
+class FakeChunker:
+    def chunk(self, document):
+        for i in range(3):
+            meta = SimpleNamespace(
+                doc_items=[
+                    SimpleNamespace(
+                        self_ref=f"#/texts/{i}", prov=[SimpleNamespace(page_no=1)]
+                    )
+                ],
+                headings=["Part 1"],
+                captions=None,
+            )
+            yield SimpleNamespace(text=f"clause {i}", meta=meta)
+
+
+def test_benchmark_document_times_every_stage():
+    record = benchmark_document(FakeConverter(), FakeChunker(), "a.pdf", "uri")
+    assert (record["pages"], record["chunks"]) == (2, 3)
+    for stage in STAGES:
+        assert record[f"{stage}_seconds"] >= 0
+        assert record[f"{stage}_peak_rss_bytes"] > 0
+
+
+def test_summarize_rates_and_peaks():
+    records = [
+        {
+            "pages": pages,
+            "chunks": 2 * pages,
+            **{f"{x}_seconds": 0.5 for x in STAGES},
+            **{f"{x}_peak_rss_bytes": rss for x in STAGES},
+        }
+        for pages, rss in [(3, 100), (1, 300)]
+    ]
+    summary = summarize(records)
+    assert summary["convert"] == {
+        "wall_seconds": 1.0,
+        "pages_per_second": 4.0,
+        "chunks_per_second": 8.0,
+        "peak_rss_bytes": 300,
+    }
+    assert summarize([])["chunk"]["pages_per_second"] == 0.0
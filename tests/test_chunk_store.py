@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+from langchain_core.documents.base import Document
+
+from src.chunk_store import ChunkStore, get_chunk_store
+from src.local_index import CHUNKS_FILE, TOMBSTONES_FILE, build_local_index
+from src.retrievers import batch_retrieve, get_vector_retriever
+
+
+def write_chunks(path, ids, texts):
+    path.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame(
+        {"id": ids, "text": texts, "doc_uri": [f"{x}.pdf" for x in ids]}
+    ).to_parquet(path / CHUNKS_FILE)
+    return path / CHUNKS_FILE
+
+
+def test_fetch_reads_rows_and_caches(tmp_path):
+    store = ChunkStore(
+        write_chunks(tmp_path, ["a", "b"], ["A", "B"]), "id", ["id", "text", "doc_uri"]
+    )
+    assert store.fetch(["b", "missing"]) == {"b": {"text": "B", "doc_uri": "b.pdf"}}
+    store.fetch(["b"])
+    assert (store.cache_hits, store.cache_misses) == (1, 2)
+
+
+def test_hydrate_fills_page_content(tmp_path):
+    store = ChunkStore(
+        write_chunks(tmp_path, ["a", "b"], ["A", "B"]), "id", ["text", "doc_uri"]
+    )
+    documents = [
+        Document(page_content="", metadata={"id": "b", "score": 1.0}),
+        Document(page_content="kept", metadata={"id": "missing"}),
+    ]
+    hydrated = store.hydrate(documents, "text")
+    assert hydrated[0].page_content == "B"
+    assert hydrated[0].metadata == {"id": "b", "score": 1.0, "doc_uri": "b.pdf"}
+    assert hydrated[1].page_content == "kept"
+
+
+def test_skips_tombstoned_and_repeated_keys(tmp_path):
+    # "a" was updated in place: its old row is tombstoned and the new one
+    # appended; "b" was deleted; "c" appears twice without a tombstone
+    path = write_chunks(
+        tmp_path, ["a", "b", "c", "a", "c"], ["old", "B", "C1", "new", "C2"]
+    )
+    np.save(tmp_path / TOMBSTONES_FILE, np.array([True, True, False]))
+    store = ChunkStore(path, "id", ["text"])
+    assert store.fetch(["a", "b", "c"]) == {"a": {"text": "new"}, "c": {"text": "C2"}}
+
+
+def test_reads_rows_out_of_order_across_row_groups(tmp_path):
+    ids = [str(x) for x in range(10)]
+    pd.DataFrame({"id": ids, "text": [x * 2 for x in ids]}).to_parquet(
+        tmp_path / CHUNKS_FILE, row_group_size=3
+    )
+    store = ChunkStore(tmp_path / CHUNKS_FILE, "id", ["text"])
+    assert list(store._rows.index) == ids
+    assert store.fetch(["8", "1", "5"]) == {
+        "8": {"text": "88"},
+        "1": {"text": "11"},
+        "5": {"text": "55"},
+    }
+
+
+def test_two_phase_retrieval(tmp_path, config, embedding):
+    chunks = pd.DataFrame(
+        {
+            "id": ["a", "b"],
+            "doc_uri": ["a.pdf", "b.pdf"],
+            "text": ["licence fees are payable yearly", "appeals go to the court"],
+        }
+    )
+    build_local_index(chunks, embedding, tmp_path)
+    config.retriever.backend = "local"
+    config.retriever.local_index_path = str(tmp_path)
+    config.retriever.chunk_store_path = str(tmp_path / CHUNKS_FILE)
+    config.retriever.parameters.k = 1
+
+    retriever = get_vector_retriever(config, embedding)
+    (key_only,) = retriever.invoke("appeals")
+    assert (key_only.page_content, key_only.metadata) == (
+        "",
+        {"doc_uri": "b.pdf", "id": "b"},
+    )
+
+    [(document,)] = batch_retrieve(
+        retriever, ["appeals"], chunk_store=get_chunk_store(config)
+    )
+    assert document.page_content == "appeals go to the court"
+    assert document.metadata == {"doc_uri": "b.pdf", "id": "b"}
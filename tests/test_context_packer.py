@@ -0,0 +1,80 @@
+from langchain_core.documents.base import Document
+
+from src.context_packer import (
+    drop_near_duplicates,
+    merge_chunks,
+    pack_context,
+    trim_to_budget,
+)
+
+
+def chunk(text, doc_uri="a", pages=None):
+    return Document(page_content=text, metadata={"doc_uri": doc_uri, "pages": pages})
+
+
+def test_merge_chunks_on_adjacent_pages():
+    merged = merge_chunks(
+        [chunk("First.", pages=[3]), chunk("Second.", pages=[4])], "doc_uri"
+    )
+    assert len(merged) == 1
+    assert merged[0].page_content == "First.\nSecond."
+    assert merged[0].metadata["pages"] == [3, 4]
+
+
+def test_merge_chunks_ignores_earlier_distant_pages():
+    merged = merge_chunks(
+        [chunk("Late.", pages=[10]), chunk("Early.", pages=[2])], "doc_uri"
+    )
+    assert [x.page_content for x in merged] == ["Late.", "Early."]
+    assert [x.metadata["pages"] for x in merged] == [[10], [2]]
+
+
+def test_merge_chunks_keeps_page_order():
+    merged = merge_chunks(
+        [chunk("Page five.", pages=[5]), chunk("Page four.", pages=[4])], "doc_uri"
+    )
+    assert len(merged) == 1
+    assert merged[0].page_content == "Page four.\nPage five."
+    assert merged[0].metadata["pages"] == [4, 5]
+
+
+def test_merge_chunks_removes_overlapping_text():
+    left = "The minister may make regulations respecting fees."
+    right = "may make regulations respecting fees. Fees are payable yearly."
+    merged = merge_chunks([chunk(left), chunk(right)], "doc_uri")
+    assert len(merged) == 1
+    assert merged[0].page_content == (
+        "The minister may make regulations respecting fees. Fees are payable yearly."
+    )
+
+
+def test_merge_chunks_keeps_documents_apart():
+    merged = merge_chunks([chunk("One.", "a", [1]), chunk("Two.", "b", [1])], "doc_uri")
+    assert len(merged) == 2
+
+
+def test_drop_near_duplicates_keeps_higher_ranked():
+    docs = [
+        chunk("the licence fee is payable every year", "a"),
+        chunk("the licence fee is payable every year.", "b"),
+        chunk("appeals go to the tribunal", "c"),
+    ]
+    kept = drop_near_duplicates(docs)
+    assert [x.metadata["doc_uri"] for x in kept] == ["a", "c"]
+
+
+def test_trim_to_budget_prefers_query_terms():
+    docs = [chunk("Unrelated filler sentence here. The licence fee is due in May.")]
+    trimmed = trim_to_budget("when is the licence fee due", docs, budget=15)
+    assert trimmed[0].page_content == "The licence fee is due in May."
+
+
+def test_pack_context_fits_budget(config):
+    docs = [
+        chunk(f"Sentence {i} about licence fees and other matters." * 3, pages=[i * 5])
+        for i in range(4)
+    ]
+    context, stats = pack_context(config, "licence fees", docs, budget=60)
+    assert stats["tokens_after"] <= 60
+    assert stats["tokens_saved"] == stats["tokens_before"] - stats["tokens_after"]
+    assert context.startswith("Passage: ")
@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("docling")
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling_core.types.doc import DoclingDocument, DocItemLabel
+
+from src.conversion_cache import ConversionCache
+
+
+class CountingConverter:
+    def __init__(self):
+        self.conversions = 0
+
+    def convert(self, asset_path):
+        self.conversions += 1
+        document = DoclingDocument(name="act")
+        document.add_text(DocItemLabel.TEXT, "Licence fees are payable yearly.")
+        return SimpleNamespace(document=document)
+
+
+def test_reuses_converted_documents(tmp_path):
+    pdf = tmp_path / "act.pdf"
+    pdf.write_bytes(b"%PDF-1.4 act")
+    cache = ConversionCache(tmp_path / "cache", PdfPipelineOptions())
+    converter = CountingConverter()
+
+    first = cache.convert(converter, pdf)
+    second = cache.convert(converter, pdf)
+    assert converter.conversions == 1
+    assert second.export_to_markdown() == first.export_to_markdown()
+
+
+def test_key_covers_content_and_options(tmp_path):
+    pdf = tmp_path / "act.pdf"
+    pdf.write_bytes(b"%PDF-1.4 act")
+    cache = ConversionCache(tmp_path / "cache", PdfPipelineOptions())
+    key = cache.path_for(pdf)
+
+    ocr = PdfPipelineOptions()
+    ocr.do_ocr = not ocr.do_ocr
+    assert ConversionCache(tmp_path / "cache", ocr).path_for(pdf) != key
+
+    pdf.write_bytes(b"%PDF-1.4 amended act")
+    assert cache.path_for(pdf) != key
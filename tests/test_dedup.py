@@ -0,0 +1,43 @@
+import numpy as np
+
+from src.dedup import NearDuplicateFilter, shingle_hashes
+
+SECTION = (
+    "The holder of a licence must pay the annual fee to the registrar before "
+    "the first day of April in each year, and a licence lapses if the fee is "
+    "not paid within thirty days after that date."
+)
+
+
+def chunk(id, text):
+    return {"id": id, "text": text}
+
+
+def test_signature_estimates_jaccard_similarity():
+    dedup = NearDuplicateFilter(num_perm=256, bands=32)
+    amended = SECTION.replace("thirty days", "sixty days")
+    a, b = set(shingle_hashes(SECTION)), set(shingle_hashes(amended))
+    jaccard = len(a & b) / len(a | b)
+    estimate = np.mean(dedup.signature(SECTION) == dedup.signature(amended))
+    assert abs(estimate - jaccard) < 0.15
+
+
+def test_drops_near_duplicates_of_kept_chunks():
+    dedup = NearDuplicateFilter(threshold=0.8)
+    chunks = [
+        chunk("a", SECTION),
+        chunk("b", "Appeals against a decision of the registrar lie to the court."),
+        chunk("c", SECTION.replace("registrar", "Registrar") + " "),
+        chunk("d", SECTION.replace("annual fee", "fee prescribed by regulations")),
+    ]
+    kept = [x["id"] for x in dedup.filter(chunks)]
+
+    assert kept == ["a", "b", "d"]
+    assert [(x["id"], x["canonical_id"]) for x in dedup.duplicates] == [("c", "a")]
+
+
+def test_signatures_are_stable_across_instances():
+    assert np.array_equal(
+        NearDuplicateFilter().signature(SECTION),
+        NearDuplicateFilter().signature(SECTION),
+    )
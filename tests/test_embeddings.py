@@ -0,0 +1,103 @@
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import pytest
+from langchain_core.embeddings import Embeddings
+
+from src.embeddings import BatchingEmbeddings, LocalEmbeddings
+
+
+class RecordingEmbeddings(Embeddings):
+    """
+    Records the texts of every embed_documents call, optionally failing.
+    """
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batches: List[List[str]] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.batches.append(list(texts))
+        if self.fail:
+            raise RuntimeError("endpoint down")
+        return [[float(len(x)), 1.0] for x in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def test_concurrent_queries_are_embedded_together():
+    model = RecordingEmbeddings()
+    engine = BatchingEmbeddings(model, max_batch_size=8, max_wait_ms=500)
+    queries = [f"query {'x' * i}" for i in range(8)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        vectors = list(executor.map(engine.embed_query, queries))
+
+    assert vectors == [[float(len(x)), 1.0] for x in queries]
+    assert len(model.batches) < len(queries)
+    assert sorted(x for batch in model.batches for x in batch) == sorted(queries)
+    metrics = engine.metrics()
+    assert metrics["batches"] == len(model.batches)
+    assert metrics["max_batch_size"] > 1
+
+
+def test_queries_are_cached_by_normalized_text():
+    model = RecordingEmbeddings()
+    engine = BatchingEmbeddings(model, max_wait_ms=0)
+
+    first = engine.embed_query("Tax  credits")
+    assert engine.embed_query("tax credits") == first
+    assert len(model.batches) == 1
+    assert engine.metrics()["cache_hit_rate"] == 0.5
+
+
+def test_cache_evicts_least_recently_used_queries():
+    model = RecordingEmbeddings()
+    engine = BatchingEmbeddings(model, max_wait_ms=0, cache_size=2)
+
+    engine.embed_query("a")
+    engine.embed_query("b")
+    engine.embed_query("a")
+    engine.embed_query("c")
+    engine.embed_query("a")
+    engine.embed_query("b")
+    assert [x for batch in model.batches for x in batch] == ["a", "b", "c", "b"]
+
+
+def test_failed_batches_use_the_fallback():
+    fallback = RecordingEmbeddings()
+    engine = BatchingEmbeddings(RecordingEmbeddings(fail=True), fallback)
+
+    assert engine.embed_query("query") == [5.0, 1.0]
+    assert engine.embed_documents(["a", "bb"]) == [[1.0, 1.0], [2.0, 1.0]]
+    assert engine.metrics()["fallbacks"] == 2
+
+
+def test_failures_without_fallback_reach_the_caller():
+    model = RecordingEmbeddings(fail=True)
+    engine = BatchingEmbeddings(model, max_wait_ms=0)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError, match="endpoint down"):
+            engine.embed_query("query")
+    # A failed query is not cached
+    assert len(model.batches) == 2
+
+
+def test_documents_are_batched_by_length_in_input_order():
+    model = RecordingEmbeddings()
+    engine = BatchingEmbeddings(model, batch_size=2)
+    texts = ["ccc", "a", "dddd", "bb", "e"]
+
+    vectors = engine.embed_documents(texts)
+
+    assert vectors == [[float(len(x)), 1.0] for x in texts]
+    assert model.batches == [["a", "e"], ["bb", "ccc"], ["dddd"]]
+
+
+def test_local_embeddings_explain_missing_local_models_extra(monkeypatch):
+    monkeypatch.setitem(sys.modules, "transformers", None)
+    with pytest.raises(ImportError, match="local-models extra"):
+        LocalEmbeddings("BAAI/bge-small-en-v1.5")
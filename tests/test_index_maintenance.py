@@ -0,0 +1,255 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from langchain_core.documents.base import Document
+
+from src.ann import IVFIndex, build_ivf_index
+from src.chunk_store import ChunkStore
+from src.index_maintenance import LocalIndexMaintainer
+from src.lexical import BM25Index, build_bm25_index
+from src.local_index import (
+    CHUNKS_FILE,
+    EMBEDDINGS_FILE,
+    TOMBSTONES_FILE,
+    LocalVectorStore,
+    build_local_index,
+)
+from src.metadata_index import MetadataIndex
+from src.quantization import (
+    QUANTIZED_CODES_FILE,
+    QuantizedIndex,
+    build_quantized_index,
+)
+from src.query_cache import QueryCache
+from src.semantic_cache import SemanticCache
+
+TEXTS = [
+    "licence fees are payable every year",
+    "appeals are heard by the tribunal",
+    "the minister may make regulations",
+    "inspectors may enter any premises",
+    "records must be kept for six years",
+    "offences are punishable by a fine",
+]
+
+
+def chunk_rows(ids, texts):
+    return pd.DataFrame(
+        {
+            "id": ids,
+            "text": texts,
+            "doc_uri": [f"{x}.pdf" for x in ids],
+            "pages": [[1] for _ in ids],
+            "headings": [[] for _ in ids],
+        }
+    )
+
+
+def changes(rows, change_type, version):
+    return rows.assign(
+        _change_type=change_type,
+        _commit_version=version,
+        _commit_timestamp=pd.Timestamp("2024-01-01") + pd.Timedelta(days=version),
+    )
+
+
+@pytest.fixture
+def index(tmp_path, embedding):
+    chunks = chunk_rows([f"c{i}" for i in range(len(TEXTS))], TEXTS)
+    build_local_index(chunks, embedding, tmp_path, lexical_column="text")
+    vectors = np.load(tmp_path / EMBEDDINGS_FILE)
+    build_ivf_index(tmp_path, vectors, nlist=2)
+    build_quantized_index(tmp_path, vectors, "int8")
+    return tmp_path
+
+
+def search(path, embedding, query, k=1):
+    store = LocalVectorStore(path, embedding, ["id", "text"], "text")
+    return [doc.metadata["id"] for doc in store.similarity_search(query, k=k)]
+
+
+def test_resumes_after_sync_failed_midway(index, embedding, monkeypatch):
+    maintainer = LocalIndexMaintainer(index, embedding, compact_threshold=0.9)
+    update = changes(
+        chunk_rows(["c0"], ["fees for a licence are due in May"]), "update_postimage", 1
+    )
+
+    def fail(self, vectors):
+        raise RuntimeError("crashed")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(LocalIndexMaintainer, "_append_to_quantized", fail)
+        with pytest.raises(RuntimeError):
+            maintainer.apply_changes(update)
+    assert len(np.load(index / EMBEDDINGS_FILE)) == len(TEXTS) + 1
+
+    maintainer.apply_changes(update)
+    num_rows = len(TEXTS) + 1
+    assert len(np.load(index / EMBEDDINGS_FILE)) == num_rows
+    assert len(IVFIndex.load(index).ids) == num_rows
+    assert len(QuantizedIndex.load(index).codes) == num_rows
+    assert search(index, embedding, "when are licence fees due in May") == ["c0"]
+
+
+def test_applies_inserts_updates_and_deletes(index, embedding):
+    maintainer = LocalIndexMaintainer(index, embedding, compact_threshold=0.9)
+    embedding.embedded = 0
+    feed = pd.concat(
+        [
+            changes(
+                chunk_rows(["c6"], ["permits expire after two years"]), "insert", 1
+            ),
+            changes(
+                chunk_rows(["c1"], ["appeals go to the court"]), "update_postimage", 1
+            ),
+            changes(chunk_rows(["c2"], [TEXTS[2]]), "delete", 2),
+        ]
+    )
+    metrics = maintainer.apply_changes(feed)
+
+    assert (metrics["upserts"], metrics["deletes"]) == (2, 1)
+    assert embedding.embedded == 2
+    tombstones = np.load(index / TOMBSTONES_FILE)
+    assert np.flatnonzero(tombstones).tolist() == [1, 2]
+    assert search(index, embedding, "when do permits expire") == ["c6"]
+    assert search(index, embedding, "appeals go to the court") == ["c1"]
+    assert "c2" not in search(
+        index, embedding, "the minister may make regulations", k=8
+    )
+    assert maintainer.load_state().version == 2
+
+
+@pytest.mark.parametrize("quantized", [True, False])
+@pytest.mark.parametrize("query_type", ["exact", "hybrid"])
+def test_full_scans_skip_tombstoned_rows(index, embedding, quantized, query_type):
+    if not quantized:
+        (index / QUANTIZED_CODES_FILE).unlink()
+    maintainer = LocalIndexMaintainer(index, embedding, compact_threshold=0.9)
+    maintainer.apply_changes(changes(chunk_rows(["c2"], [TEXTS[2]]), "delete", 1))
+
+    store = LocalVectorStore(index, embedding, ["id", "text"], "text")
+    results = store.similarity_search(
+        "the minister may make regulations", k=8, query_type=query_type
+    )
+    ids = [doc.metadata["id"] for doc in results]
+    assert "c2" not in ids
+    assert len(ids) == len(TEXTS) - 1
+
+
+def test_appends_new_rows_to_lexical_indexes(index, embedding, tmp_path_factory):
+    maintainer = LocalIndexMaintainer(index, embedding, compact_threshold=0.9)
+    feed = changes(
+        chunk_rows(["c6", "c0"], ["permits expire after two years", "fees rose"]),
+        "insert",
+        1,
+    )
+    maintainer.apply_changes(feed)
+
+    rebuilt = tmp_path_factory.mktemp("rebuilt")
+    chunks = pd.read_parquet(index / CHUNKS_FILE)
+    bm25 = build_bm25_index(rebuilt, chunks["text"].tolist())
+    for query in ["permits expire", "licence fees", "fees rose"]:
+        np.testing.assert_allclose(
+            BM25Index.load(index).scores(query), bm25.scores(query)
+        )
+    metadata = MetadataIndex.load(index)
+    assert metadata.rows({"doc_uris": ["c6.pdf"]}).tolist() == [6]
+    assert metadata.rows({"doc_uris": ["c0.pdf"]}).tolist() == [0, 7]
+    assert len(metadata.page_first) == len(chunks)
+
+
+def test_skips_changes_already_applied(index, embedding):
+    maintainer = LocalIndexMaintainer(index, embedding, compact_threshold=0.9)
+    feed = changes(chunk_rows(["c6"], ["permits expire after two years"]), "insert", 1)
+    maintainer.apply_changes(feed)
+
+    embedding.embedded = 0
+    metrics = maintainer.apply_changes(feed)
+    assert (metrics["upserts"], metrics["deletes"]) == (0, 0)
+    assert embedding.embedded == 0
+    assert len(pd.read_parquet(index / CHUNKS_FILE)) == len(TEXTS) + 1
+
+
+def test_compacts_past_threshold(index, embedding):
+    maintainer = LocalIndexMaintainer(index, embedding, compact_threshold=0.2)
+    deleted = chunk_rows(["c0", "c1"], TEXTS[:2])
+    metrics = maintainer.apply_changes(changes(deleted, "delete", 1))
+
+    assert metrics["compacted"]
+    assert not (index / TOMBSTONES_FILE).exists()
+    chunks = pd.read_parquet(index / CHUNKS_FILE)
+    assert chunks["id"].tolist() == ["c2", "c3", "c4", "c5"]
+    assert len(np.load(index / EMBEDDINGS_FILE)) == 4
+    assert len(IVFIndex.load(index).ids) == 4
+    assert len(QuantizedIndex.load(index).codes) == 4
+
+
+def test_finishes_compaction_interrupted_midway(index, embedding, monkeypatch):
+    maintainer = LocalIndexMaintainer(index, embedding, compact_threshold=0.2)
+    replace = Path.replace
+
+    def crash_before_chunks(self, target):
+        if Path(target) == index / CHUNKS_FILE:
+            raise RuntimeError("crashed")
+        return replace(self, target)
+
+    # Crash after the embeddings were swapped and the tombstones dropped
+    with monkeypatch.context() as patched:
+        patched.setattr(Path, "replace", crash_before_chunks)
+        with pytest.raises(RuntimeError):
+            maintainer.apply_changes(
+                changes(chunk_rows(["c0", "c1"], TEXTS[:2]), "delete", 1)
+            )
+    assert len(np.load(index / EMBEDDINGS_FILE)) == 4
+    assert len(pd.read_parquet(index / CHUNKS_FILE)) == len(TEXTS)
+
+    maintainer.apply_changes(
+        changes(chunk_rows(["c6"], ["permits expire after two years"]), "insert", 2)
+    )
+    chunks = pd.read_parquet(index / CHUNKS_FILE)
+    assert chunks["id"].tolist() == ["c2", "c3", "c4", "c5", "c6"]
+    assert len(np.load(index / EMBEDDINGS_FILE)) == 5
+    assert len(IVFIndex.load(index).ids) == 5
+    assert len(QuantizedIndex.load(index).codes) == 5
+    assert search(index, embedding, "when do permits expire") == ["c6"]
+
+
+def test_discards_incomplete_compaction(index, embedding):
+    np.save(index / f"{EMBEDDINGS_FILE}.compact.npy", np.zeros((1, 64), np.float32))
+    maintainer = LocalIndexMaintainer(index, embedding, compact_threshold=0.9)
+    maintainer.apply_changes(changes(chunk_rows(["c2"], [TEXTS[2]]), "delete", 1))
+
+    assert not (index / f"{EMBEDDINGS_FILE}.compact.npy").exists()
+    assert len(np.load(index / EMBEDDINGS_FILE)) == len(TEXTS)
+    assert "c2" not in search(index, embedding, TEXTS[2], k=8)
+
+
+def test_invalidates_caches(index, embedding):
+    cache = QueryCache()
+    cache.set("query", str(index), [Document(page_content="stale")])
+    semantic_cache = SemanticCache(embedding)
+    semantic_cache.add("query", str(index), "stale", "", [])
+    maintainer = LocalIndexMaintainer(
+        index,
+        embedding,
+        compact_threshold=0.9,
+        cache=cache,
+        semantic_cache=semantic_cache,
+    )
+    maintainer.apply_changes(
+        changes(chunk_rows(["c6"], ["permits expire after two years"]), "insert", 1)
+    )
+    assert cache.get("query") is None
+    assert semantic_cache.lookup("query", str(index)) is None
+
+
+def test_chunk_store_reads_updated_rows(index, embedding):
+    maintainer = LocalIndexMaintainer(index, embedding, compact_threshold=0.9)
+    maintainer.apply_changes(
+        changes(chunk_rows(["c1"], ["appeals go to the court"]), "update_postimage", 1)
+    )
+    store = ChunkStore(index / CHUNKS_FILE, "id", ["text"])
+    assert store.fetch(["c1"]) == {"c1": {"text": "appeals go to the court"}}
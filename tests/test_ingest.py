@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from src import ingest
+from src.config import IngestConfig
+
+
+def fake_process_document(converter, chunker, asset_path, doc_uri, **kwargs):
+    if "bad" in str(asset_path):
+        raise ValueError("not a PDF")
+    return [{"id": f"{doc_uri}-{i}", "doc_uri": doc_uri} for i in range(2)]
+
+
+@pytest.fixture
+def documents(monkeypatch):
+    # Workers are forked, so they see the patched module as well
+    for name in ("get_converter", "get_chunker", "get_child_chunker"):
+        monkeypatch.setattr(ingest, name, lambda config: None)
+    monkeypatch.setattr(ingest, "process_document", fake_process_document)
+    return pd.DataFrame(
+        {
+            "title": [f"Act {i}" for i in range(6)],
+            "link_to_page": [f"uri:{i}" for i in range(6)],
+            "asset_path": ["a.pdf", "b.pdf", "bad.pdf", "c.pdf", "d.pdf", "e.pdf"],
+        }
+    )
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_chunks_follow_row_order_and_failures_are_isolated(documents, num_workers):
+    failed = []
+    config = IngestConfig(num_workers=num_workers)
+    chunks = list(ingest.iter_chunks(documents, config, failed=failed))
+
+    assert failed == ["uri:2"]
+    assert [x["doc_uri"] for x in chunks[::2]] == [
+        "uri:0",
+        "uri:1",
+        "uri:3",
+        "uri:4",
+        "uri:5",
+    ]
+    assert len(chunks) == 10
+
+
+def test_chunks_are_streamed(documents, monkeypatch):
+    processed = []
+
+    def process_document(converter, chunker, asset_path, doc_uri, **kwargs):
+        processed.append(doc_uri)
+        return fake_process_document(converter, chunker, asset_path, doc_uri)
+
+    monkeypatch.setattr(ingest, "process_document", process_document)
+    chunks = ingest.iter_chunks(documents, IngestConfig())
+    assert next(chunks)["doc_uri"] == "uri:0"
+    assert processed == ["uri:0"]
+
+
+def test_write_parquet_in_batches(tmp_path):
+    rows = [
+        {"id": str(i), "doc_uri": "uri", "pages": [i], "text": f"chunk {i}"}
+        for i in range(5)
+    ]
+    path = tmp_path / "chunks.parquet"
+    assert ingest.write_parquet(iter(rows), path, batch_size=2) == 5
+
+    parquet = pq.ParquetFile(path)
+    assert parquet.metadata.num_row_groups == 3
+    assert parquet.schema_arrow == ingest.CHUNK_ARROW_SCHEMA
+    table = parquet.read().to_pandas()
+    assert table["id"].tolist() == [str(i) for i in range(5)]
+    assert table["pages"].map(list).tolist() == [[i] for i in range(5)]
+
+
+class FakeChunker:
+    """
+    Chunks a document, a list of (ref, text) items, into groups of size.
+    """
+
+    def __init__(self, size):
+        self.size = size
+
+    def chunk(self, document):
+        for start in range(0, len(document), self.size):
+            items = document[start : start + self.size]
+            meta = SimpleNamespace(
+                doc_items=[
+                    SimpleNamespace(self_ref=ref, prov=[SimpleNamespace(page_no=1)])
+                    for ref, _ in items
+                ],
+                headings=None,
+                captions=None,
+            )
+            yield SimpleNamespace(text=" ".join(x for _, x in items), meta=meta)
+
+
+def test_children_point_to_their_parent():
+    document = [(f"#/texts/{i}", f"clause {i}.") for i in range(4)]
+    children = ingest.make_hierarchical_chunks(
+        document, FakeChunker(2), FakeChunker(1), "uri"
+    )
+
+    assert [x["text"] for x in children] == [x for _, x in document]
+    assert [x["parent_text"] for x in children] == [
+        "clause 0. clause 1.",
+        "clause 0. clause 1.",
+        "clause 2. clause 3.",
+        "clause 2. clause 3.",
+    ]
+    assert children[0]["parent_id"] == children[1]["parent_id"]
+    assert children[1]["parent_id"] != children[2]["parent_id"]
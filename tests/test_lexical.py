@@ -0,0 +1,52 @@
+import numpy as np
+
+from src.lexical import (
+    BM25Index,
+    build_bm25_index,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+TEXTS = [
+    "Section 12.1 applies to every licence",
+    "licence fees are payable every year",
+    "appeals are heard by the tribunal",
+    "",
+]
+
+
+def test_tokenize_keeps_section_references():
+    assert tokenize("See s. 12.1(a) of the Act") == [
+        "see",
+        "s",
+        "12.1",
+        "a",
+        "of",
+        "the",
+        "act",
+    ]
+
+
+def test_ranks_by_bm25(tmp_path):
+    index = build_bm25_index(tmp_path, TEXTS)
+    ids, scores = index.search("licence fees", k=10)
+    assert ids.tolist() == [1, 0]
+    assert scores[0] > scores[1] > 0
+
+    ids, _ = BM25Index.load(tmp_path).search("12.1", k=10)
+    assert ids.tolist() == [0]
+
+
+def test_search_limits_to_ids_and_skips_excluded(tmp_path):
+    index = build_bm25_index(tmp_path, TEXTS)
+    assert index.search("licence", k=10, ids=np.array([0, 2]))[0].tolist() == [0]
+    exclude = np.array([False, True, False, False])
+    assert index.search("licence", k=10, exclude=exclude)[0].tolist() == [0]
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    ids, scores = reciprocal_rank_fusion(
+        [np.array([1, 2, 3]), np.array([3, 1, 4])], k=3, rrf_k=60
+    )
+    assert ids.tolist() == [1, 3, 2]
+    assert scores[0] == np.float32(1 / 61 + 1 / 62)
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.local_index import (
+    EMBEDDINGS_FILE,
+    LocalVectorStore,
+    build_local_index,
+    normalize,
+    write_local_index,
+)
+
+TEXTS = [
+    "licence fees are payable every year",
+    "appeals",
+    "the minister may make regulations about anything in this act",
+    "inspectors may enter any premises",
+]
+
+
+@pytest.fixture
+def chunks():
+    return pd.DataFrame(
+        {
+            "id": [f"c{i}" for i in range(len(TEXTS))],
+            "text": TEXTS,
+            "pages": [[i + 1] for i in range(len(TEXTS))],
+        }
+    )
+
+
+def test_embeddings_keep_row_order(tmp_path, chunks, embedding):
+    # Batches are formed by text length, so rows are embedded out of order
+    build_local_index(chunks, embedding, tmp_path, batch_size=3)
+    expected = normalize(embedding.embed_documents(TEXTS))
+    np.testing.assert_allclose(np.load(tmp_path / EMBEDDINGS_FILE), expected)
+
+
+def test_search_returns_documents_like_remote_results(tmp_path, chunks, embedding):
+    build_local_index(chunks, embedding, tmp_path)
+    store = LocalVectorStore(tmp_path, embedding, ["id", "text", "pages"], "text")
+
+    (document, score), *_ = store.similarity_search_with_score("licence fees", k=2)
+    assert document.page_content == TEXTS[0]
+    assert document.metadata == {"id": "c0", "pages": [1]}
+    assert isinstance(score, float)
+
+    results = store.similarity_search_with_score("licence fees", score_threshold=0.99)
+    assert results == []
+
+
+def test_key_only_search(tmp_path, chunks, embedding):
+    build_local_index(chunks, embedding, tmp_path)
+    store = LocalVectorStore(tmp_path, embedding, ["id"], None)
+    document = store.similarity_search("inspectors may enter premises", k=1)[0]
+    assert (document.page_content, document.metadata) == ("", {"id": "c3"})
+
+
+def test_from_texts(tmp_path, embedding):
+    store = LocalVectorStore.from_texts(
+        TEXTS, embedding, [{"id": str(i)} for i in range(len(TEXTS))], path=tmp_path
+    )
+    assert store.similarity_search("appeals", k=1)[0].metadata == {"id": "1"}
+
+
+def test_rejects_mismatched_embeddings(tmp_path, chunks):
+    with pytest.raises(ValueError):
+        write_local_index(chunks, np.ones((2, 4)), tmp_path)
@@ -0,0 +1,97 @@
+import pandas as pd
+
+from src.manifest import (
+    ManifestEntry,
+    exclude_failed,
+    file_hash,
+    load_manifest,
+    plan_incremental,
+    save_manifest,
+)
+
+SETTINGS = {"max_tokens": 256}
+
+
+def documents(tmp_path, contents):
+    for name, text in contents.items():
+        (tmp_path / name).write_text(text)
+    return pd.DataFrame(
+        {
+            "title": list(contents),
+            "link_to_page": [f"https://example.com/{x}" for x in contents],
+            "asset_path": list(contents),
+        }
+    )
+
+
+def entry(tmp_path, name, settings=SETTINGS):
+    return ManifestEntry(
+        doc_uri=f"https://example.com/{name}",
+        content_hash=file_hash(tmp_path / name),
+        settings=settings,
+    )
+
+
+def test_first_run_processes_everything(tmp_path):
+    df = documents(tmp_path, {"a.pdf": "a", "b.pdf": "b"})
+    changed, stale, updated = plan_incremental(df, {}, SETTINGS, tmp_path)
+    assert changed["asset_path"].tolist() == ["a.pdf", "b.pdf"]
+    assert stale == []
+    assert set(updated) == {"a.pdf", "b.pdf"}
+
+
+def test_only_new_and_modified_documents_are_processed(tmp_path):
+    df = documents(tmp_path, {"a.pdf": "a", "b.pdf": "b"})
+    manifest = {"a.pdf": entry(tmp_path, "a.pdf"), "b.pdf": entry(tmp_path, "b.pdf")}
+    (tmp_path / "b.pdf").write_text("b, amended")
+    df = pd.concat([df, documents(tmp_path, {"c.pdf": "c"})], ignore_index=True)
+
+    changed, stale, updated = plan_incremental(df, manifest, SETTINGS, tmp_path)
+    assert changed["asset_path"].tolist() == ["b.pdf", "c.pdf"]
+    assert stale == ["https://example.com/b.pdf"]
+    assert updated["b.pdf"].content_hash == file_hash(tmp_path / "b.pdf")
+
+
+def test_changed_settings_reprocess_documents(tmp_path):
+    df = documents(tmp_path, {"a.pdf": "a"})
+    manifest = {"a.pdf": entry(tmp_path, "a.pdf", {"max_tokens": 128})}
+    changed, stale, _ = plan_incremental(df, manifest, SETTINGS, tmp_path)
+    assert changed["asset_path"].tolist() == ["a.pdf"]
+    assert stale == ["https://example.com/a.pdf"]
+
+
+def test_removed_and_missing_documents_are_stale(tmp_path):
+    df = documents(tmp_path, {"a.pdf": "a", "b.pdf": "b"})
+    manifest = {
+        "a.pdf": entry(tmp_path, "a.pdf"),
+        "b.pdf": entry(tmp_path, "b.pdf"),
+        "gone.pdf": ManifestEntry(
+            doc_uri="https://example.com/gone.pdf", content_hash="x", settings=SETTINGS
+        ),
+    }
+    (tmp_path / "b.pdf").unlink()
+
+    changed, stale, updated = plan_incremental(df, manifest, SETTINGS, tmp_path)
+    assert changed.empty
+    assert stale == ["https://example.com/b.pdf", "https://example.com/gone.pdf"]
+    assert set(updated) == {"a.pdf"}
+
+
+def test_failed_documents_keep_their_previous_state(tmp_path):
+    df = documents(tmp_path, {"a.pdf": "a", "b.pdf": "b"})
+    manifest = {"a.pdf": entry(tmp_path, "a.pdf")}
+    (tmp_path / "a.pdf").write_text("a, amended")
+    _, stale, updated = plan_incremental(df, manifest, SETTINGS, tmp_path)
+
+    failed = ["https://example.com/a.pdf", "https://example.com/b.pdf"]
+    stale, updated = exclude_failed(manifest, updated, stale, failed)
+    assert stale == []
+    assert updated == manifest
+
+
+def test_manifest_round_trip(tmp_path):
+    (tmp_path / "a.pdf").write_text("a")
+    manifest = {"a.pdf": entry(tmp_path, "a.pdf")}
+    save_manifest(manifest, tmp_path / "state" / "manifest.json")
+    assert load_manifest(tmp_path / "state" / "manifest.json") == manifest
+    assert load_manifest(tmp_path / "missing.json") == {}
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from src.local_index import normalize
+from src.quantization import (
+    QuantizedIndex,
+    build_quantized_index,
+    evaluate_quantization,
+)
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return normalize(rng.standard_normal((500, 64)))
+
+
+@pytest.mark.parametrize("kind, ratio", [("int8", 4), ("binary", 32)])
+def test_rescoring_recovers_exact_results(vectors, kind, ratio):
+    quantized = QuantizedIndex.encode(vectors, kind)
+    report = evaluate_quantization(vectors, quantized, vectors[:20], k=10)
+    assert report["compression_ratio"] == pytest.approx(ratio, rel=0.05)
+    assert report["recall_at_10"] >= (0.95 if kind == "int8" else 0.6)
+
+
+def test_rescored_scores_are_exact(vectors):
+    quantized = QuantizedIndex.encode(vectors, "int8")
+    ids, scores = quantized.search(vectors, vectors[3], k=5)
+    assert ids[0] == 3
+    np.testing.assert_allclose(scores, vectors[ids] @ vectors[3], rtol=1e-6)
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_searches_only_candidates_and_skips_excluded(vectors):
+    quantized = QuantizedIndex.encode(vectors, "int8")
+    ids, _ = quantized.search(vectors, vectors[3], k=5, ids=np.arange(100, 200))
+    assert np.all((ids >= 100) & (ids < 200))
+
+    exclude = np.zeros(len(vectors), dtype=bool)
+    exclude[3] = True
+    ids, _ = quantized.search(vectors, vectors[3], k=5, exclude=exclude)
+    assert 3 not in ids
+
+
+@pytest.mark.parametrize("kind", ["int8", "binary"])
+def test_round_trips_through_disk(tmp_path, vectors, kind):
+    build_quantized_index(tmp_path, vectors, kind)
+    loaded = QuantizedIndex.load(tmp_path)
+    assert loaded.kind == kind
+    assert np.array_equal(loaded.codes, QuantizedIndex.encode(vectors, kind).codes)
@@ -0,0 +1,101 @@
+import pytest
+from langchain_core.documents.base import Document
+
+from src.local_index import LocalVectorStore
+from src.query_cache import (
+    CachingRetriever,
+    QueryCache,
+    SQLiteQueryCache,
+    make_cache_key,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make_cache(**kwargs):
+        if request.param == "sqlite":
+            return SQLiteQueryCache(tmp_path / "cache.db", **kwargs)
+        return QueryCache(**kwargs)
+
+    return make_cache
+
+
+def docs(text):
+    return [Document(page_content=text, metadata={"pages": [1]})]
+
+
+def test_keys_normalize_the_query():
+    key = make_cache_key("index", "Licence  Fees?", {"k": 3})
+    assert key == make_cache_key("index", "licence fees?", {"k": 3})
+    assert key != make_cache_key("index", "licence fees?", {"k": 4})
+    assert key != make_cache_key("other", "licence fees?", {"k": 3})
+
+
+def test_entries_expire(make_cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.query_cache.time.time", lambda: now[0])
+    cache = make_cache(ttl_seconds=10)
+    cache.set("a", "index", docs("A"))
+    now[0] += 5
+    assert cache.get("a") == docs("A")
+    now[0] += 6
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used(make_cache, monkeypatch):
+    now = [1000.0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr("src.query_cache.time.time", tick)
+    cache = make_cache(max_size=2)
+    cache.set("a", "index", docs("A"))
+    cache.set("b", "index", docs("B"))
+    cache.get("a")
+    cache.set("c", "index", docs("C"))
+    assert cache.get("b") is None
+    assert cache.get("a") == docs("A")
+    assert cache.stats()["size"] == 2
+
+
+def test_invalidates_one_index(make_cache):
+    cache = make_cache()
+    cache.set("a", "index", docs("A"))
+    cache.set("b", "other", docs("B"))
+    cache.invalidate("index")
+    assert cache.get("a") is None
+    assert cache.get("b") == docs("B")
+
+
+def test_sqlite_cache_is_shared(tmp_path):
+    SQLiteQueryCache(tmp_path / "cache.db").set("a", "index", docs("A"))
+    assert SQLiteQueryCache(tmp_path / "cache.db").get("a") == docs("A")
+
+
+def test_caching_retriever_skips_repeated_searches(tmp_path, embedding):
+    store = LocalVectorStore.from_texts(
+        ["licence fees", "appeals"], embedding, path=tmp_path
+    )
+    searches = []
+    search = store.similarity_search_with_score
+
+    def counting_search(*args, **kwargs):
+        searches.append(args)
+        return search(*args, **kwargs)
+
+    store.similarity_search_with_score = counting_search
+    retriever = CachingRetriever(
+        retriever=store.as_retriever(search_kwargs={"k": 1}),
+        cache=QueryCache(),
+        index_name="index",
+    )
+    first = retriever.invoke("Licence fees")
+    assert retriever.invoke("licence  fees") == first
+    assert len(searches) == 1
+
+    retriever.invalidate()
+    retriever.invoke("licence fees")
+    assert len(searches) == 2
@@ -0,0 +1,59 @@
+import sys
+
+import pytest
+from langchain_core.documents.base import Document
+
+from src.config import RerankerConfig
+from src.rerank import CrossEncoderScorer, LexicalScorer, Reranker, get_reranker
+
+
+class CountingScorer:
+    def __init__(self):
+        self.batches = []
+
+    def score(self, query, texts):
+        self.batches.append(len(texts))
+        return LexicalScorer().score(query, texts)
+
+
+def doc(id, text):
+    return Document(page_content=text, metadata={"id": id})
+
+
+DOCUMENTS = [
+    doc("a", "appeals are heard by the tribunal"),
+    doc("b", "section 12.1 sets the licence fee"),
+    doc("c", "the licence fee is payable every year"),
+    doc("d", "inspectors may enter premises"),
+]
+
+
+def test_lexical_scorer_rewards_terms_and_phrases():
+    scores = LexicalScorer().score("licence fee", [x.page_content for x in DOCUMENTS])
+    assert scores[1] == scores[2] > scores[0] == scores[3] == 0
+
+
+def test_reranks_and_keeps_retrieval_order_on_ties():
+    reranker = get_reranker(RerankerConfig(model="lexical"), id_key="id")
+    ranked = reranker.rerank("section 12.1 licence fee", DOCUMENTS, k=2)
+    assert [x.metadata["id"] for x in ranked] == ["b", "c"]
+
+    ranked = reranker.rerank("licence fee", DOCUMENTS, k=3)
+    assert [x.metadata["id"] for x in ranked] == ["b", "c", "a"]
+
+
+def test_scores_in_batches_and_caches_them():
+    scorer = CountingScorer()
+    reranker = Reranker(scorer, batch_size=3, id_key="id")
+    reranker.rerank("licence fee", DOCUMENTS, k=2)
+    assert scorer.batches == [3, 1]
+
+    reranker.rerank("Licence  fee", DOCUMENTS + [doc("e", "fees")], k=2)
+    assert scorer.batches == [3, 1, 1]
+    assert (reranker.cache_hits, reranker.cache_misses) == (4, 5)
+
+
+def test_cross_encoder_explains_missing_local_models_extra(monkeypatch):
+    monkeypatch.setitem(sys.modules, "transformers", None)
+    with pytest.raises(ImportError, match="local-models extra"):
+        CrossEncoderScorer("cross-encoder/ms-marco-MiniLM-L-6-v2")
@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+from langchain_core.documents.base import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ValidationError
+
+from src.config import MetadataFilter
+from src.retrievers import (
+    batch_retrieve,
+    expand_to_parents,
+    make_chunk_id,
+    make_search_filter,
+    make_text_chunk,
+)
+
+
+def test_local_filter_keeps_all_keys(config):
+    config.retriever.backend = "local"
+    filters = MetadataFilter(doc_uris=["a"], headings=["Fees"], min_page=0)
+    assert make_search_filter(config, filters) == {
+        "doc_uris": ["a"],
+        "headings": ["Fees"],
+        "min_page": 0,
+    }
+
+
+def test_databricks_filter_on_doc_uris(config):
+    filters = MetadataFilter(doc_uris=["a", "b"])
+    assert make_search_filter(config, filters) == {"doc_uri": ["a", "b"]}
+    assert make_search_filter(config, MetadataFilter()) is None
+
+
+@pytest.mark.parametrize(
+    "filters", [{"headings": ["Fees"]}, {"min_page": 0}, {"max_page": 3}]
+)
+def test_databricks_filter_rejects_unsupported_keys(config, filters):
+    with pytest.raises(ValueError, match="cannot filter"):
+        make_search_filter(config, MetadataFilter(doc_uris=["a"], **filters))
+
+
+def test_filter_rejects_unknown_keys():
+    with pytest.raises(ValidationError):
+        MetadataFilter(doc_uri=["a"])
+
+
+def docling_chunk(text, refs):
+    items = [
+        SimpleNamespace(self_ref=ref, prov=[SimpleNamespace(page_no=page)])
+        for page, ref in enumerate(refs, 1)
+    ]
+    meta = SimpleNamespace(doc_items=items, headings=["Part 1"], captions=None)
+    return SimpleNamespace(text=text, meta=meta)
+
+
+def test_chunk_ids_derive_from_content():
+    chunk = make_text_chunk(docling_chunk("Fees", ["#/texts/1"]), doc_uri="a")
+    assert chunk["id"] == make_chunk_id("a", ["#/texts/1"], "Fees")
+    assert (
+        chunk["id"]
+        == make_text_chunk(docling_chunk("Fees", ["#/texts/1"]), doc_uri="a")["id"]
+    )
+
+    others = [
+        make_chunk_id("b", ["#/texts/1"], "Fees"),
+        make_chunk_id("a", ["#/texts/2"], "Fees"),
+        make_chunk_id("a", ["#/texts/1"], "Fees due"),
+    ]
+    assert len({chunk["id"], *others}) == 4
+
+
+def test_expand_to_parents_keeps_best_child_rank(config):
+    config.retriever.mapping.parent_id = "parent_id"
+    config.retriever.mapping.parent_text = "parent_text"
+    docs = [
+        Document(page_content="c2", metadata={"parent_id": "p2", "parent_text": "P2"}),
+        Document(page_content="x", metadata={}),
+        Document(page_content="c1", metadata={"parent_id": "p1", "parent_text": "P1"}),
+        Document(page_content="c3", metadata={"parent_id": "p2", "parent_text": "P2"}),
+    ]
+    expanded = expand_to_parents(config, docs)
+    assert [d.page_content for d in expanded] == ["P2", "x", "P1"]
+    assert expanded[0].metadata == {"parent_id": "p2"}
+
+
+class RecordingRetriever(BaseRetriever):
+    queries: List[str] = []
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        self.queries.append(query)
+        if query == "boom":
+            raise RuntimeError("search failed")
+        return [Document(page_content=query.upper(), metadata={"id": query})]
+
+
+def test_batch_retrieve_searches_each_query_once():
+    retriever = RecordingRetriever(queries=[])
+    results = batch_retrieve(retriever, ["fees", "boom", "appeals", "fees"])
+
+    assert sorted(retriever.queries) == ["appeals", "boom", "fees"]
+    assert [r[0].page_content for r in results if isinstance(r, list)] == [
+        "FEES",
+        "APPEALS",
+        "FEES",
+    ]
+    assert isinstance(results[1], RuntimeError)
@@ -0,0 +1,111 @@
+import os
+
+import pandas as pd
+
+from src.index_maintenance import sync_delta_index
+from src.query_cache import QueryCache
+from src.semantic_cache import SemanticCache
+
+
+def add(cache, question, index_name="index", answer=None):
+    cache.add(question, index_name, answer or question.upper(), "", [])
+
+
+def test_reuses_answer_of_the_same_index(embedding):
+    cache = SemanticCache(embedding, threshold=0.7)
+    add(cache, "how much is the licence fee", "other")
+    add(cache, "how long must records be kept")
+    assert cache.lookup("how much is the licence fee", "index") is None
+
+    add(cache, "what is the licence fee", answer="ten pounds")
+    hit = cache.lookup("how much is the licence fee", "index")
+    assert hit is not None and hit.answer == "ten pounds"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_expired_slots_are_reused(embedding, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.semantic_cache.time.time", lambda: now[0])
+    cache = SemanticCache(embedding, max_size=2, ttl_seconds=10)
+    add(cache, "licence fees")
+    add(cache, "appeal deadlines")
+    now[0] += 5
+    add(cache, "record keeping")
+    now[0] += 6
+    assert cache.stats()["size"] == 1
+
+    # The expired "appeal deadlines" is replaced rather than the live answer
+    add(cache, "inspector powers")
+    assert cache.lookup("record keeping", "index") is not None
+    assert cache.lookup("licence fees", "index") is None
+    assert cache.stats()["size"] == 2
+
+
+def test_evicts_least_recently_used(embedding):
+    cache = SemanticCache(embedding, max_size=2)
+    add(cache, "licence fees")
+    add(cache, "appeal deadlines")
+    cache.lookup("licence fees", "index")
+    add(cache, "record keeping")
+    assert cache.lookup("licence fees", "index") is not None
+    assert cache.lookup("appeal deadlines", "index") is None
+
+
+def test_drops_answers_older_than_sync_state(embedding, tmp_path):
+    state_path = tmp_path / "sync_state.json"
+    cache = SemanticCache(embedding, sync_state_path=state_path)
+    add(cache, "licence fees")
+    assert cache.lookup("licence fees", "index") is not None
+
+    # A sync in another process rewrites the state file
+    state_path.write_text("{}")
+    os.utime(state_path, (2e9, 2e9))
+    assert cache.lookup("licence fees", "index") is None
+
+
+class FakeIndex:
+    def __init__(self):
+        self.syncs = 0
+
+    def sync(self):
+        self.syncs += 1
+
+    def wait_until_ready(self, wait_for_updates):
+        pass
+
+
+def test_delta_sync_invalidates_caches(embedding, tmp_path, monkeypatch):
+    history = pd.DataFrame(
+        {"version": [0, 1], "timestamp": pd.to_datetime(["2024-01-01"] * 2)}
+    )
+    monkeypatch.setattr(
+        "src.index_maintenance.table_history", lambda spark, table: history
+    )
+    query_cache = QueryCache()
+    semantic_cache = SemanticCache(embedding)
+    state_path = tmp_path / "state.json"
+    index = FakeIndex()
+
+    def sync():
+        query_cache.set("query", "index", [])
+        add(semantic_cache, "query")
+        return sync_delta_index(
+            None,
+            index,
+            "chunks",
+            state_path,
+            cache=query_cache,
+            semantic_cache=semantic_cache,
+            index_name="index",
+        )
+
+    assert sync()["synced"]
+    assert query_cache.get("query") is None
+    assert semantic_cache.lookup("query", "index") is None
+
+    # Without new commits neither the index nor the state file is touched
+    mtime = state_path.stat().st_mtime_ns
+    assert not sync()["synced"]
+    assert index.syncs == 1
+    assert state_path.stat().st_mtime_ns == mtime
+    assert semantic_cache.lookup("query", "index") is not None
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+from src.ann import IVFIndex, build_ivf_index
+from src.local_index import (
+    CHUNKS_FILE,
+    TOMBSTONES_FILE,
+    LocalVectorStore,
+    normalize,
+    write_local_index,
+)
+from src.quantization import QuantizedIndex, build_quantized_index
+from src.retrieval_benchmarks import benchmark_shards, make_synthetic_index
+from src.sharding import (
+    ShardedVectorStore,
+    shard_local_index,
+    shard_of,
+    shard_path,
+)
+
+
+def make_index(path, n=60, dim=8):
+    rng = np.random.default_rng(0)
+    chunks = pd.DataFrame(
+        {
+            "id": [f"c{i}" for i in range(n)],
+            "text": [f"chunk {i}" for i in range(n)],
+            "doc_uri": [f"doc{i % 6}" for i in range(n)],
+            "pages": [[i % 5] for i in range(n)],
+            "headings": [[] for _ in range(n)],
+        }
+    )
+    vectors = normalize(rng.normal(size=(n, dim)))
+    write_local_index(chunks, vectors, path)
+    build_ivf_index(path, vectors, nlist=4)
+    build_quantized_index(path, vectors, "int8")
+    return chunks, vectors
+
+
+def test_shards_partition_by_document(tmp_path):
+    chunks, _ = make_index(tmp_path / "source")
+    sizes = shard_local_index(tmp_path / "source", tmp_path / "shards", 3)
+    assert sum(sizes) == len(chunks)
+    for shard in range(3):
+        shard_chunks = pd.read_parquet(
+            shard_path(tmp_path / "shards", shard) / CHUNKS_FILE
+        )
+        assert all(shard_of(x, 3) == shard for x in shard_chunks["doc_uri"])
+
+
+def test_shards_keep_ivf_and_quantized_indexes(tmp_path):
+    make_index(tmp_path / "source")
+    shard_local_index(tmp_path / "source", tmp_path / "shards", 2)
+    centroids = IVFIndex.load(tmp_path / "source").centroids
+
+    for shard in range(2):
+        path = shard_path(tmp_path / "shards", shard)
+        ivf = IVFIndex.load(path)
+        np.testing.assert_array_equal(ivf.centroids, centroids)
+        assert sorted(ivf.ids) == list(range(ivf.offsets[-1]))
+        assert QuantizedIndex.load(path).kind == "int8"
+
+        store = LocalVectorStore(path, None, ["id", "text"], "text")
+        query = store.vectors[0]
+        results = store.similarity_search_with_score_by_vector(query, k=1, nprobe=4)
+        assert results[0][0].metadata["id"] == store.chunks["id"][0]
+
+
+def test_shards_skip_tombstoned_rows(tmp_path):
+    chunks, _ = make_index(tmp_path / "source")
+    tombstones = np.zeros(len(chunks), dtype=bool)
+    tombstones[::3] = True
+    np.save(tmp_path / "source" / TOMBSTONES_FILE, tombstones)
+
+    sizes = shard_local_index(tmp_path / "source", tmp_path / "shards", 2)
+    assert sum(sizes) == (~tombstones).sum()
+    kept = pd.concat(
+        pd.read_parquet(shard_path(tmp_path / "shards", i) / CHUNKS_FILE)
+        for i in range(2)
+    )
+    assert sorted(kept["id"]) == sorted(chunks["id"][~tombstones])
+
+
+def test_sharded_search_matches_unsharded_index(tmp_path):
+    rng = np.random.default_rng(1)
+    n = 40
+    chunks = pd.DataFrame(
+        {
+            "id": [f"c{i}" for i in range(n)],
+            "text": [f"chunk {i}" for i in range(n)],
+            "doc_uri": [f"doc{i % 8}" for i in range(n)],
+        }
+    )
+    vectors = normalize(rng.normal(size=(n, 8)))
+    write_local_index(chunks, vectors, tmp_path / "source")
+    shard_local_index(tmp_path / "source", tmp_path / "shards", 3)
+
+    source = LocalVectorStore(tmp_path / "source", None, ["id", "text"], "text")
+    sharded = ShardedVectorStore(tmp_path / "shards", None, ["id", "text"], "text")
+    try:
+        query = rng.normal(size=8)
+        expected = source.similarity_search_with_score_by_vector(query, k=5)
+        results = sharded.similarity_search_with_score_by_vector(query, k=5)
+        assert [doc.metadata["id"] for doc, _ in results] == [
+            doc.metadata["id"] for doc, _ in expected
+        ]
+        np.testing.assert_allclose(
+            [score for _, score in results],
+            [score for _, score in expected],
+            rtol=1e-5,
+        )
+        assert [x["status"] for x in sharded.last_shard_status] == ["ok"] * 3
+    finally:
+        sharded.close()
+
+
+def test_benchmark_shards_reports_each_shard_count(tmp_path):
+    make_synthetic_index(tmp_path, num_chunks=50, dim=8, num_docs=10)
+    report = benchmark_shards(tmp_path, [1, 2], num_queries=5, k=3)
+
+    assert [x["num_shards"] for x in report["results"]] == [1, 2]
+    for result in report["results"]:
+        assert sum(result["shard_sizes"]) == 50
+        assert result["partial_results"] == 0
+        assert result["p50_ms"] <= result["p95_ms"]
@@ -0,0 +1,105 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyspark")
+
+from src.config import IngestConfig
+from src.ingest import CHUNK_ARROW_SCHEMA, CHUNK_TABLE_SCHEMA
+from src.tables import ingest_with_spark, make_ingest_partition, merge_chunks
+
+
+def chunk(id, doc_uri, text):
+    row = dict.fromkeys(CHUNK_ARROW_SCHEMA.names)
+    return {**row, "id": id, "doc_uri": doc_uri, "pages": [1], "text": text}
+
+
+@pytest.fixture(scope="module")
+def spark(tmp_path_factory):
+    if shutil.which("java") is None and "JAVA_HOME" not in os.environ:
+        pytest.skip("local-mode Spark needs Java")
+    delta = pytest.importorskip("delta")
+    from pyspark.sql import SparkSession
+
+    builder = (
+        SparkSession.builder.master("local[2]")
+        .config("spark.sql.warehouse.dir", str(tmp_path_factory.mktemp("warehouse")))
+        .config("spark.sql.shuffle.partitions", "2")
+        .config("spark.sql.sources.default", "delta")
+        .config("spark.sql.extensions", "io.delta.sql.DeltaSparkSessionExtension")
+        .config(
+            "spark.sql.catalog.spark_catalog",
+            "org.apache.spark.sql.delta.catalog.DeltaCatalog",
+        )
+    )
+    spark = delta.configure_spark_with_delta_pip(builder).getOrCreate()
+    yield spark
+    spark.stop()
+
+
+def test_ingest_partition_marks_failed_documents(monkeypatch):
+    def process_rows(rows, config):
+        for row in rows:
+            if row["asset_path"] == "bad.pdf":
+                yield None
+            else:
+                yield [chunk("a1", row["link_to_page"], "text")]
+
+    monkeypatch.setattr("src.tables.process_rows", process_rows)
+    batch = pd.DataFrame(
+        {
+            "title": ["Good", "Bad"],
+            "link_to_page": ["uri:good", "uri:bad"],
+            "asset_path": ["good.pdf", "bad.pdf"],
+            "path": ["good.pdf", "bad.pdf"],
+        }
+    )
+    frames = list(make_ingest_partition(IngestConfig())(iter([batch])))
+
+    assert [x["doc_uri"].tolist() for x in frames] == [["uri:good"], ["uri:bad"]]
+    assert frames[0]["id"].tolist() == ["a1"]
+    assert frames[1]["id"].isna().all()
+    assert all(list(x.columns) == CHUNK_ARROW_SCHEMA.names for x in frames)
+
+
+def test_ingest_with_spark_reports_failed_documents(spark, tmp_path):
+    df = pd.DataFrame(
+        {
+            "title": ["Missing"],
+            "link_to_page": ["uri:missing"],
+            "asset_path": ["missing.pdf"],
+        }
+    )
+    failed = []
+    staging = ingest_with_spark(
+        spark, df, IngestConfig(), "staging_failed", root=tmp_path, failed=failed
+    )
+    assert failed == ["uri:missing"]
+    assert staging.count() == 0
+
+
+def test_merge_chunks_keeps_failed_documents(spark):
+    target = "chunks_failed"
+    spark.sql(f"DROP TABLE IF EXISTS {target}")
+    existing = [chunk("a1", "uri:a", "a"), chunk("b1", "uri:b", "b")]
+    spark.createDataFrame(existing, schema=CHUNK_TABLE_SCHEMA).write.saveAsTable(target)
+
+    # A full ingest in which uri:b failed to convert
+    source = spark.createDataFrame(
+        [chunk("a2", "uri:a", "a, amended")], CHUNK_TABLE_SCHEMA
+    )
+    merge_chunks(spark, source, target, None, failed_doc_uris=["uri:b"])
+    assert sorted(x.id for x in spark.table(target).collect()) == ["a2", "b1"]
+
+
+def test_merge_chunks_deletes_only_stale_documents(spark):
+    target = "chunks_stale"
+    spark.sql(f"DROP TABLE IF EXISTS {target}")
+    existing = [chunk("a1", "uri:a", "a"), chunk("b1", "uri:b", "b")]
+    spark.createDataFrame(existing, schema=CHUNK_TABLE_SCHEMA).write.saveAsTable(target)
+
+    source = spark.createDataFrame([chunk("c1", "uri:c", "c")], CHUNK_TABLE_SCHEMA)
+    merge_chunks(spark, source, target, ["uri:a"])
+    assert sorted(x.id for x in spark.table(target).collect()) == ["b1", "c1"]
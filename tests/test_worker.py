@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+from src.worker import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / "jobs.db", lease_seconds=60)
+
+
+def test_claims_jobs_in_order_once(queue):
+    first = queue.enqueue("Act 1", "uri:1", "a.pdf")
+    second = queue.enqueue("Act 2", "uri:2", "b.pdf")
+
+    assert queue.claim()["id"] == first
+    job = queue.claim()
+    assert (job["id"], job["status"], job["attempts"]) == (second, "running", 1)
+    assert queue.claim() is None
+
+    queue.complete(first, 3)
+    queue.fail(second, "not a PDF")
+    assert queue.depth() == {"done": 1, "failed": 1}
+
+
+def test_reclaims_jobs_whose_lease_expired(queue, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.worker.time.time", lambda: now[0])
+    job_id = queue.enqueue("Act 1", "uri:1", "a.pdf")
+    queue.claim()
+
+    now[0] += 30
+    assert queue.claim() is None
+    now[0] += 31
+    job = queue.claim()
+    assert (job["id"], job["attempts"]) == (job_id, 2)
+
+
+def test_requeues_failed_jobs_below_max_attempts(queue):
+    queue.enqueue("Act 1", "uri:1", "a.pdf")
+    once = queue.enqueue("Act 2", "uri:2", "b.pdf")
+    queue.fail(queue.claim()["id"], "timeout")
+    queue.requeue_failed()
+    queue.fail(queue.claim()["id"], "timeout")
+    queue.fail(queue.claim()["id"], "timeout")
+
+    assert queue.requeue_failed(max_attempts=2) == 1
+    job = queue.claim()
+    assert (job["id"], job["error"]) == (once, None)
+    assert queue.depth() == {"failed": 1, "running": 1}
+
+
+def test_migrates_queues_without_attempts(tmp_path):
+    path = tmp_path / "jobs.db"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "title TEXT NOT NULL, link_to_page TEXT NOT NULL, "
+        "asset_path TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'queued', "
+        "error TEXT, num_chunks INTEGER, enqueued_at REAL NOT NULL, "
+        "started_at REAL, finished_at REAL)"
+    )
+    conn.execute(
+        "INSERT INTO jobs (title, link_to_page, asset_path, enqueued_at) "
+        "VALUES ('Act', 'uri', 'a.pdf', 0)"
+    )
+    conn.commit()
+    conn.close()
+
+    assert JobQueue(path).claim()["attempts"] == 1